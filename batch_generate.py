@@ -0,0 +1,154 @@
+"""
+Headless batch generation.
+
+Reads prompts from a JSONL file (one {"prompt": ..., "name": optional} object per line), runs
+each through the compiled agent graph with the validator auto-approving, and writes every
+project with create_project_from_output. A prompt counts as failed when its project could
+not be written. Batch results stay out of the interactive response cache unless
+--cache-results is given.
+
+    python batch_generate.py prompts.jsonl --out batch_output --workers 16 --limit google=8 --limit cohere=4
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from main_agent import app, client_registry, create_project_from_output, latest_generated_code
+
+def project_name(entry: dict, index: int) -> str:
+    if entry.get("name"):
+        return re.sub(r"[^A-Za-z0-9_-]", "_", entry["name"])
+    words = [re.sub(r"[^a-z0-9]", "", w) for w in entry["prompt"].lower().split()[:5]]
+    return f"{index:04d}_" + ("_".join(w for w in words if w) or "project")
+
+def read_prompts(path: str):
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        if not entry.get("prompt"):
+            raise ValueError(f"Prompt entry without a 'prompt' field: {entry}")
+    return entries
+
+def run_config(recursion_limit: int, cache_results: bool = False):
+    return {
+        "configurable": {
+            "thread_id": f"batch_{uuid.uuid4().hex}",
+            "auto_approve": True,
+            "priority": "batch",
+            "cache_results": cache_results,
+        },
+        "recursion_limit": recursion_limit,
+    }
+
+def final_code(state_values: dict):
+    """Returns the approved code, or the latest generated code when the run ended without approval."""
+    messages = state_values["messages"]
+    if messages and messages[-1].name == "final_agent":
+        return messages[-1].content
+    return latest_generated_code(messages)
+
+def write_project(out_dir: str, name: str, content):
+    if not content:
+        raise RuntimeError("the run finished without generating code")
+    if not create_project_from_output(content, os.path.join(out_dir, name)):
+        raise RuntimeError("no project files were written (no code blocks found or the directory could not be created)")
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(round(fraction * len(ordered))) - 1)]
+
+async def run_async(entries, out_dir: str, workers: int, recursion_limit: int, cache_results: bool = False):
+    queue = asyncio.Queue()
+    for index, entry in enumerate(entries):
+        queue.put_nowait((index, entry))
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            index, entry = queue.get_nowait()
+            name = project_name(entry, index)
+            start = time.perf_counter()
+            try:
+                state = await app.ainvoke({"messages": [("user", entry["prompt"])]}, config=run_config(recursion_limit, cache_results))
+                write_project(out_dir, name, final_code(state))
+                results.append((name, time.perf_counter() - start, None))
+            except Exception as e:
+                results.append((name, time.perf_counter() - start, repr(e)))
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+def run_threads(entries, out_dir: str, workers: int, recursion_limit: int, cache_results: bool = False):
+    results = []
+    lock = threading.Lock()
+
+    def job(index, entry):
+        name = project_name(entry, index)
+        start = time.perf_counter()
+        try:
+            state = app.invoke({"messages": [("user", entry["prompt"])]}, config=run_config(recursion_limit, cache_results))
+            write_project(out_dir, name, final_code(state))
+            error = None
+        except Exception as e:
+            error = repr(e)
+        with lock:
+            results.append((name, time.perf_counter() - start, error))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index, entry in enumerate(entries):
+            pool.submit(job, index, entry)
+    return results
+
+def report(results, elapsed: float):
+    succeeded = [latency for _, latency, error in results if error is None]
+    failed = [(name, error) for name, _, error in results if error is not None]
+    print(f"\nProjects: {len(succeeded)} succeeded, {len(failed)} failed in {elapsed:.1f}s")
+    print(f"Throughput: {len(succeeded) / elapsed * 60:.1f} projects/minute")
+    if succeeded:
+        print(f"Latency: p50 {statistics.median(succeeded):.2f}s · p95 {percentile(succeeded, 0.95):.2f}s")
+    for name, error in failed:
+        print(f"  FAILED {name}: {error}")
+
+def parse_limits(values):
+    limits = {}
+    for value in values:
+        provider, _, limit = value.partition("=")
+        if not limit.isdigit():
+            raise argparse.ArgumentTypeError(f"Expected provider=N, got {value!r}")
+        limits[provider] = int(limit)
+    return limits
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prompts", help="JSONL file with one {\"prompt\": ...} object per line")
+    parser.add_argument("--out", default="batch_output", help="directory the projects are written to")
+    parser.add_argument("--workers", type=int, default=8, help="number of generations in flight")
+    parser.add_argument("--mode", choices=["async", "thread"], default="async")
+    parser.add_argument("--limit", action="append", default=[], metavar="PROVIDER=N",
+                        help="maximum concurrent calls to a provider, e.g. google=8 (repeatable)")
+    parser.add_argument("--recursion-limit", type=int, default=25)
+    parser.add_argument("--cache-results", action="store_true",
+                        help="add the approved projects to the interactive response cache")
+    args = parser.parse_args()
+
+    for provider, limit in parse_limits(args.limit).items():
+        client_registry.set_max_connections(provider, limit)
+
+    entries = read_prompts(args.prompts)
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    if args.mode == "async":
+        results = asyncio.run(run_async(entries, args.out, args.workers, args.recursion_limit, args.cache_results))
+    else:
+        results = run_threads(entries, args.out, args.workers, args.recursion_limit, args.cache_results)
+    report(results, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Single generation vs. parallel candidates ranked locally.
+
+Fake providers answer code requests with a complete page, or (with probability --broken) with
+an answer cut off mid-HTML, as a model hitting its output limit would. Broken code is sent
+back by the validator's static checks, costing another generation round. Each first-turn
+request runs once with one candidate and once with --candidates; the report shows run
+latency, code_developer rounds per request and how often the final code passes the checks.
+
+    python benchmarks/bench_candidates.py --runs 20 --candidates 3 --broken 0.3
+    python benchmarks/bench_candidates.py --mode async
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Seconds to first token per (provider, model) used by the developer candidates.
+MODEL_LATENCY = {"gemini-2.5-flash": 0.6, "gemini-2.0-flash": 0.45, "llama-3.3-70b-versatile": 0.35}
+
+class BrokenAnswers:
+    """before_call hook making a share of code answers truncated."""
+
+    def __init__(self, probability: float, seed: int):
+        from fake_llm import DEFAULT_CODE
+
+        self.probability = probability
+        self.good = DEFAULT_CODE
+        self.broken = DEFAULT_CODE[: int(len(DEFAULT_CODE) * 0.35)]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, model):
+        with self._lock:
+            model.code = self.broken if self._random.random() < self.probability else self.good
+
+def run_once(app, count: int, mode: str, index: int):
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "candidates": count}}
+    inputs = {"messages": [("user", f"make a landing page with a hero header and feature cards ({index})")]}
+    start = time.perf_counter()
+    if mode == "async":
+        state = asyncio.run(app.ainvoke(inputs, config))
+    else:
+        state = app.invoke(inputs, config)
+    return time.perf_counter() - start, state["messages"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=3)
+    parser.add_argument("--broken", type=float, default=0.3, help="probability that a code answer is truncated")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHECKPOINT_RETENTION_INTERVAL", "0")
+    os.chdir(tempfile.mkdtemp(prefix="bench_candidates_"))
+    import main_agent
+    from fake_llm import FakeChatModel
+    from rate_limiting import RateLimiter
+    from static_validation import validate_code
+
+    main_agent.response_cache.enabled = False
+    main_agent.rate_limiter = RateLimiter({})
+    # Every node stays on its first model; size-aware selection would pick others.
+    main_agent.model_selector.policy.enabled = False
+    for node, route in main_agent.NODE_ROUTES.items():
+        main_agent.provider_router.configure(node, models=route.models[:1], hedge_after=None)
+
+    def run_pass(count: int):
+        hook = BrokenAnswers(args.broken, args.seed)
+
+        def factory_for(provider):
+            def factory(model, **kwargs):
+                return FakeChatModel(model=model, provider=provider, first_token_latency=MODEL_LATENCY.get(model, 0.1),
+                                     tokens_per_second=3000.0, before_call=hook, **kwargs)
+            return factory
+
+        for provider in ("google", "cohere", "groq"):
+            main_agent.client_registry.register(provider, factory_for(provider))
+        app = main_agent.graph.compile(checkpointer=main_agent.get_checkpointer())
+        times, rounds, passed = [], [], 0
+        for index in range(args.runs):
+            elapsed, messages = run_once(app, count, args.mode, index)
+            times.append(elapsed)
+            code = [m.content for m in messages if m.name == "code_developer"]
+            rounds.append(len(code))
+            passed += validate_code(code[-1], messages[0].content).ok
+        return times, rounds, passed
+
+    print(f"{args.runs} first-turn requests ({args.mode}), {args.broken:.0%} of code answers truncated\n")
+    for count in (1, args.candidates):
+        times, rounds, passed = run_pass(count)
+        print(f"candidates={count}  median={statistics.median(times):5.2f}s  mean={statistics.mean(times):5.2f}s  "
+              f"max={max(times):5.2f}s  rounds/request={statistics.mean(rounds):4.2f}  "
+              f"final code passes checks: {passed}/{args.runs}")
+    stats = main_agent.candidate_generator.stats()
+    print(f"\ncandidate runs={stats.get('runs', 0)}  answered={stats.get('answered', 0)}  "
+          f"abandoned={stats.get('abandoned', 0)}  wins={stats['wins']}")
+
+if __name__ == "__main__":
+    main()
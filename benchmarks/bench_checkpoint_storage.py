@@ -0,0 +1,123 @@
+"""
+Checkpoint storage size and write latency: plain serializer vs. deduplicated blobs.
+
+Runs the agent graph offline (FakeChatModel providers) for several conversations with
+feedback rounds, once with PooledSqliteSaver(blobs=False) and once with blobs=True, and
+reports database size and checkpoint write latency. Finally migrates a copy of the plain
+database to the blob format and reports its size after VACUUM.
+
+    python benchmarks/bench_checkpoint_storage.py --runs 10 --feedback-rounds 6 --code-kb 20
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def large_code(kilobytes: int) -> str:
+    """A code_developer answer of roughly the given size."""
+    cards = []
+    i = 0
+    while sum(len(c) for c in cards) < kilobytes * 1024 * 0.6:
+        cards.append(f'<div class="card card-{i}"><h2>Feature {i}</h2><p>Description of feature number {i}.</p></div>')
+        i += 1
+    rules = "\n".join(f".card-{n} {{ border: 1px solid #ccc; padding: {n % 20}px; }}" for n in range(i))
+    return (
+        "```html\n<!DOCTYPE html>\n<html>\n<head><title>Landing page</title></head>\n<body>\n"
+        '<header class="hero"><h1>Landing page</h1><button id="cta">Get started</button></header>\n'
+        + "\n".join(cards)
+        + "\n</body>\n</html>\n```\n\n```css\nbody { margin: 0; }\n" + rules + "\n```\n\n"
+        "```javascript\ndocument.getElementById('cta').addEventListener('click', () => alert('Hi'));\n```"
+    )
+
+def db_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def checkpoint_db(saver):
+    """Merges the WAL into the main database file so its size is comparable."""
+    saver.flush()
+    with saver.cursor(transaction=False) as cur:
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def run(main_agent, saver, runs: int, feedback_rounds: int):
+    put_times = []
+    original_put = saver.put
+
+    def timed_put(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_put(*args, **kwargs)
+        finally:
+            put_times.append(time.perf_counter() - start)
+
+    saver.put = timed_put
+    app = main_agent.graph.compile(checkpointer=saver)
+    for run_index in range(runs):
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        app.invoke({"messages": [("user", f"make a landing page with feature cards {run_index}")]}, config)
+        for round_index in range(feedback_rounds):
+            app.invoke({"messages": [("user", f"make the button blue ({round_index})")]}, config)
+    checkpoint_db(saver)
+    return put_times
+
+def report(label, path, put_times):
+    ordered = sorted(put_times)
+    p95 = ordered[max(0, int(round(0.95 * len(ordered))) - 1)]
+    print(
+        f"{label:<16} size={db_size(path) / 1024:9.1f}KiB  puts={len(put_times):4d}  "
+        f"mean={statistics.mean(put_times) * 1000:6.2f}ms  p95={p95 * 1000:6.2f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--feedback-rounds", type=int, default=6)
+    parser.add_argument("--code-kb", type=int, default=20, help="approximate size of each generated answer")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    os.chdir(workdir)
+
+    import main_agent
+    from checkpoint_store import PooledSqliteSaver
+    from fake_llm import install_fake_providers
+    from rate_limiting import RateLimiter
+
+    install_fake_providers(main_agent.client_registry, first_token_latency=0.0, tokens_per_second=1e9,
+                           code=large_code(args.code_kb))
+    main_agent.fast_router.enabled = False
+    main_agent.response_cache.enabled = False
+    main_agent.rate_limiter = RateLimiter({})
+
+    print(f"{args.runs} conversations × {1 + args.feedback_rounds} turns, ~{args.code_kb}KiB of code per answer\n")
+    plain_path = os.path.join(workdir, "plain.db")
+    plain = PooledSqliteSaver(plain_path, blobs=False)
+    report("plain", plain_path, run(main_agent, plain, args.runs, args.feedback_rounds))
+
+    blob_path = os.path.join(workdir, "blobs.db")
+    blobs = PooledSqliteSaver(blob_path, blobs=True)
+    report("blobs", blob_path, run(main_agent, blobs, args.runs, args.feedback_rounds))
+
+    migrated_path = os.path.join(workdir, "migrated.db")
+    shutil.copy(plain_path, migrated_path)
+    migrated = PooledSqliteSaver(migrated_path, blobs=True)
+    start = time.perf_counter()
+    counts = migrated.migrate_blobs()
+    migrated.vacuum()
+    checkpoint_db(migrated)
+    print(
+        f"\nmigrated plain → blobs in {time.perf_counter() - start:.2f}s "
+        f"({counts['checkpoints']} checkpoints, {counts['writes']} writes): "
+        f"{db_size(plain_path) / 1024:.1f}KiB → {db_size(migrated_path) / 1024:.1f}KiB"
+    )
+    config = {"configurable": {"thread_id": migrated.list_threads(limit=1)[0]["thread_id"]}}
+    print(f"latest checkpoint still loads: {len(migrated.get_tuple(config).checkpoint['channel_values']['messages'])} messages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Deterministic offline benchmark of the agent graph.
+
+Swaps every provider in the client registry for FakeChatModel (configurable latency, token
+rate and scripted routing), then runs the real StateGraph (supervisor → enhancer →
+code_developer → validator) end to end against a real SqliteSaver in a temporary directory.
+Reports per-node latency, checkpoint overhead, graph overhead and memory.
+
+    python benchmarks/bench_graph.py --runs 20 --latency 0.05 --tokens-per-second 2000
+"""
+import argparse
+import os
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def timed_checkpointer(saver, timings, intervals):
+    """Wraps the saver's read/write methods so their wall time is recorded."""
+    for name in ("put", "put_writes", "get_tuple"):
+        method = getattr(saver, name)
+
+        def wrapper(*args, _method=method, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                timings[_name].append(end - start)
+                intervals.append((start, end))
+
+        setattr(saver, name, wrapper)
+    return saver
+
+def run_turn(app, config, text, node_times, intervals):
+    """Runs one turn, timing every task from its start event to its result event."""
+    started = {}
+    for _, chunk in app.stream({"messages": [("user", text)]}, config=config, stream_mode=["tasks"]):
+        now = time.perf_counter()
+        if "input" in chunk:
+            started[chunk["id"]] = now
+        elif chunk["id"] in started:
+            begin = started.pop(chunk["id"])
+            node_times[chunk["name"]].append(now - begin)
+            intervals.append((begin, now))
+
+def covered(intervals):
+    """Total length of the union of (start, end) intervals."""
+    total, reach = 0.0, float("-inf")
+    for start, end in sorted(intervals):
+        if end > reach:
+            total += end - max(start, reach)
+            reach = end
+    return total
+
+def summarize(label, values):
+    if not values:
+        return f"{label:<22} {'-':>8}"
+    ordered = sorted(values)
+    p95 = ordered[max(0, int(round(0.95 * len(ordered))) - 1)]
+    return (
+        f"{label:<22} n={len(values):>4}  mean={statistics.mean(values) * 1000:8.2f}ms  "
+        f"p95={p95 * 1000:8.2f}ms  total={sum(values) * 1000:9.1f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="conversations to run")
+    parser.add_argument("--feedback-rounds", type=int, default=1, help="feedback turns per conversation")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--routing", default="enhancer,code_developer",
+                        help="scripted supervisor decisions, cycled")
+    parser.add_argument("--checkpointer", choices=["sqlite", "pooled"], default="sqlite")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_graph_")
+    os.chdir(workdir)
+
+    import main_agent
+    from checkpoint_store import PooledSqliteSaver
+    from fake_llm import install_fake_providers
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from rate_limiting import RateLimiter
+
+    fakes = install_fake_providers(
+        main_agent.client_registry,
+        first_token_latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        decisions={"Supervisor": args.routing.split(","), "ValidatorLLM": ["__end__"]},
+    )
+    # Measure the LLM path itself: no local routing shortcuts or cached answers.
+    main_agent.fast_router.enabled = False
+    main_agent.response_cache.enabled = False
+    # The fakes have no quota; the client-side limits would only add waiting.
+    main_agent.rate_limiter = RateLimiter({})
+
+    db_path = os.path.join(workdir, "bench.db")
+    if args.checkpointer == "pooled":
+        saver = PooledSqliteSaver(db_path)
+    else:
+        saver = SqliteSaver(sqlite3.connect(db_path, check_same_thread=False))
+    checkpoint_times = defaultdict(list)
+    intervals = []
+    app = main_agent.graph.compile(checkpointer=timed_checkpointer(saver, checkpoint_times, intervals))
+
+    node_times = defaultdict(list)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for run in range(args.runs):
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        run_turn(app, config, f"make a landing page number {run}", node_times, intervals)
+        for round_ in range(args.feedback_rounds):
+            run_turn(app, config, f"make the button blue ({round_})", node_times, intervals)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    checkpoint_total = sum(sum(v) for v in checkpoint_times.values())
+    turns = args.runs * (1 + args.feedback_rounds)
+
+    print(f"{turns} turns in {wall:.2f}s ({wall / turns * 1000:.1f} ms/turn), checkpointer={args.checkpointer}")
+    print(f"fake LLM calls: {sum(f.calls for f in fakes)}")
+    print("\nPer node (includes fake LLM latency):")
+    for name in sorted(node_times):
+        print("  " + summarize(name, node_times[name]))
+    print("\nCheckpoint operations:")
+    for name in sorted(checkpoint_times):
+        print("  " + summarize(name, checkpoint_times[name]))
+    print("\nOverhead:")
+    print(f"  checkpoint          {checkpoint_total * 1000:9.1f}ms  ({checkpoint_total / turns * 1000:.2f} ms/turn)")
+    # Task windows can overlap the checkpoint writes of the same step, so take the union.
+    graph_overhead = wall - covered(intervals)
+    print(f"  graph (other)       {graph_overhead * 1000:9.1f}ms  ({graph_overhead / turns * 1000:.2f} ms/turn)")
+    print(f"  database size       {os.path.getsize(db_path) / 1024:9.1f}KiB")
+    print(f"  peak traced memory  {peak / 1024 / 1024:9.2f}MiB")
+    print(f"  max RSS             {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:9.1f}MiB")
+
+if __name__ == "__main__":
+    main()
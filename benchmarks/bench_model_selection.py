@@ -0,0 +1,107 @@
+"""
+Fixed per-node models vs. the size-aware model selection policy.
+
+Runs small edits (a one-line feedback round on existing code), plain builds and large builds
+(a dashboard with several components) through the agent graph with FakeChatModel providers
+whose speed follows the policy's catalogue (first_token, tokens_per_second per model). Each
+mix runs with selection off (every node on its default model) and on, and the report shows
+median latency per task and its cost, priced with the policy from estimated prompt and
+answer tokens.
+
+    python benchmarks/bench_model_selection.py --runs 4
+    python benchmarks/bench_model_selection.py --policy my_policy.json --mode async
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+TASKS = {
+    "small edit": ("make a simple landing page for a bakery", "make the header background dark blue"),
+    "build": ("make a landing page for a bakery with opening hours and a contact section", None),
+    "large build": ("build an admin dashboard with revenue charts, a sortable orders table, a login form, "
+                    "a calendar of deliveries and a search filter", None),
+}
+
+def invoke(app, inputs, config, mode):
+    if mode == "async":
+        return asyncio.run(app.ainvoke(inputs, config))
+    return app.invoke(inputs, config)
+
+def selection_cost(main_agent) -> float:
+    """Cost of the node calls so far, as estimated by the selector (structured decisions included)."""
+    return sum(stats["cost"] for stats in main_agent.model_selector.stats().values())
+
+def run_task(main_agent, app, task, mode):
+    """Seconds and token cost of the measured turn: the feedback round for edits, the first turn otherwise."""
+    first, feedback = TASKS[task]
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    if feedback is not None:
+        invoke(app, {"messages": [("user", first)]}, config, mode)
+    before = selection_cost(main_agent)
+    start = time.perf_counter()
+    invoke(app, {"messages": [("user", feedback or first)]}, config, mode)
+    return time.perf_counter() - start, selection_cost(main_agent) - before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=4, help="runs of each task per pass")
+    parser.add_argument("--policy", default=os.path.join(REPO_ROOT, "model_policy.json"))
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHECKPOINT_RETENTION_INTERVAL", "0")
+    os.chdir(tempfile.mkdtemp(prefix="bench_model_selection_"))
+    import main_agent
+    from fake_llm import FakeChatModel
+    from model_selection import ModelPolicy, ModelSelector, spec_label
+    from rate_limiting import RateLimiter
+
+    policy = ModelPolicy.load(args.policy)
+    # Same estimates and prices, but no picks: every node stays on its route's default model.
+    fixed = ModelPolicy.load(args.policy)
+    fixed.nodes = {}
+    # The shipped policy is disabled; the benchmark measures it switched on.
+    policy.enabled = fixed.enabled = True
+    main_agent.response_cache.enabled = False
+    main_agent.fast_router.enabled = False
+    main_agent.rate_limiter = RateLimiter({})
+    for node, route in main_agent.NODE_ROUTES.items():
+        main_agent.provider_router.configure(node, models=route.models[:1], hedge_after=None)
+
+    def factory_for(provider):
+        def factory(model, **kwargs):
+            speed = policy.models.get(spec_label((provider, model)), {})
+            return FakeChatModel(model=model, provider=provider, first_token_latency=speed.get("first_token", 0.5),
+                                 tokens_per_second=speed.get("tokens_per_second", 200), **kwargs)
+        return factory
+
+    for provider in ("google", "cohere", "groq"):
+        main_agent.client_registry.register(provider, factory_for(provider))
+    app = main_agent.graph.compile(checkpointer=main_agent.get_checkpointer())
+
+    print(f"{args.runs} runs of each task ({args.mode}); fake model speeds from {args.policy}\n")
+    for label, selector_policy in (("fixed models", fixed), ("model selection", policy)):
+        main_agent.model_selector = ModelSelector(selector_policy, main_agent.NODE_ROUTES)
+        times, costs = defaultdict(list), defaultdict(float)
+        for task in TASKS:
+            for _ in range(args.runs):
+                elapsed, cost = run_task(main_agent, app, task, args.mode)
+                times[task].append(elapsed)
+                costs[task] += cost
+        summary = "  ".join(f"{task}: {statistics.median(times[task]):5.2f}s ${costs[task]:.4f}" for task in TASKS)
+        print(f"{label:<16} {summary}  total ${sum(costs.values()):.4f}")
+    for node, stats in main_agent.model_selector.stats().items():
+        print(f"  {node:<15} {stats['models']}  {stats['switched']} calls off the default model, "
+              f"saved ~{stats['latency_saved']:.1f}s (expected), ${stats['cost_saved']:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark for parse_code on large LLM outputs.
+
+Compares the previous three-regex implementation (called three times per output, as the
+validator used to) with the single-pass parser, cold and memoized.
+
+    python benchmarks/bench_parse_code.py --kb 200 --repeat 50
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_parser import CodeFenceParser, parse_code
+
+def legacy_parse_code(content: str):
+    html_code = css_code = js_code = ""
+    html_match = re.search(r"```html\s*([\s\S]*?)\s*```", content)
+    if html_match:
+        html_code = html_match.group(1).strip()
+    css_match = re.search(r"```css\s*([\s\S]*?)\s*```", content)
+    if css_match:
+        css_code = css_match.group(1).strip()
+    js_match = re.search(r"```javascript\s*([\s\S]*?)\s*```", content)
+    if js_match:
+        js_code = js_match.group(1).strip()
+    return html_code, css_code, js_code
+
+def make_output(kb: int) -> str:
+    third = kb * 1024 // 3
+    html = "<section class='card'><h2>Title</h2><p>Some text</p></section>\n"
+    css = ".card { padding: 1rem; border-radius: 8px; }\n"
+    js = "document.querySelectorAll('.card').forEach(c => c.classList.add('ready'));\n"
+    return (
+        "Here is your page.\n\n"
+        f"```html\n{html * (third // len(html))}```\n\n"
+        f"```css\n{css * (third // len(css))}```\n\n"
+        f"```javascript\n{js * (third // len(js))}```\n"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", type=int, default=200, help="size of the generated output in KiB")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    content = make_output(args.kb)
+    assert parse_code(content) == legacy_parse_code(content)
+
+    def single_pass():
+        p = CodeFenceParser()
+        p.feed(content)
+        return p.result()
+
+    timings = {
+        "legacy x3 (validator)": lambda: [legacy_parse_code(content) for _ in range(3)],
+        "legacy x1": lambda: legacy_parse_code(content),
+        "single-pass (cold)": single_pass,
+        "parse_code (memoized)": lambda: parse_code(content),
+    }
+    print(f"output size: {len(content) / 1024:.0f} KiB, {args.repeat} runs each")
+    for label, fn in timings.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"{label:<24} {best * 1000:9.3f} ms")
+
+if __name__ == "__main__":
+    main()
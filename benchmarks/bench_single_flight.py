@@ -0,0 +1,93 @@
+"""
+Workshop scenario: many sessions send the same prompt at the same moment.
+
+Starts --sessions first-turn runs of one prompt, spread over --spread seconds, against
+FakeChatModel providers, once with single-flight coalescing off and once on. Reports run
+latency, upstream provider calls, tokens spent and how many node calls were coalesced.
+
+    python benchmarks/bench_single_flight.py --sessions 20 --spread 0.2
+    python benchmarks/bench_single_flight.py --mode async
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+PROMPT = "build a landing page for our workshop with a schedule and a signup form"
+
+def run_sync(app, delays):
+    def session(delay):
+        time.sleep(delay)
+        start = time.perf_counter()
+        app.invoke({"messages": [("user", PROMPT)]}, {"configurable": {"thread_id": str(uuid.uuid4())}})
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(delays)) as pool:
+        return list(pool.map(session, delays))
+
+async def run_async(app, delays):
+    async def session(delay):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await app.ainvoke({"messages": [("user", PROMPT)]}, {"configurable": {"thread_id": str(uuid.uuid4())}})
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(session(delay) for delay in delays))
+
+def tokens_used(main_agent):
+    return sum(main_agent.metrics._tokens.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=0.2, help="sessions start within this many seconds")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=1000.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHECKPOINT_RETENTION_INTERVAL", "0")
+    os.chdir(tempfile.mkdtemp(prefix="bench_single_flight_"))
+    import main_agent
+    from fake_llm import install_fake_providers
+    from rate_limiting import RateLimiter
+    from single_flight import SingleFlight
+
+    main_agent.response_cache.enabled = False
+    main_agent.rate_limiter = RateLimiter({})
+    # Every node stays on its first model; size-aware selection would pick others.
+    main_agent.model_selector.policy.enabled = False
+    for node, route in main_agent.NODE_ROUTES.items():
+        main_agent.provider_router.configure(node, models=route.models[:1], hedge_after=None)
+    app = main_agent.graph.compile(checkpointer=main_agent.get_checkpointer())
+    delays = [random.Random(args.seed + i).uniform(0, args.spread) for i in range(args.sessions)]
+
+    print(f"{args.sessions} sessions ({args.mode}) sending the same prompt within {args.spread}s; "
+          f"fake models {args.latency}s + {args.tokens_per_second:.0f} tok/s\n")
+    for enabled in (False, True):
+        fakes = install_fake_providers(main_agent.client_registry, first_token_latency=args.latency,
+                                       tokens_per_second=args.tokens_per_second)
+        main_agent.single_flight = SingleFlight(enabled=enabled)
+        before = tokens_used(main_agent)
+        if args.mode == "async":
+            times = asyncio.run(run_async(app, delays))
+        else:
+            times = run_sync(app, delays)
+        stats = main_agent.single_flight.stats()
+        label = "single-flight on" if enabled else "single-flight off"
+        print(f"{label:<18} median={statistics.median(times):5.2f}s  max={max(times):5.2f}s  "
+              f"upstream calls={sum(fake.calls for fake in fakes):3d}  tokens={tokens_used(main_agent) - before:6d}  "
+              f"coalesced={stats['coalesced']} {stats['by_node']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+End-to-end latency with and without speculative execution of the supervisor's next node.
+
+Runs first-turn requests through the agent graph with FakeChatModel providers, the fast
+router's shortcut disabled so every request goes through the supervisor LLM, and scripted
+supervisor decisions (--enhancer-every N: every Nth decision is "enhancer", a speculation
+miss). Reports run latency, speculation hit rate and wasted tokens.
+
+    python benchmarks/bench_speculation.py --runs 12 --supervisor-latency 0.8 --enhancer-every 4
+    python benchmarks/bench_speculation.py --mode async
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def supervisor_decisions(enhancer_every: int):
+    if enhancer_every <= 0:
+        return ["code_developer"]
+    return ["code_developer"] * (enhancer_every - 1) + ["enhancer"]
+
+def run(main_agent, app, args):
+    times = []
+    for i in range(args.runs):
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        inputs = {"messages": [("user", f"build a pricing page for product {i}")]}
+        start = time.perf_counter()
+        if args.mode == "async":
+            asyncio.run(app.ainvoke(inputs, config))
+        else:
+            app.invoke(inputs, config)
+        times.append(time.perf_counter() - start)
+    return times
+
+def tokens_used(main_agent):
+    return sum(
+        count for (provider, model, direction), count in main_agent.metrics._tokens.items()
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=12)
+    parser.add_argument("--supervisor-latency", type=float, default=0.8, help="fake supervisor response time")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake time to first token of the other models")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--enhancer-every", type=int, default=4, help="every Nth supervisor decision is 'enhancer'; 0 never")
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHECKPOINT_RETENTION_INTERVAL", "0")
+    os.chdir(tempfile.mkdtemp(prefix="bench_speculation_"))
+    import main_agent
+    from fake_llm import install_fake_providers
+    from rate_limiting import RateLimiter
+
+    main_agent.response_cache.enabled = False
+    main_agent.fast_router.enabled = False
+    main_agent.rate_limiter = RateLimiter({})
+    # Every node stays on its first model; size-aware selection would pick others.
+    main_agent.model_selector.policy.enabled = False
+    for node, route in main_agent.NODE_ROUTES.items():
+        main_agent.provider_router.configure(node, models=route.models[:1], hedge_after=None)
+    decisions = {"Supervisor": supervisor_decisions(args.enhancer_every), "ValidatorLLM": ["__end__"]}
+    app = main_agent.graph.compile(checkpointer=main_agent.get_checkpointer())
+
+    print(f"{args.runs} first-turn runs ({args.mode}); supervisor {args.supervisor_latency}s, "
+          f"other models {args.latency}s + {args.tokens_per_second:.0f} tok/s; decisions {decisions['Supervisor']}\n")
+    results = {}
+    for enabled in (False, True):
+        # Fresh fakes so both passes see the same decision sequence.
+        install_fake_providers(main_agent.client_registry, providers=("cohere",),
+                               first_token_latency=args.supervisor_latency, decisions=decisions)
+        install_fake_providers(main_agent.client_registry, providers=("google", "groq"),
+                               first_token_latency=args.latency, tokens_per_second=args.tokens_per_second,
+                               decisions=decisions)
+        main_agent.speculator.enabled = enabled
+        before = tokens_used(main_agent)
+        times = run(main_agent, app, args)
+        results[enabled] = (times, tokens_used(main_agent) - before)
+
+    for enabled, (times, tokens) in results.items():
+        label = "speculation on" if enabled else "speculation off"
+        print(f"{label:<16} median={statistics.median(times):6.2f}s  mean={statistics.mean(times):6.2f}s  "
+              f"max={max(times):6.2f}s  tokens={tokens}")
+    stats = main_agent.speculator.stats()
+    print(f"\nspeculations={stats['started']}  hit rate={stats['hit_rate']:.0%}  used={stats['used']}  "
+          f"wasted tokens={stats['wasted_tokens']}  overlap={stats['overlap_seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Startup cost of the agent and of each Streamlit rerun.
+
+Cold import: `import main_agent` in fresh interpreters, then the deferred work on first use
+(compiling the graph with its checkpointer, building the first provider client).
+Rerun overhead: main_app.py driven by Streamlit's AppTest, timing the first script run and
+the reruns that follow, as happens on every widget interaction.
+
+    python benchmarks/bench_startup.py --imports 5 --reruns 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_IMPORT = """
+import time
+start = time.perf_counter()
+import main_agent
+imported = time.perf_counter()
+main_agent.get_app()
+compiled = time.perf_counter()
+main_agent.client_registry.get(*main_agent.DEVELOPER_MODEL)
+client = time.perf_counter()
+print(imported - start, compiled - imported, client - compiled)
+"""
+
+def cold_imports(runs: int, workdir: str):
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "CHECKPOINT_RETENTION_INTERVAL": "0"}
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", COLD_IMPORT], cwd=workdir, env=env, capture_output=True, text=True, check=True
+        )
+        samples.append([float(v) for v in out.stdout.split()[-3:]])
+    return samples
+
+def reruns(count: int):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, "main_app.py"), default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    # Let the background client warm-up finish so it does not compete with the reruns.
+    for thread in threading.enumerate():
+        if thread.name == "client-warm-up":
+            thread.join()
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+    return first, times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    samples = cold_imports(args.imports, workdir)
+    print(f"Cold start over {args.imports} fresh interpreters (median):")
+    for label, column in (("import main_agent", 0), ("first get_app()", 1), ("first provider client", 2)):
+        print(f"  {label:<22} {statistics.median(s[column] for s in samples) * 1000:8.1f}ms")
+
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CHECKPOINT_RETENTION_INTERVAL"] = "0"
+    first, times = reruns(args.reruns)
+    print("\nStreamlit script runs (AppTest):")
+    print(f"  first run              {first * 1000:8.1f}ms")
+    print(f"  rerun median           {statistics.median(times) * 1000:8.1f}ms")
+    print(f"  rerun max              {max(times) * 1000:8.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Load test for the checkpoint store.
+
+Runs N concurrent threads, each driving its own conversation through a four-node graph
+shaped like the agent workflow, against the shared-connection SqliteSaver and the pooled
+WAL-mode PooledSqliteSaver, without and with message blobs. Reports throughput, p50/p95
+turn latency and errors.
+
+    python benchmarks/checkpoint_load_test.py --threads 32 --turns 20
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import StateGraph, START, END, MessagesState
+
+from checkpoint_store import PooledSqliteSaver
+
+FAKE_CODE = "```html\n" + "<div class='card'>item</div>\n" * 200 + "```"
+
+def build_graph(checkpointer):
+    def node(name, content):
+        def run(state: MessagesState):
+            return {"messages": [HumanMessage(content=content, name=name)]}
+        return run
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("supervisor", node("supervisor", "Route to code_developer."))
+    graph.add_node("code_developer", node("code_developer", FAKE_CODE))
+    graph.add_node("validator", node("validator", "Looks relevant."))
+    graph.add_edge(START, "supervisor")
+    graph.add_edge("supervisor", "code_developer")
+    graph.add_edge("code_developer", "validator")
+    graph.add_edge("validator", END)
+    return graph.compile(checkpointer=checkpointer)
+
+def run_load(app, threads: int, turns: int):
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        for turn in range(turns):
+            start = time.perf_counter()
+            try:
+                app.invoke({"messages": [("user", f"turn {turn}")]}, config=config)
+                app.get_state(config)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+def report(label, elapsed, latencies, errors):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    print(
+        f"{label:<13} turns={len(latencies):>5}  errors={len(errors):>4}  "
+        f"elapsed={elapsed:6.2f}s  throughput={len(latencies) / elapsed:7.1f} turns/s  "
+        f"p50={statistics.median(latencies) * 1000 if latencies else 0:7.1f}ms  p95={p95 * 1000:7.1f}ms"
+    )
+    if errors:
+        print(f"              first error: {errors[0]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "shared.db"), check_same_thread=False)
+        report("shared", *run_load(build_graph(SqliteSaver(conn)), args.threads, args.turns))
+        conn.close()
+
+        pooled = PooledSqliteSaver(os.path.join(tmp, "pooled.db"), pool_size=args.pool_size, blobs=False)
+        report("pooled", *run_load(build_graph(pooled), args.threads, args.turns))
+
+        blobs = PooledSqliteSaver(os.path.join(tmp, "blobs.db"), pool_size=args.pool_size, blobs=True)
+        report("pooled+blobs", *run_load(build_graph(blobs), args.threads, args.turns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Offline stand-ins for the chat model providers, used by the benchmarks and tests.
+
+FakeChatModel answers each node with scripted content and structured decisions, and
+simulates provider latency (time to first token plus a fixed token rate) for invoke,
+ainvoke, stream and astream. ServerRateLimit makes it answer 429 like a provider over quota.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+DEFAULT_CODE = """```html
+<!DOCTYPE html>
+<html>
+<head><title>Landing page</title></head>
+<body>
+  <header class="hero"><h1>Landing page</h1><button id="cta">Get started</button></header>
+  <section class="features"><div class="card">Fast</div><div class="card">Simple</div></section>
+</body>
+</html>
+```
+
+```css
+body { font-family: sans-serif; margin: 0; }
+.hero { padding: 4rem; background: #223; color: white; }
+.card { display: inline-block; padding: 1rem; }
+```
+
+```javascript
+document.addEventListener('DOMContentLoaded', () => {
+  document.getElementById('cta').addEventListener('click', () => alert('Hello!'));
+});
+```"""
+
+DEFAULT_PATCH = """FILE: style.css
+<<<<<<< SEARCH
+=======
+button { background: blue; }
+>>>>>>> REPLACE"""
+
+DEFAULT_ENHANCED = (
+    "Build a responsive landing page with a hero header, a call-to-action button, "
+    "a features section made of cards, and a click handler on the button."
+)
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class FakeRateLimitError(Exception):
+    """429 Too Many Requests from a fake provider."""
+
+    status_code = 429
+
+class ServerRateLimit:
+    """
+    before_call hook enforcing a provider-side quota of `limit` requests per `window` seconds
+    for each model, raising FakeRateLimitError beyond it.
+    """
+
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._sent = defaultdict(deque)
+
+    def __call__(self, model):
+        now = time.monotonic()
+        with self._lock:
+            sent = self._sent[(model.provider, model.model)]
+            while sent and sent[0] <= now - self.window:
+                sent.popleft()
+            if len(sent) >= self.limit:
+                self.rejected += 1
+                raise FakeRateLimitError(f"429 Too Many Requests: quota of {self.limit} requests per {self.window}s exceeded for {model.model}")
+            sent.append(now)
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with simulated latency."""
+
+    model: str = "fake"
+    provider: str = "fake"
+    first_token_latency: float = 0.2
+    tokens_per_second: float = 500.0
+    # Accepted so variants with other sampling settings get their own client; not used.
+    temperature: float = 0.0
+    code: str = DEFAULT_CODE
+    patch: str = DEFAULT_PATCH
+    enhanced: str = DEFAULT_ENHANCED
+    # Scripted structured-output decisions per schema name, cycled in order.
+    decisions: dict = {"Supervisor": ["code_developer"], "ValidatorLLM": ["__end__"]}
+    # Optional hook called before every request; raise from it to simulate provider errors.
+    before_call: Optional[Any] = None
+
+    _cycles: dict = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _respond(self, messages) -> str:
+        system = str(messages[0].content) if messages else ""
+        if "Query Refinement Specialist" in system:
+            return self.enhanced
+        if "search/replace blocks" in system:
+            return self.patch
+        return self.code
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+        if self.before_call is not None:
+            self.before_call(self)
+
+    def _result(self, messages, text: str) -> ChatResult:
+        input_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": count_tokens(text),
+                "total_tokens": input_tokens + count_tokens(text),
+            },
+            response_metadata={"model_name": self.model},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _duration(self, text: str) -> float:
+        return self.first_token_latency + count_tokens(text) / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._start()
+        text = self._respond(messages)
+        time.sleep(self._duration(text))
+        return self._result(messages, text)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._start()
+        text = self._respond(messages)
+        await asyncio.sleep(self._duration(text))
+        return self._result(messages, text)
+
+    def _chunks(self, text: str):
+        step = 16
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._start()
+        text = self._respond(messages)
+        time.sleep(self.first_token_latency)
+        for piece in self._chunks(text):
+            time.sleep(count_tokens(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._start()
+        text = self._respond(messages)
+        await asyncio.sleep(self.first_token_latency)
+        for piece in self._chunks(text):
+            await asyncio.sleep(count_tokens(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    def _decision(self, schema):
+        with self._lock:
+            cycle = self._cycles.get(schema.__name__)
+            if cycle is None:
+                cycle = itertools.cycle(self.decisions[schema.__name__])
+                self._cycles[schema.__name__] = cycle
+            return schema(next=next(cycle), reason=f"Scripted {schema.__name__} decision.")
+
+    def with_structured_output(self, schema, **kwargs):
+        def decide(_):
+            self._start()
+            time.sleep(self.first_token_latency)
+            return self._decision(schema)
+
+        async def adecide(_):
+            self._start()
+            await asyncio.sleep(self.first_token_latency)
+            return self._decision(schema)
+
+        return RunnableLambda(decide, afunc=adecide, name=f"fake_structured_{schema.__name__}")
+
+def install_fake_providers(registry, providers=("google", "cohere", "groq"), **model_kwargs):
+    """Registers FakeChatModel factories for the given providers in a ClientRegistry."""
+    models = []
+
+    def factory_for(provider):
+        def factory(model, **kwargs):
+            fake = FakeChatModel(model=model, provider=provider, **{**model_kwargs, **kwargs})
+            models.append(fake)
+            return fake
+        return factory
+
+    for provider in providers:
+        registry.register(provider, factory_for(provider))
+    return models
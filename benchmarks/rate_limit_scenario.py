@@ -0,0 +1,157 @@
+"""
+Concurrent interactive and batch sessions against fake providers that answer 429 over quota.
+
+Every model of the fake providers accepts at most --quota requests per --window seconds and
+raises a 429 beyond that. Interactive sessions (a first request plus feedback rounds) and batch
+workers (priority "batch") run the agent graph at the same time, once with the client-side
+rate limiter sized to the quota and once with it disabled (no limits, no retries). Reports
+failed runs, 429s, retries, queue depth and run latency per priority. Exits non-zero when a
+run fails with the limiter enabled.
+
+    python benchmarks/rate_limit_scenario.py --interactive 4 --rounds 3 --batch 4 --batch-runs 4
+    python benchmarks/rate_limit_scenario.py --mode async
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def session_plan(args):
+    """(priority, prompts) per session: interactive feedback rounds and batch prompt lists."""
+    plan = []
+    for i in range(args.interactive):
+        prompts = [f"make a landing page for shop {i}"] + [f"make the button blue ({r})" for r in range(args.rounds)]
+        plan.append(("interactive", prompts, True))
+    for i in range(args.batch):
+        plan.append(("batch", [f"batch page {i}-{n}" for n in range(args.batch_runs)], False))
+    return plan
+
+def config_for(priority: str, thread_id: str):
+    return {"configurable": {"thread_id": thread_id, "priority": priority, "auto_approve": True}, "recursion_limit": 25}
+
+def run_sync(app, plan):
+    results = []
+    lock = threading.Lock()
+
+    def session(priority, prompts, same_thread):
+        thread_id = str(uuid.uuid4())
+        for prompt in prompts:
+            if not same_thread:
+                thread_id = str(uuid.uuid4())
+            start = time.perf_counter()
+            try:
+                app.invoke({"messages": [("user", prompt)]}, config_for(priority, thread_id))
+                error = None
+            except Exception as e:
+                error = repr(e)
+            with lock:
+                results.append((priority, time.perf_counter() - start, error))
+
+    threads = [threading.Thread(target=session, args=entry) for entry in plan]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+async def run_async(app, plan):
+    results = []
+
+    async def session(priority, prompts, same_thread):
+        thread_id = str(uuid.uuid4())
+        for prompt in prompts:
+            if not same_thread:
+                thread_id = str(uuid.uuid4())
+            start = time.perf_counter()
+            try:
+                await app.ainvoke({"messages": [("user", prompt)]}, config_for(priority, thread_id))
+                error = None
+            except Exception as e:
+                error = repr(e)
+            results.append((priority, time.perf_counter() - start, error))
+
+    await asyncio.gather(*(session(*entry) for entry in plan))
+    return results
+
+def report(label, results, server, limiter, elapsed):
+    failed = [r for r in results if r[2]]
+    retries = sum(s["retries"] for s in limiter.stats().values())
+    max_depth = max((s["max_queue_depth"] for s in limiter.stats().values()), default=0)
+    print(f"\n{label}: {len(results)} runs in {elapsed:.1f}s, {len(failed)} failed, "
+          f"{server.rejected} × 429 from the provider, {retries} retries, max queue depth {max_depth}")
+    for priority in ("interactive", "batch"):
+        times = sorted(t for p, t, e in results if p == priority and not e)
+        if times:
+            p95 = times[max(0, int(round(0.95 * len(times))) - 1)]
+            print(f"  {priority:<12} ok={len(times):3d}  median={statistics.median(times):6.2f}s  p95={p95:6.2f}s")
+    if failed:
+        print(f"  first failure: {failed[0][2][:160]}")
+    for model, stats in limiter.stats().items():
+        if stats["requests"]:
+            print(f"  {model:<36} requests={stats['requests']:3d}  throttled={stats['throttled']:3d}  "
+                  f"mean wait={stats['mean_wait']:.2f}s  p95 wait={stats['p95_wait']:.2f}s")
+    return len(failed)
+
+def scenario(main_agent, args, limited: bool):
+    from fake_llm import ServerRateLimit, install_fake_providers
+    from rate_limiting import RateLimiter
+
+    server = ServerRateLimit(args.quota, window=args.window)
+    install_fake_providers(main_agent.client_registry, first_token_latency=args.latency,
+                           tokens_per_second=5000.0, before_call=server)
+    if limited:
+        limits = {spec: (args.quota, None) for spec in main_agent.MODEL_RATE_LIMITS}
+        main_agent.rate_limiter = RateLimiter(limits, default=(args.quota, None), period=args.window,
+                                              base_delay=args.window / args.quota)
+    else:
+        main_agent.rate_limiter = RateLimiter({}, max_retries=0)
+    app = main_agent.graph.compile(checkpointer=main_agent.get_checkpointer())
+    plan = session_plan(args)
+    start = time.perf_counter()
+    if args.mode == "async":
+        results = asyncio.run(run_async(app, plan))
+    else:
+        results = run_sync(app, plan)
+    label = "rate limiter on" if limited else "rate limiter off"
+    return report(label, results, server, main_agent.rate_limiter, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactive", type=int, default=4, help="interactive sessions")
+    parser.add_argument("--rounds", type=int, default=3, help="feedback rounds per interactive session")
+    parser.add_argument("--batch", type=int, default=4, help="batch workers")
+    parser.add_argument("--batch-runs", type=int, default=4, help="prompts per batch worker")
+    parser.add_argument("--quota", type=int, default=6, help="requests each model accepts per window")
+    parser.add_argument("--window", type=float, default=2.0, help="provider quota window in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake time to first token")
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHECKPOINT_RETENTION_INTERVAL", "0")
+    os.chdir(tempfile.mkdtemp(prefix="rate_limit_scenario_"))
+    import main_agent
+
+    main_agent.fast_router.enabled = False
+    main_agent.response_cache.enabled = False
+    # One model per node, so a 429 is not hidden by falling back to another provider (or by
+    # size-aware selection picking another model).
+    main_agent.model_selector.policy.enabled = False
+    for node, route in main_agent.NODE_ROUTES.items():
+        main_agent.provider_router.configure(node, models=route.models[:1], hedge_after=None)
+
+    print(f"{args.interactive} interactive sessions × {1 + args.rounds} rounds, {args.batch} batch workers × "
+          f"{args.batch_runs} runs; provider quota {args.quota} requests / {args.window}s per model ({args.mode})")
+    scenario(main_agent, args, limited=False)
+    failures = scenario(main_agent, args, limited=True)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
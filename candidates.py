@@ -0,0 +1,185 @@
+"""
+Parallel multi-candidate code generation with local ranking.
+
+CandidateGenerator sends the same code_developer request to several (provider, model,
+client settings) variants at once and keeps the answer with the best local score
+(static_validation.score_candidate). Once the first candidate has answered, the others get
+`grace` times its latency to finish; later ones are cancelled (async) or left to finish
+unused (sync), so the total stays close to a single call. The whole fan-out gets `timeout`
+seconds, counted from when the rate limiter lets the first candidate through; candidates
+still queued for quota when the run ends are not sent.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from rate_limiting import on_grant
+
+@dataclass
+class Variant:
+    spec: tuple
+    # Extra client settings, e.g. {"temperature": 1.0}; part of the client registry key.
+    client_kwargs: dict = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        settings = ", ".join(f"{k}={v}" for k, v in sorted(self.client_kwargs.items()))
+        return f"{self.spec[0]}/{self.spec[1]}" + (f" ({settings})" if settings else "")
+
+class CandidatesFailed(RuntimeError):
+    """Raised when no candidate produced an answer."""
+
+class _Run:
+    """Grant hook shared by one fan-out's candidates; `granted` resolves when the first is let through."""
+
+    def __init__(self, granted):
+        self.granted = granted
+        self.closed = False
+
+    def grant(self) -> bool:
+        if not self.granted.done():
+            self.granted.set_result(time.monotonic())
+        return not self.closed
+
+    def waiting(self) -> set:
+        return set() if self.granted.done() else {self.granted}
+
+class CandidateGenerator:
+    """
+    `call(variant, messages, stream)` / `acall(...)` make one request and return the AI
+    message. Only the first variant's tokens are streamed to the UI (`stream=True`).
+    """
+
+    def __init__(self, variants: list, call, acall, score, grace: float = 0.5, timeout: float = 60.0,
+                 max_workers: int = 16):
+        self.variants = variants
+        self.call = call
+        self.acall = acall
+        self.score = score
+        self.grace = grace
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="candidate")
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._wins = Counter()
+
+    def _pick(self, count: int):
+        return self.variants[:max(1, min(count, len(self.variants)))]
+
+    def _rank(self, answers, request: str, started: float):
+        """Returns the best (variant, content) pair and logs the ranking."""
+        scored = sorted(
+            ((self.score(message.content, request), index, variant, message.content)
+             for index, (variant, message) in answers),
+            key=lambda item: (-item[0], item[1]),
+        )
+        best_score, _, best, content = scored[0]
+        others = ", ".join(f"{variant.label} {score:.1f}" for score, _, variant, _ in scored[1:])
+        print(f"--- Candidates: {len(scored)} ranked in {time.monotonic() - started:.1f}s; "
+              f"best {best.label} {best_score:.1f}" + (f" (vs {others})" if others else "") + " ---")
+        with self._lock:
+            self._wins[best.label] += 1
+        return best, content
+
+    def _count(self, **counts):
+        with self._lock:
+            self._stats.update(counts)
+
+    def _time_left(self, run: _Run, deadline):
+        """Seconds until the grace period or the overall timeout ends; None while neither clock runs."""
+        ends = [deadline] if deadline is not None else []
+        if run.granted.done():
+            ends.append(run.granted.result() + self.timeout)
+        return max(0.0, min(ends) - time.monotonic()) if ends else None
+
+    def _run_call(self, run, variant, messages, stream):
+        on_grant.set(run.grant)
+        return self.call(variant, messages, stream)
+
+    async def _arun_call(self, run, variant, messages, stream):
+        on_grant.set(run.grant)
+        return await self.acall(variant, messages, stream)
+
+    def generate(self, messages, request: str, count: int) -> str:
+        variants = self._pick(count)
+        started = time.monotonic()
+        run = _Run(Future())
+        futures = {
+            self._executor.submit(contextvars.copy_context().run, self._run_call, run, variant, messages, index == 0): (index, variant)
+            for index, variant in enumerate(variants)
+        }
+        answers, errors = [], []
+        pending = set(futures)
+        deadline = None
+        try:
+            while pending:
+                done, _ = wait(pending | run.waiting(), timeout=self._time_left(run, deadline), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done & pending:
+                    index, variant = futures[future]
+                    try:
+                        answers.append((index, (variant, future.result())))
+                    except Exception as e:
+                        errors.append((variant, e))
+                pending -= done
+                if answers and deadline is None:
+                    deadline = time.monotonic() + self.grace * (time.monotonic() - started)
+        finally:
+            # Candidates not sent yet are skipped; the ones already sent finish unused.
+            run.closed = True
+            for future in pending:
+                future.cancel()
+        return self._finish(answers, errors, [futures[f][1] for f in pending], request, started)
+
+    async def agenerate(self, messages, request: str, count: int) -> str:
+        variants = self._pick(count)
+        started = time.monotonic()
+        run = _Run(asyncio.get_running_loop().create_future())
+        tasks = {
+            asyncio.ensure_future(self._arun_call(run, variant, messages, index == 0)): (index, variant)
+            for index, variant in enumerate(variants)
+        }
+        answers, errors = [], []
+        pending = set(tasks)
+        deadline = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending | run.waiting(), timeout=self._time_left(run, deadline),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done & pending:
+                    index, variant = tasks[task]
+                    try:
+                        answers.append((index, (variant, task.result())))
+                    except Exception as e:
+                        errors.append((variant, e))
+                pending -= done
+                if answers and deadline is None:
+                    deadline = time.monotonic() + self.grace * (time.monotonic() - started)
+        finally:
+            run.closed = True
+            for task in pending:
+                task.cancel()
+        return self._finish(answers, errors, [tasks[t][1] for t in pending], request, started)
+
+    def _finish(self, answers, errors, pending, request: str, started: float) -> str:
+        self._count(runs=1, answered=len(answers), failed=len(errors), abandoned=len(pending))
+        if not answers and pending:
+            self._count(timeouts=1)
+            errors = errors + [(variant, TimeoutError(f"no answer after {self.timeout}s")) for variant in pending]
+        for variant, error in errors:
+            print(f"--- Candidates: {variant.label} failed ({error!r}) ---")
+        if not answers:
+            raise CandidatesFailed("; ".join(f"{variant.label}: {error!r}" for variant, error in errors) or "no answer")
+        _, content = self._rank(answers, request, started)
+        return content
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**dict(self._stats), "wins": dict(self._wins)}
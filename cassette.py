@@ -0,0 +1,128 @@
+"""
+Record/replay cassettes for LLM calls.
+
+In record mode every request a node sends to a provider is stored with its response and
+latency in a gzip-compressed JSONL file. In replay mode the responses are served back by
+request hash, optionally sleeping for the recorded latency, so the graph can be profiled
+and regression-tested without live providers.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from langchain_core.messages import convert_to_messages, message_to_dict, messages_from_dict
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a request was never recorded."""
+
+def request_key(spec, messages, schema=None) -> str:
+    """Stable hash of the provider, model, structured-output schema and message contents."""
+    payload = {
+        "spec": list(spec),
+        "schema": schema.__name__ if schema is not None else None,
+        "messages": [[m.type, m.name, m.content] for m in convert_to_messages(messages)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _dump_response(response, schema):
+    if schema is not None:
+        return response.model_dump()
+    return message_to_dict(response)
+
+def _load_response(data, schema):
+    if schema is not None:
+        return schema(**data)
+    return messages_from_dict([data])[0]
+
+class Cassette:
+    """
+    On-disk store of LLM requests and responses.
+
+    Identical requests recorded more than once are replayed in recorded order; the last
+    response is repeated once they run out.
+    """
+
+    def __init__(self, path: str, mode: str = "off", emulate_timing: bool = False, timing_scale: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {CASSETTE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.emulate_timing = emulate_timing
+        self.timing_scale = timing_scale
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._served = {}
+        self.recorded = 0
+        self.replayed = 0
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette {self.path} does not exist; record it first.")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+
+    def record(self, spec, messages, schema, response, elapsed: float):
+        entry = {
+            "key": request_key(spec, messages, schema),
+            "spec": list(spec),
+            "schema": schema.__name__ if schema is not None else None,
+            "elapsed": round(elapsed, 4),
+            "response": _dump_response(response, schema),
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            # Each append is its own gzip member; gzip readers concatenate them transparently.
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def _next(self, spec, messages, schema):
+        key = request_key(spec, messages, schema)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                schema_name = schema.__name__ if schema is not None else "text"
+                raise CassetteMiss(f"No recorded {schema_name} response for {spec[0]}/{spec[1]} (key {key[:12]})")
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            self.replayed += 1
+            return entries[min(index, len(entries) - 1)]
+
+    def replay(self, spec, messages, schema=None):
+        entry = self._next(spec, messages, schema)
+        if self.emulate_timing:
+            time.sleep(entry["elapsed"] * self.timing_scale)
+        return _load_response(entry["response"], schema)
+
+    async def areplay(self, spec, messages, schema=None):
+        entry = self._next(spec, messages, schema)
+        if self.emulate_timing:
+            await asyncio.sleep(entry["elapsed"] * self.timing_scale)
+        return _load_response(entry["response"], schema)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "distinct_requests": len(self._entries),
+        }
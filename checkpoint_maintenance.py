@@ -0,0 +1,62 @@
+"""
+Maintenance commands for the checkpoint database.
+
+    python checkpoint_maintenance.py migrate --db data/chatbot.db
+    python checkpoint_maintenance.py prune --db data/chatbot.db --keep-last 10
+"""
+import argparse
+import os
+import time
+
+from checkpoint_store import PooledSqliteSaver
+
+def database_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def migrate(args):
+    saver = PooledSqliteSaver(args.db, blobs=True)
+    before = database_size(args.db)
+    start = time.perf_counter()
+    counts = saver.migrate_blobs(batch_size=args.batch_size)
+    saver.vacuum()
+    print(
+        f"Migrated {counts['checkpoints']} checkpoints and {counts['writes']} writes in "
+        f"{time.perf_counter() - start:.1f}s: {before / 1024:.0f}KiB → {database_size(args.db) / 1024:.0f}KiB"
+    )
+
+def prune(args):
+    saver = PooledSqliteSaver(args.db)
+    before = database_size(args.db)
+    start = time.perf_counter()
+    checkpoints = saver.prune_checkpoints(keep_last=args.keep_last, batch_size=args.batch_size)
+    blobs = saver.prune_blobs(batch_size=args.batch_size)
+    if args.full_vacuum:
+        saver.vacuum()
+    else:
+        saver.reclaim_space()
+    print(
+        f"Deleted {checkpoints} checkpoints and {blobs} unreferenced blobs in "
+        f"{time.perf_counter() - start:.1f}s: {before / 1024:.0f}KiB → {database_size(args.db) / 1024:.0f}KiB"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="store existing checkpoints as deduplicated, compressed blobs")
+    migrate_parser.add_argument("--db", default="data/chatbot.db")
+    migrate_parser.add_argument("--batch-size", type=int, default=200)
+    migrate_parser.set_defaults(func=migrate)
+
+    prune_parser = commands.add_parser("prune", help="keep the latest checkpoints of every thread and its approved snapshot")
+    prune_parser.add_argument("--db", default="data/chatbot.db")
+    prune_parser.add_argument("--keep-last", type=int, default=10)
+    prune_parser.add_argument("--batch-size", type=int, default=500)
+    prune_parser.add_argument("--full-vacuum", action="store_true", help="run a full VACUUM instead of an incremental one")
+    prune_parser.set_defaults(func=prune)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,684 @@
+import asyncio
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import WRITES_IDX_MAP, get_checkpoint_metadata
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from instrumentation import span
+
+# Marker the validator and the UI put in the message that closes an approved project.
+APPROVED_MARKER = "Final Code Approved!"
+
+THREAD_SORT_COLUMNS = {"updated_at", "created_at", "title", "message_count"}
+
+# Serialized type of checkpoints and writes whose messages live in the blobs table.
+BLOB_REF_TYPE = "blobref"
+# Tables holding serialized values, and their value column.
+BLOB_REF_COLUMNS = (("checkpoints", "checkpoint"), ("writes", "value"))
+# Prefix added to the serialized type of other values stored zlib-compressed.
+COMPRESSED_PREFIX = "zlib:"
+COMPRESS_MIN_BYTES = 512
+
+def _is_message_list(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(m, BaseMessage) for m in value)
+
+def _is_checkpoint(value) -> bool:
+    return (
+        isinstance(value, dict)
+        and isinstance(value.get("channel_values"), dict)
+        and _is_message_list(value["channel_values"].get("messages"))
+    )
+
+class BlobSerializer:
+    """
+    Serializer that stores every message body once, in a content-addressed `blobs` table.
+
+    Checkpoints and message writes are stored as the SHA-256 references of their messages
+    plus the (compressed) rest of the value; the messages themselves are zlib-compressed
+    into `blobs`, so a message repeated by every later checkpoint of a thread costs one row.
+    Other large values are zlib-compressed inline. Rows written by the plain serializer
+    still load, so existing databases keep working before they are migrated. With
+    `write_blobs` off, values are written by the plain serializer while blob rows of a
+    migrated database still load.
+    """
+
+    def __init__(self, inner, saver, cache_size: int = 1024, stored_size: int = 200_000, write_blobs: bool = True):
+        self.inner = inner
+        self.saver = saver
+        self.cache_size = cache_size
+        self.stored_size = stored_size
+        self.write_blobs = write_blobs
+        self._lock = threading.Lock()
+        # Blobs serialized but not yet committed; written by the next transaction of the saver.
+        self._pending = {}
+        # Blobs inserted by a transaction that has not committed yet.
+        self._flushing = {}
+        # Digests known to be committed, least recently used first. Only digests, so it can
+        # cover far more messages than the content cache.
+        self._stored = OrderedDict()
+        # Recently stored or loaded blobs (digest -> (type, raw bytes)), least recently used first.
+        self._cache = OrderedDict()
+        # Digests of live message objects (id -> (weakref, content, digest)): a message repeated
+        # by every checkpoint of a run is serialized and hashed once.
+        self._digests = {}
+
+    def _remember(self, digest, typed):
+        self._cache[digest] = typed
+        self._cache.move_to_end(digest)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _mark_stored(self, digest):
+        self._stored[digest] = None
+        self._stored.move_to_end(digest)
+        if len(self._stored) > self.stored_size:
+            self._stored.popitem(last=False)
+
+    def _known_digest(self, message):
+        entry = self._digests.get(id(message))
+        if entry is not None and entry[0]() is message and entry[1] is message.content:
+            return entry[2]
+        return None
+
+    def _remember_digest(self, message, digest):
+        key = id(message)
+        self._digests[key] = (weakref.ref(message, lambda _, key=key: self._forget_digest(key)), message.content, digest)
+
+    def _forget_digest(self, key):
+        with self._lock:
+            self._digests.pop(key, None)
+
+    def _store(self, message) -> str:
+        with self._lock:
+            digest = self._known_digest(message)
+            if digest is not None and digest in self._stored:
+                self._stored.move_to_end(digest)
+                if digest in self._cache:
+                    self._cache.move_to_end(digest)
+                return digest
+        type_, data = self.inner.dumps_typed(message)
+        digest = hashlib.sha256(type_.encode("utf-8") + b"\0" + data).hexdigest()
+        with self._lock:
+            if digest not in self._stored and digest not in self._pending and digest not in self._flushing:
+                self._pending[digest] = (type_, zlib.compress(data), len(data))
+            self._remember(digest, (type_, data))
+            self._remember_digest(message, digest)
+        return digest
+
+    def flush_blobs(self, cur):
+        """
+        Inserts the pending blobs using the caller's transaction. They count as stored once
+        that transaction commits; on rollback they are pending again.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushing.update(pending)
+        if not pending:
+            return
+
+        def committed():
+            with self._lock:
+                for digest in pending:
+                    self._flushing.pop(digest, None)
+                    self._mark_stored(digest)
+
+        def rolled_back():
+            with self._lock:
+                for digest, blob in pending.items():
+                    self._flushing.pop(digest, None)
+                    self._pending.setdefault(digest, blob)
+
+        self.saver.on_transaction_end(committed, rolled_back)
+        cur.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, type, data, size) VALUES (?, ?, ?, ?)",
+            [(digest, *blob) for digest, blob in pending.items()],
+        )
+
+    def _load_blobs(self, digests):
+        found = {}
+        missing = []
+        with self._lock:
+            for digest in digests:
+                if digest in self._cache:
+                    found[digest] = self._cache[digest]
+                    self._cache.move_to_end(digest)
+                elif digest in self._pending or digest in self._flushing:
+                    type_, compressed, _ = self._pending.get(digest) or self._flushing[digest]
+                    found[digest] = (type_, zlib.decompress(compressed))
+                else:
+                    missing.append(digest)
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            rows = self.saver.conn.execute(
+                f"SELECT hash, type, data FROM blobs WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            with self._lock:
+                for digest, type_, compressed in rows:
+                    found[digest] = (type_, zlib.decompress(compressed))
+                    self._remember(digest, found[digest])
+                    self._mark_stored(digest)
+        absent = [d for d in digests if d not in found]
+        if absent:
+            raise KeyError(f"Checkpoint references {len(absent)} missing message blob(s), e.g. {absent[0]}")
+        messages = [self.inner.loads_typed(found[d]) for d in digests]
+        with self._lock:
+            # The next checkpoint of the thread repeats these messages; no need to serialize them again.
+            for message, digest in zip(messages, digests):
+                self._remember_digest(message, digest)
+        return messages
+
+    @staticmethod
+    def referenced_blobs(payload) -> list:
+        """Digests referenced by a row stored with BLOB_REF_TYPE."""
+        header = zlib.decompress(payload).partition(b"\n")[0]
+        return json.loads(header)["m"]
+
+    def recent_blobs(self) -> set:
+        with self._lock:
+            return set(self._cache) | set(self._pending) | set(self._flushing)
+
+    def forget_blobs(self, digests):
+        """Drops deleted blobs from the bookkeeping so the next checkpoint that needs them writes them again."""
+        digests = set(digests)
+        with self._lock:
+            for digest in digests:
+                self._stored.pop(digest, None)
+                self._cache.pop(digest, None)
+            for key in [key for key, entry in self._digests.items() if entry[2] in digests]:
+                del self._digests[key]
+
+    def _dump_refs(self, messages, rest=None):
+        header = {"m": [self._store(m) for m in messages]}
+        rest_data = b""
+        if rest is not None:
+            header["t"], rest_data = self.inner.dumps_typed(rest)
+        return BLOB_REF_TYPE, zlib.compress(json.dumps(header).encode("utf-8") + b"\n" + rest_data)
+
+    def dumps_typed(self, obj):
+        if not self.write_blobs:
+            return self.inner.dumps_typed(obj)
+        if _is_checkpoint(obj):
+            channel_values = {k: v for k, v in obj["channel_values"].items() if k != "messages"}
+            return self._dump_refs(obj["channel_values"]["messages"], {**obj, "channel_values": channel_values})
+        if _is_message_list(obj):
+            return self._dump_refs(obj)
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return COMPRESSED_PREFIX + type_, zlib.compress(data)
+        return type_, data
+
+    def loads_typed(self, data):
+        type_, payload = data
+        if type_ == BLOB_REF_TYPE:
+            header, _, rest_data = zlib.decompress(payload).partition(b"\n")
+            header = json.loads(header)
+            messages = self._load_blobs(header["m"])
+            if "t" not in header:
+                return messages
+            checkpoint = self.inner.loads_typed((header["t"], rest_data))
+            checkpoint["channel_values"] = {**checkpoint["channel_values"], "messages": messages}
+            return checkpoint
+        if type_.startswith(COMPRESSED_PREFIX):
+            return self.inner.loads_typed((type_[len(COMPRESSED_PREFIX):], zlib.decompress(payload)))
+        return self.inner.loads_typed(data)
+
+class PooledSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver backed by a pool of WAL-mode connections.
+
+    Readers run concurrently on their own connections; writers are serialized by a
+    process-wide lock and wait on `busy_timeout` instead of failing with
+    "database is locked". The pending writes of a graph step are buffered and committed
+    in one transaction together with the checkpoint that closes the step.
+
+    A `threads` catalog (title, timestamps, approval flag, message count) is updated with
+    every checkpoint so listing projects never has to read the checkpoints themselves.
+
+    With `blobs` messages are deduplicated and compressed by BlobSerializer. It is off by
+    default: the smaller database costs write throughput under many concurrent sessions
+    (see benchmarks/checkpoint_load_test.py). Blob rows of a migrated database load either way.
+    """
+
+    def __init__(self, path: str, pool_size: int = 8, busy_timeout_ms: int = 30000, *, serde=None,
+                 blobs: bool = False):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        super().__init__(conn=self._connect(), serde=serde)
+        self.blob_serde = BlobSerializer(self.serde, self, write_blobs=blobs)
+        self.serde = self.blob_serde
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_writes = defaultdict(list)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        # Only takes effect on a new database; existing ones are converted by vacuum().
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        return conn
+
+    # SqliteSaver reads `self.conn` directly in a few places (setup, list); point it at the
+    # connection checked out by the current thread.
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return getattr(self._local, "conn", None) or self._default_conn
+
+    @conn.setter
+    def conn(self, value: sqlite3.Connection):
+        self._default_conn = value
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                approved INTEGER NOT NULL DEFAULT 0,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                approved_checkpoint_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at);
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL
+            );
+            """
+        )
+        if self.conn.execute("SELECT 1 FROM threads LIMIT 1").fetchone() is None:
+            self._backfill_threads()
+        self.conn.commit()
+
+    def _backfill_threads(self):
+        """Builds the catalog from the latest checkpoint of every existing thread (runs once)."""
+        rows = self.conn.execute(
+            """SELECT c.thread_id, c.type, c.checkpoint FROM checkpoints c
+            JOIN (SELECT thread_id, MAX(checkpoint_id) AS checkpoint_id FROM checkpoints
+                  WHERE checkpoint_ns = '' GROUP BY thread_id) latest
+            ON c.thread_id = latest.thread_id AND c.checkpoint_id = latest.checkpoint_id
+            WHERE c.checkpoint_ns = ''"""
+        ).fetchall()
+        for thread_id, type_, serialized in rows:
+            self._update_thread(self.conn, thread_id, self.serde.loads_typed((type_, serialized)))
+
+    @staticmethod
+    def _update_thread(conn, thread_id, checkpoint):
+        messages = checkpoint.get("channel_values", {}).get("messages", [])
+        title = ""
+        if messages and isinstance(messages[0].content, str):
+            title = messages[0].content.strip()[:80]
+        approved = int(bool(messages) and APPROVED_MARKER in str(messages[-1].content))
+        approved_checkpoint_id = checkpoint["id"] if approved else None
+        now = time.time()
+        conn.execute(
+            """INSERT INTO threads (thread_id, title, created_at, updated_at, approved, message_count, approved_checkpoint_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                title = CASE WHEN threads.title = '' THEN excluded.title ELSE threads.title END,
+                updated_at = excluded.updated_at,
+                approved = excluded.approved,
+                message_count = excluded.message_count,
+                approved_checkpoint_id = COALESCE(excluded.approved_checkpoint_id, threads.approved_checkpoint_id)""",
+            (str(thread_id), title, now, now, approved, len(messages), approved_checkpoint_id),
+        )
+
+    def list_threads(self, limit: int = 20, offset: int = 0, order_by: str = "updated_at", descending: bool = True):
+        """Returns one page of the thread catalog as a list of dicts."""
+        if order_by not in THREAD_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort threads by {order_by!r}")
+        direction = "DESC" if descending else "ASC"
+        with self.cursor(transaction=False) as cur:
+            cur.execute(
+                f"SELECT thread_id, title, created_at, updated_at, approved, message_count FROM threads "
+                f"ORDER BY {order_by} {direction} LIMIT ? OFFSET ?",
+                (limit, offset),
+            )
+            columns = [d[0] for d in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def migrate_blobs(self, batch_size: int = 200) -> dict:
+        """Rewrites checkpoints and writes stored by the plain serializer into the blob format."""
+        if not self.blob_serde.write_blobs:
+            raise RuntimeError("migrate_blobs needs a saver created with blobs=True")
+        self.setup()
+        migrated = {}
+        for table, key in BLOB_REF_COLUMNS:
+            count = 0
+            last_rowid = 0
+            while True:
+                with self.cursor(transaction=False) as cur:
+                    rows = cur.execute(
+                        f"SELECT rowid, type, {key} FROM {table} WHERE rowid > ? AND type != ? "
+                        f"AND type NOT LIKE ? ORDER BY rowid LIMIT ?",
+                        (last_rowid, BLOB_REF_TYPE, COMPRESSED_PREFIX + "%", batch_size),
+                    ).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for rowid, type_, value in rows:
+                    new_type, new_value = self.serde.dumps_typed(self.serde.loads_typed((type_, value)))
+                    updates.append((new_type, new_value, rowid))
+                with self.cursor() as cur:
+                    self.blob_serde.flush_blobs(cur)
+                    cur.executemany(f"UPDATE {table} SET type = ?, {key} = ? WHERE rowid = ?", updates)
+                count += len(rows)
+                last_rowid = rows[-1][0]
+            migrated[table] = count
+        return migrated
+
+    def vacuum(self):
+        """Returns the space freed by deleted or rewritten rows to the filesystem."""
+        self.flush()
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                # A full VACUUM also switches older databases to incremental auto-vacuum.
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+
+    def reclaim_space(self, max_pages: int = None):
+        """Frees pages with an incremental vacuum, or a full VACUUM when the database does not support it."""
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+                if incremental:
+                    pages = f"({int(max_pages)})" if max_pages else ""
+                    conn.execute(f"PRAGMA incremental_vacuum{pages}").fetchall()
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+        if not incremental:
+            self.vacuum()
+
+    def prune_checkpoints(self, keep_last: int = 10, batch_size: int = 500) -> int:
+        """
+        Deletes all but the latest `keep_last` checkpoints of every thread, together with
+        their pending writes. The approved snapshot of a thread is always kept.
+        """
+        self.flush()
+        deleted = 0
+        while True:
+            with self.cursor() as cur:
+                batch = cur.execute(
+                    """SELECT c.thread_id, c.checkpoint_ns, c.checkpoint_id FROM (
+                        SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS position
+                        FROM checkpoints) c
+                    LEFT JOIN threads t ON t.thread_id = c.thread_id AND t.approved_checkpoint_id = c.checkpoint_id
+                    WHERE c.position > ? AND t.thread_id IS NULL
+                    LIMIT ?""",
+                    (keep_last, batch_size),
+                ).fetchall()
+                if not batch:
+                    return deleted
+                cur.executemany("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", batch)
+                cur.executemany("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", batch)
+            deleted += len(batch)
+
+    def prune_blobs(self, batch_size: int = 500) -> int:
+        """
+        Deletes message blobs no longer referenced by any checkpoint or write. References are
+        collected from one read snapshot without blocking writers; under the write lock only
+        the rows added since then are read before the orphans are deleted.
+        """
+        self.flush()
+        with self.cursor(transaction=False) as cur:
+            cur.execute("BEGIN")
+            try:
+                marks = {
+                    table: cur.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                    for table, _ in BLOB_REF_COLUMNS
+                }
+                referenced = self._referenced_blobs(cur)
+                candidates = [h for (h,) in cur.execute("SELECT hash FROM blobs") if h not in referenced]
+            finally:
+                cur.connection.rollback()
+        if not candidates:
+            return 0
+        with self.cursor() as cur:
+            referenced = self._referenced_blobs(cur, marks)
+            # Blobs the serializer has seen recently may be referenced by a checkpoint being written.
+            referenced.update(self.blob_serde.recent_blobs())
+            orphans = [h for h in candidates if h not in referenced]
+            for i in range(0, len(orphans), batch_size):
+                cur.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h in orphans[i:i + batch_size]])
+            self.blob_serde.forget_blobs(orphans)
+        return len(orphans)
+
+    def _referenced_blobs(self, cur, after: dict = None) -> set:
+        """Digests referenced by blob-format rows, only those past the rowids in `after` when given."""
+        referenced = set()
+        for table, key in BLOB_REF_COLUMNS:
+            rows = cur.execute(f"SELECT {key} FROM {table} WHERE type = ? AND rowid > ?",
+                               (BLOB_REF_TYPE, (after or {}).get(table, 0)))
+            for (payload,) in rows:
+                referenced.update(self.blob_serde.referenced_blobs(payload))
+        return referenced
+
+    def run_retention(self, keep_last: int = 10) -> dict:
+        """Prunes old checkpoints and unreferenced blobs, then frees the space."""
+        checkpoints = self.prune_checkpoints(keep_last)
+        blobs = self.prune_blobs()
+        if checkpoints or blobs:
+            self.reclaim_space()
+        return {"checkpoints_deleted": checkpoints, "blobs_deleted": blobs}
+
+    def mark_approved(self, thread_id):
+        """Flags a thread as approved when the approval happens outside the graph."""
+        self.flush(thread_id)
+        with self.cursor() as cur:
+            cur.execute(
+                """UPDATE threads SET approved = 1, updated_at = ?, approved_checkpoint_id = (
+                    SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '')
+                WHERE thread_id = ?""",
+                (time.time(), str(thread_id), str(thread_id)),
+            )
+
+    @contextmanager
+    def cursor(self, transaction: bool = True):
+        conn = self._pool.get()
+        previous = getattr(self._local, "conn", None)
+        self._local.conn = conn
+        try:
+            if not self.is_setup:
+                with self.lock:
+                    self.setup()
+            if transaction:
+                with self._write_lock:
+                    cur = conn.cursor()
+                    self._local.hooks = []
+                    try:
+                        yield cur
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        for _, rolled_back in self._local.hooks:
+                            rolled_back()
+                        raise
+                    else:
+                        for committed, _ in self._local.hooks:
+                            committed()
+                    finally:
+                        self._local.hooks = None
+                        cur.close()
+            else:
+                cur = conn.cursor()
+                try:
+                    yield cur
+                finally:
+                    cur.close()
+        finally:
+            self._local.conn = previous
+            self._pool.put(conn)
+
+    def on_transaction_end(self, committed, rolled_back):
+        """Runs `committed()` or `rolled_back()` when the current thread's write transaction ends."""
+        hooks = getattr(self._local, "hooks", None)
+        if hooks is None:
+            raise RuntimeError("on_transaction_end needs an open write transaction (cursor())")
+        hooks.append((committed, rolled_back))
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        """Buffers the writes until the step's checkpoint is stored (or the thread is read)."""
+        with span("checkpoint", "put_writes", thread_id=config["configurable"]["thread_id"]):
+            self._buffer_writes(config, writes, task_id)
+
+    def _buffer_writes(self, config, writes, task_id):
+        replace = all(w[0] in WRITES_IDX_MAP for w in writes)
+        rows = [
+            (
+                str(config["configurable"]["thread_id"]),
+                str(config["configurable"]["checkpoint_ns"]),
+                str(config["configurable"]["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._pending_lock:
+            self._pending_writes[str(config["configurable"]["thread_id"])].append((replace, rows))
+
+    def _flush_writes(self, cur, thread_id=None):
+        self.blob_serde.flush_blobs(cur)
+        with self._pending_lock:
+            if thread_id is None:
+                batches = [b for pending in self._pending_writes.values() for b in pending]
+                self._pending_writes.clear()
+            else:
+                batches = self._pending_writes.pop(str(thread_id), [])
+        for replace, rows in batches:
+            verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+            cur.executemany(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def flush(self, thread_id=None):
+        """Commits buffered writes for one thread, or for every thread."""
+        with self._pending_lock:
+            if thread_id is None and not self._pending_writes:
+                return
+            if thread_id is not None and str(thread_id) not in self._pending_writes:
+                return
+        with span("checkpoint", "flush", thread_id=thread_id), self.cursor() as cur:
+            self._flush_writes(cur, thread_id)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = self.jsonplus_serde.dumps(get_checkpoint_metadata(config, metadata))
+        with span("checkpoint", "put", thread_id=thread_id), self.cursor() as cur:
+            self._flush_writes(cur, thread_id)
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(thread_id),
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    serialized_metadata,
+                ),
+            )
+            if not checkpoint_ns:
+                self._update_thread(cur, thread_id, checkpoint)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def get_tuple(self, config):
+        self.flush(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        self.flush((config or {}).get("configurable", {}).get("thread_id"))
+        yield from super().list(config, filter=filter, before=before, limit=limit)
+
+    def delete_thread(self, thread_id):
+        with self._pending_lock:
+            self._pending_writes.pop(str(thread_id), None)
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM threads WHERE thread_id = ?", (str(thread_id),))
+
+    # Async API for app.astream: the pool makes the sync methods safe to run on worker threads,
+    # so the event loop is never blocked on SQLite.
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        # Buffering does no I/O, but serializing (and, with blobs, compressing) the values is
+        # CPU work that should stay off the event loop like the other calls.
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+class RetentionJob:
+    """Background thread that runs `saver.run_retention` every `interval_seconds`."""
+
+    def __init__(self, saver, keep_last: int = 10, interval_seconds: float = 3600):
+        self.saver = saver
+        self.keep_last = keep_last
+        self.interval_seconds = interval_seconds
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="checkpoint-retention")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.last_result = self.saver.run_retention(self.keep_last)
+                print(f"--- Checkpoint retention: {self.last_result} ---")
+            except Exception as e:
+                print(f"Checkpoint retention failed: {e}")
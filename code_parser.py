@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+
+from instrumentation import span
+
+# Fence tags the LLMs use for each of the three files, lowercased.
+FENCE_LANGUAGES = {
+    "html": "html", "htm": "html", "xhtml": "html",
+    "css": "css",
+    "javascript": "js", "js": "js", "jsx": "js", "ecmascript": "js",
+}
+
+# An opening fence: the language tag, then either attributes (after whitespace, e.g.
+# ```html title=x) or code on the same line (```html<div>... or a one-line ```css a{}```).
+FENCE_OPENER = re.compile(r"```\s*([A-Za-z0-9_+-]*)(.*)")
+
+class CodeFenceParser:
+    """
+    Single-pass, incremental parser for fenced HTML, CSS and JS blocks.
+
+    Text can be fed in arbitrary chunks (e.g. streamed tokens). Several blocks of the same
+    language are joined in order, and a block whose closing fence has not arrived yet is
+    included as-is in `result()`. A line ending in ``` closes the open block, and an opening
+    fence for html, css or js closes it too, so a missing closing fence does not swallow the
+    next file.
+    """
+
+    def __init__(self):
+        self._blocks = {"html": [], "css": [], "js": []}
+        self._buffer = ""
+        self._language = None  # None outside a fence, "" inside a fence we don't collect
+        self._lines = []
+
+    def feed(self, text: str):
+        self._buffer += text
+        if "\n" not in text:
+            return
+        *complete, self._buffer = self._buffer.split("\n")
+        for line in complete:
+            self._consume(line)
+
+    def _consume(self, line: str):
+        stripped = line.strip()
+        opener = FENCE_OPENER.fullmatch(stripped) if stripped.startswith("```") else None
+        if self._language is not None and opener and opener.group(1).lower() in FENCE_LANGUAGES:
+            # A new block for one of the three files starts before the current one was closed.
+            self._close()
+        if self._language is None:
+            if opener:
+                self._language = FENCE_LANGUAGES.get(opener.group(1).lower(), "")
+                self._lines = []
+                rest = opener.group(2)
+                if rest.endswith("```") or (rest and not rest[0].isspace()):
+                    self._consume_code(rest)
+        else:
+            self._consume_code(line)
+
+    def _consume_code(self, line: str):
+        """Adds a line to the open block; a line ending in ``` closes it after its code."""
+        stripped = line.rstrip()
+        if stripped.endswith("```"):
+            code = stripped.rstrip("`")
+            if code.strip():
+                self._lines.append(code)
+            self._close()
+        else:
+            self._lines.append(line)
+
+    def _close(self):
+        if self._language:
+            self._blocks[self._language].append("\n".join(self._lines).strip())
+        self._language = None
+        self._lines = []
+
+    def result(self):
+        """Returns (html, css, js) for everything fed so far."""
+        blocks = {lang: list(parts) for lang, parts in self._blocks.items()}
+        if self._language:
+            lines = self._lines
+            # The unfinished last line, without the start of a closing fence.
+            partial = self._buffer.rstrip().rstrip("`")
+            if partial.strip() and not self._buffer.lstrip().startswith("`"):
+                lines = lines + [partial]
+            blocks[self._language].append("\n".join(lines).strip())
+        return tuple("\n\n".join(p for p in blocks[lang] if p) for lang in ("html", "css", "js"))
+
+@lru_cache(maxsize=128)
+def _parse_code(content: str):
+    parser = CodeFenceParser()
+    parser.feed(content + "\n")
+    return parser.result()
+
+def parse_code(content: str):
+    """Parses HTML, CSS, and JS from fenced code blocks in a single pass (memoized)."""
+    with span("parse_code", "parse_code"):
+        return _parse_code(content)
+
+def format_code(html_code: str, css_code: str, js_code: str) -> str:
+    """Renders the three files back into the fenced format code_developer produces."""
+    return f"```html\n{html_code}\n```\n\n```css\n{css_code}\n```\n\n```javascript\n{js_code}\n```"
@@ -0,0 +1,61 @@
+from code_parser import parse_code
+
+# Names of the messages produced by the agents themselves; anything else is user input
+# or validator feedback.
+ROUTING_NAMES = {"supervisor"}
+CODE_NAME = "code_developer"
+ENHANCER_NAME = "enhancer"
+
+def estimate_tokens(message) -> int:
+    """Rough token count (about four characters per token plus per-message overhead)."""
+    return len(str(message.content)) // 4 + 4
+
+def summarize_code(message):
+    """Replaces a code message with a one-line description of what it contained."""
+    html_code, css_code, js_code = parse_code(str(message.content))
+    summary = (
+        f"[Current code omitted: {len(html_code)} chars of HTML, "
+        f"{len(css_code)} chars of CSS, {len(js_code)} chars of JavaScript]"
+    )
+    return message.model_copy(update={"content": summary})
+
+def compact_messages(messages, token_budget: int, recent_feedback: int = 4, keep_code: bool = False):
+    """
+    Shrinks a conversation before it is sent to an LLM.
+
+    Keeps the original request, the latest enhancer output, the latest code, the most recent
+    feedback and the final message; older code versions and supervisor routing notes are
+    dropped. If the result is still over `token_budget`, the latest code is replaced by a
+    short summary and then the oldest kept feedback is dropped.
+
+    With `keep_code` (the code developer, which patches or rewrites that code) the latest
+    code is never summarized: the oldest feedback and then the enhancer output are dropped
+    instead, and the result may stay over budget.
+    """
+    if len(messages) <= 2:
+        return list(messages)
+
+    last = len(messages) - 1
+    latest_code = max((i for i, m in enumerate(messages) if m.name == CODE_NAME), default=None)
+    latest_enhancer = max((i for i, m in enumerate(messages) if m.name == ENHANCER_NAME), default=None)
+    feedback = [
+        i for i, m in enumerate(messages[1:], start=1)
+        if m.name not in ROUTING_NAMES | {CODE_NAME, ENHANCER_NAME}
+    ][-recent_feedback:]
+
+    pinned = {0, last} | {i for i in (latest_code, latest_enhancer) if i is not None}
+    keep = sorted(pinned | set(feedback))
+    droppable = [i for i in keep if i not in pinned]
+    compacted = {i: messages[i] for i in keep}
+
+    def total():
+        return sum(estimate_tokens(m) for m in compacted.values())
+
+    if keep_code:
+        if latest_enhancer is not None and latest_enhancer not in (0, last):
+            droppable.append(latest_enhancer)
+    elif latest_code is not None and latest_code != last and total() > token_budget:
+        compacted[latest_code] = summarize_code(messages[latest_code])
+    while droppable and total() > token_budget:
+        del compacted[droppable.pop(0)]
+    return [compacted[i] for i in sorted(compacted)]
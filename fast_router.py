@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, deque
+
+# Words that signal a concrete, buildable frontend request.
+BUILD_TERMS = {
+    "page", "website", "landing", "form", "button", "navbar", "nav", "header", "footer",
+    "section", "dashboard", "app", "layout", "grid", "card", "cards", "modal", "menu",
+    "gallery", "table", "chart", "hero", "sidebar", "responsive", "dark", "mode", "color",
+    "font", "animation", "todo", "calculator", "login", "signup", "portfolio", "slider",
+    "carousel", "html", "css", "javascript", "toggle", "input", "list", "image", "images",
+}
+
+ROUTES = ("enhancer", "code_developer")
+
+def tokenize(text: str):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class FastRouter:
+    """
+    Local routing stage that answers the supervisor's question without an LLM call.
+
+    `route` returns (goto, reason) when rules or the naive Bayes model trained on past
+    supervisor decisions are confident, and None when the LLM supervisor should decide.
+
+    The model learns from the latest `max_history` decisions. The history file stores only
+    their word counts and routes, never the prompts, and is compacted back to that window
+    once it has grown to twice its size.
+    """
+
+    def __init__(self, history_path: str = None, min_examples: int = 20, threshold: float = 0.9,
+                 enabled: bool = True, max_history: int = 2000):
+        self.enabled = enabled
+        self.history_path = history_path
+        self.min_examples = min_examples
+        self.threshold = threshold
+        self.max_history = max_history
+        self._lock = threading.Lock()
+        self._word_counts = {label: Counter() for label in ROUTES}
+        self._label_counts = Counter()
+        self._examples = deque()
+        self._history_lines = 0
+        self.fast_decisions = 0
+        self.llm_fallbacks = 0
+        if history_path and os.path.exists(history_path):
+            self._load_history()
+
+    def _load_history(self):
+        legacy = False
+        with open(self.history_path, encoding="utf-8") as f:
+            for line in f:
+                self._history_lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("next") not in ROUTES:
+                    continue
+                if "words" in entry:
+                    self._learn(Counter(entry["words"]), entry["next"])
+                elif isinstance(entry.get("text"), str):
+                    # Older histories stored the whole prompt; rewrite them without it.
+                    legacy = True
+                    self._learn(Counter(tokenize(entry["text"])), entry["next"])
+        if legacy or self._history_lines > self.max_history:
+            self._compact_history()
+
+    def _learn(self, words: Counter, label: str):
+        self._examples.append((words, label))
+        self._word_counts[label].update(words)
+        self._label_counts[label] += 1
+        if len(self._examples) > self.max_history:
+            old_words, old_label = self._examples.popleft()
+            counts = self._word_counts[old_label]
+            counts.subtract(old_words)
+            for w in old_words:
+                if counts[w] <= 0:
+                    del counts[w]
+            self._label_counts[old_label] -= 1
+            if not self._label_counts[old_label]:
+                del self._label_counts[old_label]
+
+    def _compact_history(self):
+        """Rewrites the history file with the examples the model currently learns from."""
+        temp_path = self.history_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for words, label in self._examples:
+                f.write(json.dumps({"words": words, "next": label}) + "\n")
+        os.replace(temp_path, self.history_path)
+        self._history_lines = len(self._examples)
+
+    def _rules(self, messages):
+        last = messages[-1]
+        name = getattr(last, "name", None)
+        if name == "enhancer":
+            return "code_developer", "Fast path: the enhancer produced a refined, actionable request."
+        if name == "validator":
+            return "code_developer", "Fast path: feedback round on existing code."
+        if any(getattr(m, "name", None) == "code_developer" for m in messages[:-1]):
+            return "code_developer", "Fast path: the user is giving feedback on generated code."
+
+        words = tokenize(last.content if isinstance(last.content, str) else "")
+        build_terms = sum(1 for w in words if w in BUILD_TERMS)
+        if len(words) <= 3 and build_terms <= 1:
+            return "enhancer", "Fast path: the request is too short to build from directly."
+        if len(words) >= 20 and build_terms >= 2:
+            return "code_developer", "Fast path: the request is a detailed build instruction."
+        return None
+
+    def _probabilities(self, text: str):
+        """Naive Bayes probability of each route, or None until enough decisions were seen."""
+        total = sum(self._label_counts.values())
+        if total < self.min_examples or len(self._label_counts) < len(ROUTES):
+            return None
+        words = tokenize(text)
+        vocab = len(set(self._word_counts[ROUTES[0]]) | set(self._word_counts[ROUTES[1]])) or 1
+        scores = {}
+        for label in ROUTES:
+            counts = self._word_counts[label]
+            denom = sum(counts.values()) + vocab
+            score = math.log(self._label_counts[label] / total)
+            for w in words:
+                score += math.log((counts[w] + 1) / denom)
+            scores[label] = score
+        norm = max(scores.values())
+        weights = {label: math.exp(score - norm) for label, score in scores.items()}
+        return {label: weight / sum(weights.values()) for label, weight in weights.items()}
+
+    def _classify(self, text: str):
+        probabilities = self._probabilities(text)
+        if probabilities is None:
+            return None
+        best = max(probabilities, key=probabilities.get)
+        confidence = probabilities[best]
+        if confidence < self.threshold:
+            return None
+        return best, f"Fast path: routing model is {confidence:.0%} confident."
+
+    def predict(self, messages):
+        """
+        Most likely route and its probability, even when not confident enough for `route`.
+        Falls back to the share of past decisions, and to code_developer without history.
+        """
+        with self._lock:
+            decision = self._rules(messages)
+            if decision is not None:
+                return decision[0], 1.0
+            text = messages[-1].content if isinstance(messages[-1].content, str) else ""
+            probabilities = self._probabilities(text)
+            if probabilities is None:
+                total = sum(self._label_counts.values())
+                probabilities = {
+                    label: (self._label_counts[label] + 1) / (total + len(ROUTES)) for label in ROUTES
+                }
+        best = max(ROUTES, key=lambda label: (probabilities[label], label == "code_developer"))
+        return best, probabilities[best]
+
+    def route(self, messages):
+        """Returns (goto, reason) when confident, otherwise None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            decision = self._rules(messages)
+            if decision is None and isinstance(messages[-1].content, str):
+                decision = self._classify(messages[-1].content)
+            if decision is None:
+                self.llm_fallbacks += 1
+            else:
+                self.fast_decisions += 1
+            return decision
+
+    def record(self, messages, goto: str):
+        """Adds an LLM supervisor decision to the routing history."""
+        text = messages[-1].content
+        if goto not in ROUTES or not isinstance(text, str):
+            return
+        words = Counter(tokenize(text))
+        with self._lock:
+            self._learn(words, goto)
+            if self.history_path:
+                with open(self.history_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"words": words, "next": goto}) + "\n")
+                self._history_lines += 1
+                if self._history_lines >= 2 * self.max_history:
+                    self._compact_history()
+
+    def stats(self) -> dict:
+        total = self.fast_decisions + self.llm_fallbacks
+        return {
+            "calls_saved": self.fast_decisions,
+            "llm_fallbacks": self.llm_fallbacks,
+            "fast_path_rate": self.fast_decisions / total if total else 0.0,
+            "training_examples": sum(self._label_counts.values()),
+        }
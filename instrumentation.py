@@ -0,0 +1,243 @@
+"""
+Structured tracing and metrics for the agent graph.
+
+`span(kind, name, ...)` times a unit of work (node execution, LLM call, structured-output
+parse, checkpoint write, parse_code) and records it in the process-wide `metrics` registry,
+which aggregates counters and latency histograms and keeps the recent spans of every
+conversation thread. The registry renders Prometheus text exposition format, can write it
+to a file and can serve it over HTTP.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SPAN_KINDS = ("node", "llm", "structured_output", "checkpoint", "parse_code", "rate_limit_wait")
+
+# Histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Conversation thread and node currently running; inherited by the LLM calls the node makes.
+current_thread_id = contextvars.ContextVar("current_thread_id", default=None)
+current_node = contextvars.ContextVar("current_node", default=None)
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    thread_id: str = None
+    provider: str = None
+    model: str = None
+    start: float = 0.0
+    duration: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    retries: int = 0
+    error: str = None
+    attributes: dict = field(default_factory=dict)
+
+    def add_usage(self, message):
+        """Adds the token counts reported on an AIMessage, when the provider sent them."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+
+class MetricsRegistry:
+    """In-process metrics: span counters, latency histograms, token totals and per-thread spans."""
+
+    def __init__(self, spans_per_thread: int = 200, max_threads: int = 100, export_path: str = None):
+        self.spans_per_thread = spans_per_thread
+        # When set, the Prometheus text is rewritten to this file after every node span.
+        self.export_path = export_path
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._durations = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._tokens = defaultdict(int)
+        self._retries = defaultdict(int)
+        self._threads = OrderedDict()
+        self._gauges = {}
+
+    def register_gauge(self, name: str, help_text: str, collect):
+        """Adds a gauge read at export time; `collect()` returns (labels dict, value) pairs."""
+        with self._lock:
+            self._gauges[name] = (help_text, collect, "gauge")
+
+    def register_counter(self, name: str, help_text: str, collect):
+        """Like register_gauge, for running totals kept by another component."""
+        with self._lock:
+            self._gauges[name] = (help_text, collect, "counter")
+
+    def record(self, span: Span):
+        key = (span.kind, span.name, span.provider or "")
+        with self._lock:
+            self._counts[key] += 1
+            self._durations[key] += span.duration
+            buckets = self._buckets[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if span.duration <= bound:
+                    buckets[i] += 1
+            if span.error:
+                self._errors[key] += 1
+            if span.retries:
+                self._retries[key] += span.retries
+            if span.input_tokens or span.output_tokens:
+                model_key = (span.provider or "", span.model or "")
+                self._tokens[model_key + ("input",)] += span.input_tokens
+                self._tokens[model_key + ("output",)] += span.output_tokens
+            if span.thread_id is not None:
+                spans = self._threads.get(span.thread_id)
+                if spans is None:
+                    spans = self._threads[span.thread_id] = deque(maxlen=self.spans_per_thread)
+                    if len(self._threads) > self.max_threads:
+                        self._threads.popitem(last=False)
+                else:
+                    self._threads.move_to_end(span.thread_id)
+                spans.append(span)
+        if self.export_path and span.kind == "node":
+            self.write_prometheus(self.export_path)
+
+    def thread_spans(self, thread_id) -> list:
+        """Most recent spans recorded for one conversation thread, oldest first."""
+        with self._lock:
+            return list(self._threads.get(str(thread_id), ()))
+
+    def summary(self) -> list:
+        """One row per (kind, name, provider) with call count, mean latency and errors."""
+        with self._lock:
+            return [
+                {
+                    "kind": kind, "name": name, "provider": provider,
+                    "count": count,
+                    "mean_ms": self._durations[(kind, name, provider)] / count * 1000,
+                    "errors": self._errors[(kind, name, provider)],
+                }
+                for (kind, name, provider), count in sorted(self._counts.items())
+            ]
+
+    def prometheus_text(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP agent_span_duration_seconds Wall time of instrumented operations.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for key in sorted(self._counts):
+                labels = _labels(kind=key[0], name=key[1], provider=key[2])
+                for bound, count in zip(LATENCY_BUCKETS, self._buckets[key]):
+                    lines.append(f'agent_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'agent_span_duration_seconds_bucket{{{labels},le="+Inf"}} {self._counts[key]}')
+                lines.append(f"agent_span_duration_seconds_sum{{{labels}}} {self._durations[key]:.6f}")
+                lines.append(f"agent_span_duration_seconds_count{{{labels}}} {self._counts[key]}")
+            lines += ["# HELP agent_span_errors_total Instrumented operations that raised.",
+                      "# TYPE agent_span_errors_total counter"]
+            for key in sorted(self._errors):
+                lines.append(f"agent_span_errors_total{{{_labels(kind=key[0], name=key[1], provider=key[2])}}} {self._errors[key]}")
+            lines += ["# HELP agent_llm_retries_total Provider call retries.",
+                      "# TYPE agent_llm_retries_total counter"]
+            for key in sorted(self._retries):
+                lines.append(f"agent_llm_retries_total{{{_labels(kind=key[0], name=key[1], provider=key[2])}}} {self._retries[key]}")
+            lines += ["# HELP agent_llm_tokens_total Tokens reported by the providers.",
+                      "# TYPE agent_llm_tokens_total counter"]
+            for (provider, model, direction), count in sorted(self._tokens.items()):
+                lines.append(f"agent_llm_tokens_total{{{_labels(provider=provider, model=model, direction=direction)}}} {count}")
+            gauges = sorted(self._gauges.items())
+        for name, (help_text, collect, metric_type) in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            for labels, value in collect():
+                lines.append(f"{name}{{{_labels(**labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        text = self.prometheus_text()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serves /metrics on a daemon thread and returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+        return server
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+metrics = MetricsRegistry()
+
+@contextmanager
+def span(kind: str, name: str, thread_id=None, **attrs):
+    """Times the block and records it; yields the Span so callers can add tokens or retries."""
+    if thread_id is None:
+        thread_id = current_thread_id.get()
+    current = Span(kind=kind, name=name, thread_id=None if thread_id is None else str(thread_id), **attrs)
+    current.start = time.time()
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        metrics.record(current)
+
+def traced_node(name: str):
+    """Decorates a graph node (sync or async) with a node span tagged with its thread id."""
+    def decorator(func):
+        def thread_id_of():
+            from langgraph.config import get_config
+            try:
+                return get_config().get("configurable", {}).get("thread_id")
+            except RuntimeError:
+                return None
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                tokens = current_thread_id.set(thread_id_of()), current_node.set(name)
+                try:
+                    with span("node", name):
+                        return await func(*args, **kwargs)
+                finally:
+                    current_thread_id.reset(tokens[0])
+                    current_node.reset(tokens[1])
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tokens = current_thread_id.set(thread_id_of()), current_node.set(name)
+            try:
+                with span("node", name):
+                    return func(*args, **kwargs)
+            finally:
+                current_thread_id.reset(tokens[0])
+                current_node.reset(tokens[1])
+        return wrapper
+    return decorator
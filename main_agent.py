@@ -1,29 +1,553 @@
-from typing import Annotated, Sequence, List, Literal 
+from typing import Literal
 from pydantic import BaseModel, Field 
-from langchain_core.messages import HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.messages import HumanMessage, AIMessageChunk, convert_to_messages
+from langchain_core.runnables import RunnableConfig, RunnableLambda, ensure_config
 from langgraph.types import Command 
 from langgraph.graph import StateGraph, START, END, MessagesState
-from langgraph.prebuilt import create_react_agent 
-from IPython.display import Image, display 
+from langgraph.config import get_config
+from langgraph.constants import TAG_NOSTREAM
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_cohere import ChatCohere
 import os
-import re
-from IPython.display import HTML, display
 import time
-from langgraph.checkpoint.sqlite import SqliteSaver
-import sqlite3
-import streamlit as st
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+import asyncio
+import queue
+from code_parser import CodeFenceParser, parse_code
+from patching import PatchError, apply_patches
+from context_compaction import compact_messages, estimate_tokens
+from static_validation import score_candidate, validate_code
+from fast_router import FastRouter
+from response_cache import ResponseCache
+from checkpoint_store import PooledSqliteSaver, RetentionJob
+from cassette import Cassette
+from instrumentation import current_node, current_thread_id, metrics, span, traced_node
+from provider_routing import NodeRoute, ProviderRouter
+from rate_limiting import PRIORITIES, RateLimiter, RequestAbandoned, granted, load_limits
+from speculation import Speculator
+from candidates import CandidateGenerator, CandidatesFailed, Variant
+from single_flight import SingleFlight, flight_key
+from model_selection import ModelPolicy, ModelSelector
 os.makedirs("data", exist_ok=True)
-conn = sqlite3.connect("data/chatbot.db", check_same_thread=False)
-# Checkpointer
-checkpointer = SqliteSaver(conn=conn)
 load_dotenv()
-llm= ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash-lite",
-    google_api_key=st.secrets.get("GEMINI_API_KEY"))
+
+# The checkpointer and the compiled graph are built on first use, once per process
+# (module-level `checkpointer` and `app` resolve through __getattr__ at the end of this file).
+@lru_cache(maxsize=None)
+def get_checkpointer() -> PooledSqliteSaver:
+    """Pooled WAL-mode connections shared safely by every session thread."""
+    # CHECKPOINT_BLOBS=1 stores each message once, compressed: a much smaller database for a
+    # lower write throughput under many concurrent sessions.
+    saver = PooledSqliteSaver("data/chatbot.db", blobs=os.getenv("CHECKPOINT_BLOBS", "0") == "1")
+    # CHECKPOINT_RETENTION_INTERVAL=<seconds> starts a background job that keeps the latest
+    # CHECKPOINT_KEEP_LAST checkpoints per thread (plus approved snapshots). Off by default: it
+    # deletes the older history that time travel through a project relies on.
+    if float(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "0")) > 0:
+        RetentionJob(
+            saver,
+            keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "10")),
+            interval_seconds=float(os.getenv("CHECKPOINT_RETENTION_INTERVAL")),
+        ).start()
+    return saver
+
+# --- LLM client registry ---
+# Models used by each node, as (provider, model) pairs.
+SUPERVISOR_MODEL = ("cohere", "command-r-plus-08-2024")
+ENHANCER_MODEL = ("google", "gemini-2.0-flash-lite")
+DEVELOPER_MODEL = ("google", "gemini-2.5-flash")
+VALIDATOR_MODEL = ("google", "gemini-2.5-flash-lite")
+
+NODE_MODELS = (SUPERVISOR_MODEL, ENHANCER_MODEL, DEVELOPER_MODEL, VALIDATOR_MODEL)
+
+# Provider routing per node: models in order of preference, seconds before an attempt is
+# abandoned, and seconds before a hedged request goes to the next model (both counted from
+# when the rate limiter lets the request through). The routing and
+# validation decisions are short, so they hedge onto fast models; code generation is streamed
+# to the UI and only falls back.
+NODE_ROUTES = {
+    "supervisor": NodeRoute(
+        models=[SUPERVISOR_MODEL, ("groq", "llama-3.1-8b-instant"), ("google", "gemini-2.0-flash-lite")],
+        timeout=20, hedge_after=2.0,
+    ),
+    "enhancer": NodeRoute(
+        models=[ENHANCER_MODEL, ("groq", "llama-3.3-70b-versatile")],
+        timeout=30, hedge_after=5.0,
+    ),
+    "code_developer": NodeRoute(
+        models=[DEVELOPER_MODEL, ("google", "gemini-2.0-flash"), ("groq", "llama-3.3-70b-versatile")],
+        timeout=180,
+    ),
+    "validator": NodeRoute(
+        models=[VALIDATOR_MODEL, ("groq", "llama-3.1-8b-instant"), ("cohere", "command-r-08-2024")],
+        timeout=30, hedge_after=3.0,
+    ),
+}
+
+# Upper bound on concurrent connections (and in-flight calls) per provider.
+PROVIDER_MAX_CONNECTIONS = {"google": 16, "cohere": 8, "groq": 8}
+
+# Client-side limits per model as (requests/minute, tokens/minute), shared by every session in
+# the process. Set to the providers' free-tier quotas; None leaves that dimension unlimited.
+# MODEL_RATE_LIMITS (JSON, or a JSON file) overrides them, e.g. for a paid tier:
+# MODEL_RATE_LIMITS='{"google/gemini-2.5-flash": [1000, 1000000]}'.
+MODEL_RATE_LIMITS = {
+    ("google", "gemini-2.5-pro"): (5, 250_000),
+    ("google", "gemini-2.5-flash"): (10, 250_000),
+    ("google", "gemini-2.5-flash-lite"): (15, 250_000),
+    ("google", "gemini-2.0-flash"): (15, 1_000_000),
+    ("google", "gemini-2.0-flash-lite"): (30, 1_000_000),
+    ("cohere", "command-r-plus-08-2024"): (20, None),
+    ("cohere", "command-r-08-2024"): (20, None),
+    ("groq", "llama-3.1-8b-instant"): (30, 6_000),
+    ("groq", "llama-3.3-70b-versatile"): (30, 12_000),
+}
+
+# Tokens reserved for the answer when a request is admitted; corrected from the reported usage.
+OUTPUT_TOKEN_RESERVE = {"code_developer": 8000}
+DEFAULT_OUTPUT_TOKEN_RESERVE = 500
+
+# Provider SDKs are imported inside the factories so only the providers actually used are loaded.
+def _secret(name: str):
+    import streamlit as st
+    return st.secrets.get(name)
+
+def _pooled_http_client(provider: str):
+    """Keep-alive HTTP client shared by every call to one provider."""
+    import httpx
+    limit = PROVIDER_MAX_CONNECTIONS[provider]
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+
+def _pooled_async_http_client(provider: str):
+    """Async variant of _pooled_http_client; used from the shared graph event loop."""
+    import httpx
+    limit = PROVIDER_MAX_CONNECTIONS[provider]
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+
+def _google_client(model: str, **kwargs):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # The Gemini SDK keeps a single long-lived gRPC channel per client instance.
+    # Retries are scheduled by rate_limiter, not by the SDK.
+    kwargs.setdefault("max_retries", 0)
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=_secret("GEMINI_API_KEY"),
+        **kwargs,
+    )
+
+def _cohere_client(model: str, **kwargs):
+    import cohere
+    from langchain_cohere import ChatCohere
+    api_key = _secret("COHERE_API_KEY")
+    llm = ChatCohere(model=model, cohere_api_key=api_key, **kwargs)
+    # ChatCohere builds its own un-pooled client; swap in one backed by the shared pool.
+    llm.client = cohere.Client(
+        api_key=api_key,
+        client_name=llm.user_agent,
+        timeout=llm.timeout_seconds,
+        httpx_client=_pooled_http_client("cohere"),
+    )
+    llm.async_client = cohere.AsyncClient(
+        api_key=api_key,
+        client_name=llm.user_agent,
+        timeout=llm.timeout_seconds,
+        httpx_client=_pooled_async_http_client("cohere"),
+    )
+    return llm
+
+def _groq_client(model: str, **kwargs):
+    from langchain_groq import ChatGroq
+    kwargs.setdefault("max_retries", 0)
+    return ChatGroq(
+        model=model,
+        groq_api_key=_secret("GROQ_API_KEY"),
+        http_client=_pooled_http_client("groq"),
+        http_async_client=_pooled_async_http_client("groq"),
+        **kwargs,
+    )
+
+class ClientRegistry:
+    """
+    Process-wide cache of chat model clients keyed by provider and model.
+
+    Every Streamlit session imports the same module, so all sessions share these
+    clients and their keep-alive connections instead of reconnecting on every node.
+    """
+
+    def __init__(self, factories: dict, max_connections: dict):
+        self._factories = dict(factories)
+        self._max_connections = dict(max_connections)
+        self._clients = {}
+        # One lock per client key, so building one client (SDK import, auth setup) does not
+        # hold up lookups and builds of the others.
+        self._building = {}
+        self._slots = {}
+        self._async_slots = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, provider: str, factory, max_connections: int = 8):
+        """Adds or replaces the factory used to build clients for `provider`."""
+        with self._lock:
+            self._factories[provider] = factory
+            self._max_connections.setdefault(provider, max_connections)
+            self._clients = {k: v for k, v in self._clients.items() if k[0] != provider}
+
+    def get(self, provider: str, model: str, **kwargs):
+        """Returns the shared client for (provider, model), building it on first use."""
+        key = (provider, model, tuple(sorted(kwargs.items())))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            with self._lock:
+                # Another session may have built it while this one waited.
+                client = self._clients.get(key)
+                if client is not None:
+                    self.hits += 1
+                    return client
+                factory = self._factories[provider]
+            client = factory(model, **kwargs)
+            with self._lock:
+                self.misses += 1
+                # A factory replaced by register() meanwhile makes this client stale; don't share it.
+                if self._factories.get(provider) is factory:
+                    self._clients[key] = client
+            return client
+
+    @contextmanager
+    def connection(self, provider: str):
+        """Holds one of the provider's bounded connection slots for the duration of a call."""
+        with self._lock:
+            slot = self._slots.get(provider)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self._max_connections.get(provider, 8))
+                self._slots[provider] = slot
+        with slot:
+            yield
+
+    @asynccontextmanager
+    async def aconnection(self, provider: str):
+        """Async counterpart of `connection`, bounded per provider within the running event loop."""
+        key = (provider, id(asyncio.get_running_loop()))
+        with self._lock:
+            slot = self._async_slots.get(key)
+            if slot is None:
+                slot = asyncio.Semaphore(self._max_connections.get(provider, 8))
+                self._async_slots[key] = slot
+        async with slot:
+            yield
+
+    def set_max_connections(self, provider: str, limit: int):
+        """Changes the provider's concurrency bound; takes effect for calls started afterwards."""
+        with self._lock:
+            self._max_connections[provider] = limit
+            self._slots.pop(provider, None)
+            self._async_slots = {k: v for k, v in self._async_slots.items() if k[0] != provider}
+
+    def warm_up(self, specs):
+        """Builds the clients for the given (provider, model) pairs ahead of the first request."""
+        for provider, model in specs:
+            try:
+                self.get(provider, model)
+            except Exception as e:
+                print(f"Client warm-up failed for {provider}/{model}: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "clients": len(self._clients),
+        }
+
+client_registry = ClientRegistry(
+    factories={"google": _google_client, "cohere": _cohere_client, "groq": _groq_client},
+    max_connections=PROVIDER_MAX_CONNECTIONS,
+)
+
+
+# Prometheus-style metrics: METRICS_PORT serves them over HTTP, METRICS_FILE keeps a copy on disk.
+metrics.export_path = os.getenv("METRICS_FILE")
+if os.getenv("METRICS_PORT"):
+    metrics.serve(int(os.getenv("METRICS_PORT")))
+
+# Record/replay of LLM calls: LLM_CASSETTE_MODE=record|replay, LLM_CASSETTE_TIMING=1 replays original latency.
+cassette = Cassette(
+    os.getenv("LLM_CASSETTE_PATH", "data/llm_cassette.jsonl.gz"),
+    mode=os.getenv("LLM_CASSETTE_MODE", "off"),
+    emulate_timing=os.getenv("LLM_CASSETTE_TIMING", "0") == "1",
+)
+
+# Token buckets and the retry scheduler for every provider call in the process. Interactive
+# rounds are queued ahead of batch runs; 429s and transient errors are retried with backoff.
+rate_limiter = RateLimiter(
+    load_limits(MODEL_RATE_LIMITS, os.getenv("MODEL_RATE_LIMITS")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+)
+metrics.register_gauge(
+    "agent_rate_limit_queue_depth", "Provider calls waiting for rate-limit capacity.", rate_limiter.queue_depths
+)
+
+# Identical provider calls that overlap in time (same model, settings and normalized messages,
+# e.g. several sessions opening the same demo prompt) share one upstream request.
+# LLM_SINGLE_FLIGHT=0 sends every call on its own.
+single_flight = SingleFlight(enabled=os.getenv("LLM_SINGLE_FLIGHT", "1") == "1")
+metrics.register_counter(
+    "agent_llm_coalesced_calls_total", "LLM calls served by an identical call already in flight.",
+    lambda: [({"node": node}, count) for node, count in sorted(single_flight.stats()["by_node"].items())],
+)
+metrics.register_gauge(
+    "agent_llm_in_flight", "Distinct LLM requests in flight upstream.", lambda: [({}, single_flight.in_flight())]
+)
+
+def llm_span(spec, schema):
+    """Span for one LLM call, named after the node that makes it."""
+    kind = "structured_output" if schema is not None else "llm"
+    return span(kind, current_node.get() or "unknown", provider=spec[0], model=spec[1])
+
+def request_priority() -> int:
+    """Queue priority of the current run; batch runs pass {"configurable": {"priority": "batch"}}."""
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        return PRIORITIES["interactive"]
+    return PRIORITIES.get(configurable.get("priority", "interactive"), PRIORITIES["interactive"])
+
+def request_tokens(messages) -> int:
+    """Tokens charged against the model's tokens/minute bucket before the call is sent."""
+    prompt = sum(estimate_tokens(m) for m in convert_to_messages(messages))
+    return prompt + OUTPUT_TOKEN_RESERVE.get(current_node.get(), DEFAULT_OUTPUT_TOKEN_RESERVE)
+
+def response_tokens(response) -> int:
+    """Tokens the provider reported for a response; 0 when it sent no usage."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+def cassette_spec(spec, client_kwargs: dict):
+    """Cassette key part for a client; settings such as temperature are recorded separately."""
+    return (*spec, *(f"{key}={value}" for key, value in sorted(client_kwargs.items())))
+
+class StopWhenAbandoned(BaseCallbackHandler):
+    """
+    Ends a streaming call at its next token once its caller gave up on it (a routed request
+    that timed out or lost its hedge, a closed candidate fan-out), so the call stops spending
+    quota and its tokens never reach the UI.
+    """
+
+    raise_error = True
+    run_inline = True
+
+    def on_llm_new_token(self, token, **kwargs):
+        if not granted():
+            raise RequestAbandoned("the caller stopped waiting for the answer")
+
+stop_when_abandoned = StopWhenAbandoned()
+
+def llm_config(stream: bool):
+    # The call inherits the node's callbacks (graph streaming, tracing) with the abandonment
+    # check in front, so it runs before the graph's stream handler sees a token. Calls tagged
+    # "nostream" are left out of the graph's token stream.
+    callbacks = ensure_config().get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.handlers.insert(0, stop_when_abandoned)
+    else:
+        callbacks = [stop_when_abandoned, *(callbacks or [])]
+    config = {"callbacks": callbacks}
+    if not stream:
+        config["tags"] = [TAG_NOSTREAM]
+    return config
+
+def invoke_llm(spec, messages, schema=None, stream: bool = True, **client_kwargs):
+    """
+    Calls the (provider, model) client from the registry, optionally with structured output.
+    `client_kwargs` select a client with other settings (e.g. temperature); `stream=False`
+    keeps the call's tokens out of the UI stream.
+    """
+    with llm_span(spec, schema) as call:
+        coalesced = False
+        if cassette.replaying:
+            response = cassette.replay(cassette_spec(spec, client_kwargs), messages, schema)
+        else:
+            llm = client_registry.get(*spec, **client_kwargs)
+            runnable = llm.with_structured_output(schema) if schema is not None else llm
+            tokens = request_tokens(messages)
+
+            def request():
+                with client_registry.connection(spec[0]):
+                    return runnable.invoke(messages, config=llm_config(stream))
+
+            def upstream():
+                start = time.perf_counter()
+                response = rate_limiter.call(spec, tokens, request_priority(), request, span=call,
+                                             usage=response_tokens)
+                if cassette.recording:
+                    cassette.record(cassette_spec(spec, client_kwargs), messages, schema, response, time.perf_counter() - start)
+                return response
+
+            response, coalesced = single_flight.call(
+                flight_key(spec, messages, schema, client_kwargs), upstream, node=current_node.get()
+            )
+        # A coalesced call shared another session's upstream request and spent no tokens of its own.
+        call.attributes["coalesced"] = coalesced
+        if not coalesced:
+            call.add_usage(response)
+            speculator.charge(call.input_tokens + call.output_tokens)
+        return response
+
+async def ainvoke_llm(spec, messages, schema=None, stream: bool = True, **client_kwargs):
+    """Async counterpart of invoke_llm."""
+    with llm_span(spec, schema) as call:
+        coalesced = False
+        if cassette.replaying:
+            response = await cassette.areplay(cassette_spec(spec, client_kwargs), messages, schema)
+        else:
+            llm = client_registry.get(*spec, **client_kwargs)
+            runnable = llm.with_structured_output(schema) if schema is not None else llm
+            tokens = request_tokens(messages)
+
+            async def request():
+                async with client_registry.aconnection(spec[0]):
+                    return await runnable.ainvoke(messages, config=llm_config(stream))
+
+            async def upstream():
+                start = time.perf_counter()
+                response = await rate_limiter.acall(spec, tokens, request_priority(), request, span=call,
+                                                    usage=response_tokens)
+                if cassette.recording:
+                    cassette.record(cassette_spec(spec, client_kwargs), messages, schema, response, time.perf_counter() - start)
+                return response
+
+            response, coalesced = await single_flight.acall(
+                flight_key(spec, messages, schema, client_kwargs), upstream, node=current_node.get()
+            )
+        call.attributes["coalesced"] = coalesced
+        if not coalesced:
+            call.add_usage(response)
+            speculator.charge(call.input_tokens + call.output_tokens)
+        return response
+
+provider_router = ProviderRouter(NODE_ROUTES, invoke_llm, ainvoke_llm)
+
+# Size-aware model selection: each node call estimates how big the task is (a small edit or a
+# large build) and tries the models model_policy.json lists for that size before the route's
+# own. Off until model_policy.json (or the file MODEL_POLICY_PATH points at) says "enabled": true.
+model_selector = ModelSelector(
+    ModelPolicy.load(os.getenv("MODEL_POLICY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_policy.json"))),
+    NODE_ROUTES,
+)
+
+def route_llm(node: str, state: MessagesState, messages, schema=None):
+    """Runs a node's LLM call through its route, on the models the policy picks for the task."""
+    choice = model_selector.choose(node, state["messages"])
+    start = time.perf_counter()
+    response, answered = provider_router.route(node, messages, schema, models=choice.models)
+    model_selector.record(choice, messages, response, time.perf_counter() - start, answered)
+    return response
+
+async def aroute_llm(node: str, state: MessagesState, messages, schema=None):
+    choice = model_selector.choose(node, state["messages"])
+    start = time.perf_counter()
+    response, answered = await provider_router.aroute(node, messages, schema, models=choice.models)
+    model_selector.record(choice, messages, response, time.perf_counter() - start, answered)
+    return response
+
+# Multi-candidate generation: full code generations can fan out to several model and
+# temperature variants at once, and the best-scoring answer goes on to the validator. The
+# number of candidates comes from the run config ({"configurable": {"candidates": 3}}) or
+# CODE_CANDIDATES; 1 keeps a single call through the provider router.
+CANDIDATE_VARIANTS = [
+    Variant(DEVELOPER_MODEL),
+    Variant(DEVELOPER_MODEL, {"temperature": 1.0}),
+    Variant(("google", "gemini-2.0-flash")),
+    Variant(("groq", "llama-3.3-70b-versatile"), {"temperature": 0.7}),
+]
+
+candidate_generator = CandidateGenerator(
+    CANDIDATE_VARIANTS,
+    call=lambda variant, messages, stream: invoke_llm(variant.spec, messages, stream=stream, **variant.client_kwargs),
+    acall=lambda variant, messages, stream: ainvoke_llm(variant.spec, messages, stream=stream, **variant.client_kwargs),
+    score=score_candidate,
+    grace=float(os.getenv("CANDIDATE_GRACE", "0.5")),
+    # The fan-out as a whole gets the same time as one code_developer attempt.
+    timeout=NODE_ROUTES["code_developer"].timeout,
+)
+
+def candidate_count() -> int:
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        configurable = {}
+    return int(configurable.get("candidates") or os.getenv("CODE_CANDIDATES", "1"))
+
+
+# Approximate token budget for the conversation history each node sends to its LLM.
+CONTEXT_TOKEN_BUDGETS = {"supervisor": 1500, "enhancer": 3000, "code_developer": 30000}
+
+def node_context(node: str, messages):
+    """Compacts the history before an LLM call, keeping it within the node's token budget."""
+    # The code developer edits the latest code, so it always gets it verbatim.
+    compacted = compact_messages(messages, CONTEXT_TOKEN_BUDGETS[node], keep_code=node == "code_developer")
+    before = sum(estimate_tokens(m) for m in messages)
+    after = sum(estimate_tokens(m) for m in compacted)
+    if after < before:
+        print(f"--- Context compaction ({node}): ~{before} → ~{after} tokens ---")
+    return compacted
+
+# Approved code for previous requests, stored next to the checkpoint database.
+# Near matches (similar wording of a cached prompt) are off unless RESPONSE_CACHE_SIMILARITY
+# sets a trigram threshold such as 0.9; they are checked statically before being served.
+# Opened on first use, like the checkpointer (module-level `response_cache` resolves through
+# __getattr__ as well).
+@lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(
+        "data/response_cache.db",
+        similarity_threshold=float(os.environ["RESPONSE_CACHE_SIMILARITY"]) if os.getenv("RESPONSE_CACHE_SIMILARITY") else None,
+    )
+
+@traced_node("cache")
+def cache_node(state: MessagesState) -> Command[Literal["supervisor", "__end__"]]:
+    """
+    Serves approved code for a new request that matches (or nearly matches) a cached one,
+    skipping the whole supervisor → code_developer → validator chain.
+    """
+    messages = state["messages"]
+    if len(messages) == 1 and isinstance(messages[0].content, str):
+        request = messages[0].content
+        cached_code = get_response_cache().get(request, validate=lambda code: validate_code(code, request).ok)
+        if cached_code is not None:
+            print("--- Workflow Transition: Response Cache → END ---")
+            return Command(
+                update={"messages": [HumanMessage(content=cached_code, name="code_developer")]},
+                goto=END,
+            )
+    return Command(goto="supervisor")
+
+# Local routing stage that answers obvious cases before the supervisor LLM call. It learns from
+# the latest supervisor decisions, kept as word counts (not prompts) in the history file.
+fast_router = FastRouter(history_path="data/routing_history.jsonl")
+
+# SPECULATIVE_EXECUTION=1 starts the node the fast router predicts at the same time as the
+# supervisor LLM call, when the prediction is at least SPECULATION_MIN_CONFIDENCE likely.
+speculator = Speculator(
+    enabled=os.getenv("SPECULATIVE_EXECUTION", "0") == "1",
+    min_confidence=float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.5")),
+)
+
 class Supervisor(BaseModel):
     next: Literal["enhancer", "code_developer"] = Field(
         description="Determines which specialist to activate next in the workflow sequence: "
@@ -35,8 +559,23 @@ class Supervisor(BaseModel):
         description="Detailed justification for the routing decision, explaining the rationale behind selecting the particular specialist and how this advances the task toward completion."
     )
 
-def supervisor_node(state: MessagesState) -> Command[Literal["enhancer", "code_developer" ]]:
+def supervisor_fast_path(state: MessagesState):
+    """Returns the routing Command when the local router is confident, otherwise None."""
+    fast_decision = fast_router.route(state["messages"])
+    if fast_decision is None:
+        return None
+    goto, reason = fast_decision
+    print(f"--- Workflow Transition: Supervisor (fast path) → {goto.upper()} ---")
+    return Command(
+        update={
+            "messages": [
+                HumanMessage(content=reason, name="supervisor")
+            ]
+        },
+        goto=goto,
+    )
 
+def supervisor_messages(state: MessagesState):
     system_prompt = ('''
                  
                 You are a Workflow Supervisor orchestrating a team of two specialized agents: a **Prompt Enhancer** and a **Code Developer**. Your goal is to route the user's request to the most appropriate agent to ensure a smooth, efficient workflow.
@@ -49,16 +588,14 @@ def supervisor_node(state: MessagesState) -> Command[Literal["enhancer", "code_d
 - **Always provide a concise rationale for your routing decision.**
     ''')
     
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},  
-    ] + state["messages"] 
-    llm= ChatCohere(
-    model="command-r-plus-08-2024",
-    cohere_api_key=st.secrets.get("COHERE_API_KEY"))
-    response = llm.with_structured_output(Supervisor).invoke(messages)
+    ] + node_context("supervisor", state["messages"])
 
+def supervisor_command(state: MessagesState, response: Supervisor):
     goto = response.next
     reason = response.reason
+    fast_router.record(state["messages"], goto)
 
     print(f"--- Workflow Transition: Supervisor → {goto.upper()} ---")
     
@@ -70,13 +607,45 @@ def supervisor_node(state: MessagesState) -> Command[Literal["enhancer", "code_d
         },
         goto=goto,  
     )
-def enhancer(state: MessagesState) -> Command[Literal["supervisor"]]:
 
-    """
-        Enhancer agent node that improves and clarifies user queries.
-        Takes the original user input and transforms it into a more precise,
-        actionable request before passing it to the supervisor.
-    """
+def start_speculation(state: MessagesState, asynchronous: bool = False):
+    """Starts the predicted next node's work alongside the supervisor call, when enabled."""
+    node, confidence = fast_router.predict(state["messages"])
+    thread_id = current_thread_id.get()
+    if not speculator.should_start(thread_id, confidence):
+        return None
+    work, awork = SPECULATIVE_WORK[node]
+    if asynchronous:
+        return speculator.astart(thread_id, node, state, awork)
+    return speculator.start(thread_id, node, state, work)
+
+@traced_node("supervisor")
+def supervisor_node(state: MessagesState) -> Command[Literal["enhancer", "code_developer" ]]:
+    fast_command = supervisor_fast_path(state)
+    if fast_command is not None:
+        return fast_command
+    speculation = start_speculation(state)
+    response = None
+    try:
+        response = route_llm("supervisor", state, supervisor_messages(state), Supervisor)
+    finally:
+        speculator.resolve(speculation, response.next if response is not None else None)
+    return supervisor_command(state, response)
+
+@traced_node("supervisor")
+async def asupervisor_node(state: MessagesState) -> Command[Literal["enhancer", "code_developer" ]]:
+    fast_command = supervisor_fast_path(state)
+    if fast_command is not None:
+        return fast_command
+    speculation = start_speculation(state, asynchronous=True)
+    response = None
+    try:
+        response = await aroute_llm("supervisor", state, supervisor_messages(state), Supervisor)
+    finally:
+        speculator.resolve(speculation, response.next if response is not None else None)
+    return supervisor_command(state, response)
+
+def enhancer_messages(state: MessagesState):
     system_prompt =( """
     You are a Query Refinement Specialist. Your sole task is to transform ambiguous user requests into a single, clear, and comprehensive instruction for a Code Developer.
 
@@ -87,14 +656,12 @@ def enhancer(state: MessagesState) -> Command[Literal["supervisor"]]:
 - **Do not ask questions. Do not provide explanations.**
 - **Your entire response must be the final, refined query and nothing else.**
 """)
-    
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},  
-    ] + state["messages"]  
-
-    enhanced_query = llm.invoke(messages)
+    ] + node_context("enhancer", state["messages"])
 
+def enhancer_command(enhanced_query):
     print(f"--- Workflow Transition: Prompt Enhancer → Supervisor ---")
 
     return Command(
@@ -108,16 +675,76 @@ def enhancer(state: MessagesState) -> Command[Literal["supervisor"]]:
         },
         goto="supervisor", 
     )
-# Updated code_developer function
-def code_developer(state: MessagesState) -> Command[Literal["validator"]]:
+
+@traced_node("enhancer")
+def enhancer(state: MessagesState) -> Command[Literal["supervisor"]]:
     """
-    Code developer node that generates and debugs the code based on the query.
+        Enhancer agent node that improves and clarifies user queries.
+        Takes the original user input and transforms it into a more precise,
+        actionable request before passing it to the supervisor.
     """
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=st.secrets.get("GEMINI_API_KEY")
-    )
-    
+    enhanced_query = speculator.take("enhancer", state)
+    if enhanced_query is None:
+        enhanced_query = enhance(state)
+    return enhancer_command(enhanced_query)
+
+@traced_node("enhancer")
+async def aenhancer(state: MessagesState) -> Command[Literal["supervisor"]]:
+    enhanced_query = await speculator.atake("enhancer", state)
+    if enhanced_query is None:
+        enhanced_query = await aenhance(state)
+    return enhancer_command(enhanced_query)
+
+def enhance(state: MessagesState):
+    return route_llm("enhancer", state, enhancer_messages(state))
+
+async def aenhance(state: MessagesState):
+    return await aroute_llm("enhancer", state, enhancer_messages(state))
+
+# Feedback rounds ask the developer for search/replace patches against the latest code
+# instead of regenerating every file; a patch that does not apply falls back to a full rewrite.
+EDIT_MODE = True
+
+def latest_generated_code(messages):
+    """Returns the content of the most recent code_developer message, if any."""
+    for msg in reversed(messages):
+        if msg.name == "code_developer":
+            return msg.content
+    return None
+
+def patch_messages(history):
+    """Prompt asking for search/replace edits against the latest code."""
+    patch_prompt = """
+        You are a Frontend Code Developer editing an existing project made of index.html, style.css and script.js.
+        The most recent code_developer message contains the current code. Apply the user's latest feedback with
+        the smallest possible edits.
+
+        **Output only search/replace blocks, one per edit, in this exact format:**
+
+        FILE: style.css
+        <<<<<<< SEARCH
+        exact lines copied from the current file
+        =======
+        the replacement lines
+        >>>>>>> REPLACE
+
+        - FILE must be one of index.html, style.css, script.js.
+        - SEARCH must match the current file exactly and only once; use an empty SEARCH to append to a file.
+        - Do not include code fences, explanations, or unchanged files.
+        """
+    return [{"role": "system", "content": patch_prompt}] + history
+
+def apply_code_patch(latest_code, patch_response):
+    """Applies the developer's search/replace edits; returns None when they do not apply."""
+    try:
+        patched = apply_patches(latest_code, patch_response.content)
+    except PatchError as e:
+        print(f"--- Code Developer: patch failed ({e}); regenerating the full code ---")
+        return None
+    print("--- Code Developer: applied incremental patch ---")
+    return patched
+
+def developer_messages(history):
     system_prompt = """
 
         You are a highly skilled Frontend Code Developer specializing in HTML, CSS, and JavaScript.
@@ -154,14 +781,31 @@ def code_developer(state: MessagesState) -> Command[Literal["validator"]]:
         });
         ```
         """
-        
-    messages = [
+
+    return [
         {"role": "system", "content": system_prompt},
-    ] + state["messages"]
+    ] + history
 
-    result = llm.invoke(messages)
-    generated_content = result.content
-    
+def patch_target(state: MessagesState):
+    """
+    Returns the code a feedback round should patch, or None for a full generation. Only user
+    feedback on the latest code is patched; after a validator or static-check rejection the
+    code was judged wrong and is regenerated in full.
+    """
+    if not EDIT_MODE:
+        return None
+    for msg in reversed(state["messages"]):
+        if msg.name == "code_developer":
+            # The newest code came after the user's latest message: nothing to patch it with.
+            return None
+        if msg.type == "human" and msg.name is None:
+            break
+    latest_code = latest_generated_code(state["messages"])
+    if latest_code and any(parse_code(latest_code)):
+        return latest_code
+    return None
+
+def developer_command(generated_content):
     print("--- Workflow Transition: Code Developer → Validator ---")
     
     return Command(
@@ -176,6 +820,70 @@ def code_developer(state: MessagesState) -> Command[Literal["validator"]]:
         goto="validator", 
     )
 
+# Updated code_developer function
+@traced_node("code_developer")
+def code_developer(state: MessagesState) -> Command[Literal["validator"]]:
+    """
+    Code developer node that generates and debugs the code based on the query.
+    """
+    generated_content = speculator.take("code_developer", state)
+    if generated_content is None:
+        generated_content = generate_code(state)
+    return developer_command(generated_content)
+
+@traced_node("code_developer")
+async def acode_developer(state: MessagesState) -> Command[Literal["validator"]]:
+    generated_content = await speculator.atake("code_developer", state)
+    if generated_content is None:
+        generated_content = await agenerate_code(state)
+    return developer_command(generated_content)
+
+def generate_code(state: MessagesState) -> str:
+    """Patches the latest code for a feedback round, or generates it in full."""
+    history = node_context("code_developer", state["messages"])
+    generated_content = None
+    latest_code = patch_target(state)
+    if latest_code:
+        generated_content = apply_code_patch(latest_code, route_llm("code_developer", state, patch_messages(history)))
+    if generated_content is None:
+        generated_content = generate_full_code(state, history)
+    return generated_content
+
+async def agenerate_code(state: MessagesState) -> str:
+    history = node_context("code_developer", state["messages"])
+    generated_content = None
+    latest_code = patch_target(state)
+    if latest_code:
+        generated_content = apply_code_patch(latest_code, await aroute_llm("code_developer", state, patch_messages(history)))
+    if generated_content is None:
+        generated_content = await agenerate_full_code(state, history)
+    return generated_content
+
+def generate_full_code(state: MessagesState, history) -> str:
+    """Generates the complete code, from several ranked candidates when the run asks for them."""
+    count = candidate_count()
+    if count > 1:
+        try:
+            return candidate_generator.generate(developer_messages(history), state["messages"][0].content, count)
+        except CandidatesFailed as e:
+            print(f"--- Candidates: none succeeded ({e}); falling back to the provider router ---")
+    return route_llm("code_developer", state, developer_messages(history)).content
+
+async def agenerate_full_code(state: MessagesState, history) -> str:
+    count = candidate_count()
+    if count > 1:
+        try:
+            return await candidate_generator.agenerate(developer_messages(history), state["messages"][0].content, count)
+        except CandidatesFailed as e:
+            print(f"--- Candidates: none succeeded ({e}); falling back to the provider router ---")
+    return (await aroute_llm("code_developer", state, developer_messages(history))).content
+
+# LLM work of the nodes the supervisor can route to, run speculatively by start_speculation.
+SPECULATIVE_WORK = {
+    "enhancer": (enhance, aenhance),
+    "code_developer": (generate_code, agenerate_code),
+}
+
 class ValidatorLLM(BaseModel):
     next: Literal["supervisor", "__end__"] = Field(
         description="Specifies the next worker in the pipeline: 'supervisor' to continue or '__end__' to terminate."
@@ -184,26 +892,6 @@ class ValidatorLLM(BaseModel):
         description="The reason for the decision."
     )
 
-def parse_code(content: str):
-    """Parses HTML, CSS, and JS from code blocks using a more flexible regex."""
-    html_code = ""
-    css_code = ""
-    js_code = ""
-
-    html_match = re.search(r"```html\s*([\s\S]*?)\s*```", content)
-    if html_match:
-        html_code = html_match.group(1).strip()
-    
-    css_match = re.search(r"```css\s*([\s\S]*?)\s*```", content)
-    if css_match:
-        css_code = css_match.group(1).strip()
-
-    js_match = re.search(r"```javascript\s*([\s\S]*?)\s*```", content)
-    if js_match:
-        js_code = js_match.group(1).strip()
-
-    return html_code, css_code, js_code
-
 def create_project_from_output(agent_output_content: str, folder_name: str = "project"):
     """
     Parses agent output and creates a folder containing index.html, style.css, and script.js.
@@ -211,19 +899,22 @@ def create_project_from_output(agent_output_content: str, folder_name: str = "pr
     Args:
         agent_output_content (str): The string content from the agent's final output.
         folder_name (str): The name of the folder to create.
+
+    Returns:
+        bool: True when the files were written, False when nothing was.
     """
     html_code, css_code, js_code = parse_code(agent_output_content)
 
     if not html_code and not css_code and not js_code:
         print("Error: No valid code blocks found in the agent's output. Files not created.")
-        return
+        return False
 
     try:
         os.makedirs(folder_name, exist_ok=True)
         print(f"Directory '{folder_name}' created or already exists.")
     except OSError as e:
         print(f"Error creating directory: {e}")
-        return
+        return False
 
     file_contents = {
         "index.html": html_code,
@@ -236,18 +927,46 @@ def create_project_from_output(agent_output_content: str, folder_name: str = "pr
         with open(file_path, "w", encoding="utf-8") as file:
             file.write(content)
             print(f"File '{file_path}' created successfully.")
+    return True
 
-# --- Validator Node (Modified) ---
-def validator_node(state: MessagesState) -> Command[Literal["supervisor", "__end__"]]:
-    llm_validator = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite", 
-        google_api_key=st.secrets.get("GEMINI_API_KEY")
-    )
-    
-    last_message = state["messages"][-1]
-    generated_code = last_message.content
-    user_question = state["messages"][0].content
-    
+# Consecutive static-check rejections sent straight back to the developer before the
+# validator gives up and lets the LLM check decide.
+MAX_STATIC_REJECTIONS = 2
+STATIC_REJECTION_PREFIX = "Static validation failed"
+
+def static_rejections(messages) -> int:
+    """Counts static-check rejections since the user's latest message."""
+    count = 0
+    for msg in reversed(messages):
+        if msg.name is None:
+            break
+        if msg.name == "validator" and str(msg.content).startswith(STATIC_REJECTION_PREFIX):
+            count += 1
+    return count
+
+def static_precheck(state: MessagesState, user_question: str, generated_code: str):
+    """
+    Runs the local checks. Returns (rejection, needs_llm_check): a Command sending obviously
+    broken code back to code_developer, and whether the LLM relevance check is still needed.
+    """
+    report = validate_code(generated_code, user_question)
+    if not report.ok and static_rejections(state["messages"]) < MAX_STATIC_REJECTIONS:
+        problems = "; ".join(report.errors)
+        print(f"--- Static validation failed ({problems}). Routing back to Code Developer. ---")
+        return Command(
+            update={"messages": [HumanMessage(
+                content=f"{STATIC_REJECTION_PREFIX}: {problems}. Fix these problems and return the complete code.",
+                name="validator",
+            )]},
+            goto="code_developer"
+        ), False
+
+    if report.high_confidence:
+        print("Static validation passed with high confidence; skipping the LLM check.")
+        return None, False
+    return None, True
+
+def validator_messages(user_question: str, generated_code: str):
     system_prompt = '''
     Your task is to ensure the generated code is relevant to the user's initial question.
     - Review the user's original request.
@@ -257,14 +976,14 @@ def validator_node(state: MessagesState) -> Command[Literal["supervisor", "__end
     - Accept code that is "good enough" rather than perfect, focusing on relevance.
     '''
     
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_question},
         {"role": "assistant", "content": generated_code},
     ]
 
-    llm_response = llm_validator.with_structured_output(ValidatorLLM).invoke(messages)
-    
+def validator_llm_outcome(llm_response: ValidatorLLM):
+    """Returns a Command back to the supervisor when the LLM rejects the code, otherwise None."""
     goto = llm_response.next
     reason = llm_response.reason
     
@@ -276,15 +995,78 @@ def validator_node(state: MessagesState) -> Command[Literal["supervisor", "__end
             update={"messages": [HumanMessage(content=f"LLM validation failed: {reason}", name="validator")]},
             goto="supervisor"
         )
+    return None
+
+# --- Validator Node (Modified) ---
+@traced_node("validator")
+def validator_node(state: MessagesState, config: RunnableConfig) -> Command[Literal["code_developer", "supervisor", "__end__"]]:
+    generated_code = state["messages"][-1].content
+    user_question = state["messages"][0].content
+
+    rejection, needs_llm_check = static_precheck(state, user_question, generated_code)
+    if rejection is not None:
+        return rejection
+    if needs_llm_check:
+        llm_response = route_llm("validator", state, validator_messages(user_question, generated_code), ValidatorLLM)
+        llm_rejection = validator_llm_outcome(llm_response)
+        if llm_rejection is not None:
+            return llm_rejection
+    return review_outcome(state, user_question, generated_code, *approval_settings(config))
+
+@traced_node("validator")
+async def avalidator_node(state: MessagesState, config: RunnableConfig) -> Command[Literal["code_developer", "supervisor", "__end__"]]:
+    generated_code = state["messages"][-1].content
+    user_question = state["messages"][0].content
+
+    rejection, needs_llm_check = static_precheck(state, user_question, generated_code)
+    if rejection is not None:
+        return rejection
+    if needs_llm_check:
+        llm_response = await aroute_llm("validator", state, validator_messages(user_question, generated_code), ValidatorLLM)
+        llm_rejection = validator_llm_outcome(llm_response)
+        if llm_rejection is not None:
+            return llm_rejection
+    return review_outcome(state, user_question, generated_code, *approval_settings(config))
+
+def approval_settings(config: RunnableConfig):
+    """
+    (auto_approve, cache_result) for a run. Auto-approved runs (headless batch jobs) keep
+    their code out of the interactive response cache unless started with "cache_results": True.
+    """
+    configurable = config.get("configurable", {})
+    auto_approve = configurable.get("auto_approve", False)
+    return auto_approve, configurable.get("cache_results", not auto_approve)
 
+def approved_as_requested(messages, auto_approve: bool = False) -> bool:
+    """
+    True when the approved code answers the thread's first request as sent, with no feedback
+    rounds in between. Code customized over several rounds ("make the header blue", "add a
+    cart") must not be cached under the opening prompt, where the next user sending that
+    prompt would get it.
+    """
+    requests = [m for m in messages if m.type == "human" and m.name is None]
+    if not auto_approve and len(requests) > 1:
+        # The latest user message is the approval itself.
+        requests = requests[:-1]
+    return len(requests) == 1
 
+def review_outcome(state: MessagesState, user_question: str, generated_code: str, auto_approve: bool = False,
+                   cache_result: bool = True):
+    """
+    Ends the run with the approved code when the user has approved it (or the run was started
+    with `auto_approve`, as headless batch runs are), otherwise awaits review. Approved code
+    goes into the response cache when `cache_result` is set and no feedback rounds changed it.
+    """
+    # Node outputs are HumanMessages too; only unnamed messages come from the user.
     human_feedback_message = None
     for msg in reversed(state["messages"]):
-        if msg.role == "human":
+        if msg.type == "human" and msg.name is None:
             human_feedback_message = msg
             break
             
-    if human_feedback_message:
+    if auto_approve:
+        feedback_content = "ok"
+    elif human_feedback_message:
         feedback_content = human_feedback_message.content.strip().lower()
     else:
         feedback_content = ""
@@ -294,18 +1076,21 @@ def validator_node(state: MessagesState) -> Command[Literal["supervisor", "__end
 
     if feedback_content in ["ok", "ok.", "yes", "looks good", "bye"]:
         print("Human approval granted. Workflow transitioning to END.")
+        if cache_result and approved_as_requested(state["messages"], auto_approve):
+            get_response_cache().put(user_question, generated_code)
         
+        html_code, css_code, js_code = parse_code(generated_code)
         final_code_output = f"""
             Final Code Approved!
             Here is the complete and final code for your frontend:
             ```html
-            {parse_code(generated_code)[0]}
+            {html_code}
             ```
             ```css
-            {parse_code(generated_code)[1]}
+            {css_code}
             ```
             ```javascript
-            {parse_code(generated_code)[2]}
+            {js_code}
             ```
         """
         
@@ -314,30 +1099,118 @@ def validator_node(state: MessagesState) -> Command[Literal["supervisor", "__end
             goto=END
         )
     else:
-        print("User requested changes. Routing back to supervisor.")
-        feedback_message = f"The user provided the following feedback: '{feedback_content}'. The code needs to be updated to address this."
-        
-        return Command(
-            update={"messages": [HumanMessage(content=feedback_message, name="validator")]},
-            goto="supervisor"
-        )
+        # The user's feedback on this code arrives as the next run of the graph, which
+        # already starts at the supervisor; routing back here would regenerate in a loop.
+        print("Code ready for user review. Workflow transitioning to END.")
+        return Command(goto=END)
 graph = StateGraph(MessagesState)
 
-graph.add_node("supervisor", supervisor_node) 
-graph.add_node("enhancer", enhancer)  
+graph.add_node("cache", cache_node)
+# Each agent node has a sync and an async implementation: app.stream/invoke run the former,
+# app.astream/ainvoke the latter.
+graph.add_node("supervisor", RunnableLambda(supervisor_node, afunc=asupervisor_node, name="supervisor"),
+               destinations=("enhancer", "code_developer"))
+graph.add_node("enhancer", RunnableLambda(enhancer, afunc=aenhancer, name="enhancer"),
+               destinations=("supervisor",))
 
-graph.add_node("code_developer", code_developer) 
-graph.add_node("validator", validator_node)  
+graph.add_node("code_developer", RunnableLambda(code_developer, afunc=acode_developer, name="code_developer"),
+               destinations=("validator",))
+graph.add_node("validator", RunnableLambda(validator_node, afunc=avalidator_node, name="validator"),
+               destinations=("code_developer", "supervisor", END))
 
-graph.add_edge(START, "supervisor")  
+graph.add_edge(START, "cache")  
 # 
 
 # 
-app = graph.compile(checkpointer=checkpointer)
+@lru_cache(maxsize=None)
+def get_app():
+    """The graph compiled with the shared checkpointer."""
+    return graph.compile(checkpointer=get_checkpointer())
+
+# Nodes whose LLM tokens are forwarded by stream_graph while they are generated.
+TOKEN_STREAMING_NODES = {"code_developer"}
+
+def stream_graph(inputs, config, stream_tokens: bool = True):
+    """
+    Runs the graph and yields its events as they happen.
+
+    Yields ("update", event) for every node update, and, when `stream_tokens` is set,
+    ("token", text) for each chunk produced by the nodes in TOKEN_STREAMING_NODES.
+    """
+    stream_mode = ["updates", "messages"] if stream_tokens else ["updates"]
+    for mode, chunk in get_app().stream(inputs, config=config, stream_mode=stream_mode):
+        if mode == "messages":
+            message, metadata = chunk
+            # Only LLM chunks; the node's final HumanMessage is reported as an update.
+            if not isinstance(message, AIMessageChunk) or not isinstance(message.content, str):
+                continue
+            if metadata.get("langgraph_node") in TOKEN_STREAMING_NODES and message.content:
+                yield "token", message.content
+        else:
+            yield "update", chunk
+
+async def astream_graph(inputs, config, stream_tokens: bool = True):
+    """Async counterpart of stream_graph, driven by app.astream and the async node implementations."""
+    stream_mode = ["updates", "messages"] if stream_tokens else ["updates"]
+    async for mode, chunk in get_app().astream(inputs, config=config, stream_mode=stream_mode):
+        if mode == "messages":
+            message, metadata = chunk
+            if not isinstance(message, AIMessageChunk) or not isinstance(message.content, str):
+                continue
+            if metadata.get("langgraph_node") in TOKEN_STREAMING_NODES and message.content:
+                yield "token", message.content
+        else:
+            yield "update", chunk
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def graph_event_loop():
+    """Returns the process-wide event loop on which every async graph run is scheduled."""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="graph-event-loop", daemon=True).start()
+    return _event_loop
+
+def stream_graph_async(inputs, config, stream_tokens: bool = True):
+    """
+    Runs astream_graph on the shared event loop and yields its events to the calling thread.
+
+    Sessions only wait on a queue while the LLM calls of every session are multiplexed on one
+    loop. Closing the generator early cancels the run, like abandoning app.stream would.
+    """
+    events = queue.Queue()
+
+    async def pump():
+        try:
+            async for event in astream_graph(inputs, config, stream_tokens=stream_tokens):
+                events.put(event)
+        except BaseException as e:
+            events.put(("error", e))
+        finally:
+            events.put(None)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), graph_event_loop())
+    try:
+        while (event := events.get()) is not None:
+            if event[0] == "error":
+                raise event[1]
+            yield event
+    finally:
+        future.cancel()
 
 ##
-def retrieve_all_threads():
-    all_threads = set()
-    for checkpoint in checkpointer.list(None):
-        all_threads.add(checkpoint.config['configurable']['thread_id'])
-    return list(all_threads)
+def retrieve_all_threads(limit: int = 20, offset: int = 0):
+    """Returns one page of thread ids from the thread catalog, most recently updated first."""
+    return [row["thread_id"] for row in get_checkpointer().list_threads(limit=limit, offset=offset)]
+
+def __getattr__(name):
+    if name == "app":
+        return get_app()
+    if name == "checkpointer":
+        return get_checkpointer()
+    if name == "response_cache":
+        return get_response_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
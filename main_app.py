@@ -4,15 +4,26 @@ import shutil
 import base64
 import zipfile
 from pathlib import Path
-from main_agent import app, create_project_from_output, parse_code,retrieve_all_threads
+from main_agent import get_app, get_checkpointer, NODE_MODELS, create_project_from_output, parse_code, CodeFenceParser, retrieve_all_threads, client_registry, fast_router, get_response_cache, stream_graph, stream_graph_async, metrics, provider_router, rate_limiter, speculator, candidate_generator, CANDIDATE_VARIANTS, single_flight, model_selector
 from langchain_core.messages import HumanMessage, BaseMessage
+from pipeline import PipelineRun
 from io import BytesIO
 import re
 import uuid
 import time
+import threading
 
 st.set_page_config(page_title="Agentic Frontend Developer", page_icon="🤖")
 
+@st.cache_resource
+def load_agent():
+    """Compiles the graph and opens the checkpointer once per process; reruns reuse them."""
+    # Provider SDKs load on first use; build the node clients off the critical path.
+    threading.Thread(target=client_registry.warm_up, args=(NODE_MODELS,), daemon=True, name="client-warm-up").start()
+    return get_app(), get_checkpointer()
+
+app, checkpointer = load_agent()
+
 def generate_thread_name(user_question: str):
     """Generate a thread name from the first 5 words + timestamp"""
     prompt_words = user_question.lower().split()[:5]
@@ -28,6 +39,8 @@ def add_thread(thread_name):
 
 def reset_chat():
     """Reset chat and clear current thread"""
+    finish_pipeline_run(cancel=True)
+    st.session_state.pop('validation_status', None)
     st.session_state['thread_id'] = None
     st.session_state['messages'] = []
     st.session_state['latest_code'] = ""
@@ -46,41 +59,140 @@ def get_latest_code_from_messages(messages):
             return msg["content"]
     return ""
 
+def render_preview(html_code, css_code, js_code):
+    scrollable_html = f"""
+<div style="height:500px; overflow:auto; border:1px solid #ccc; padding:10px;">
+    <style>{css_code}</style>
+    {html_code}
+    <script>{js_code}</script>
+</div>
+"""
+    st.components.v1.html(scrollable_html, height=500)
+
+# Run the graph with the async nodes on the process-wide event loop instead of
+# holding this session's thread inside blocking LLM calls.
+USE_ASYNC_GRAPH = True
+
+# Minimum seconds between redraws of the streamed code and of the live preview.
+CODE_REFRESH_INTERVAL = 0.1
+PREVIEW_REFRESH_INTERVAL = 1.0
+
+# Seconds between checks of a run that is still validating in the background.
+PIPELINE_POLL_INTERVAL = 1.0
+
+VALIDATION_BADGES = {
+    "generating": ("Generating…", "gray"),
+    "validating": ("Validating…", "blue"),
+    "regenerating": ("Validation failed · regenerating…", "orange"),
+    "passed": ("Validated", "green"),
+    "approved": ("Approved", "green"),
+    "error": ("Validation error", "red"),
+    "cancelled": ("Validation skipped", "gray"),
+}
+
+def sync_pipeline_run():
+    """Copies new code and the outcome of the session's background run into session state."""
+    run = st.session_state.get("pipeline_run")
+    if run is None:
+        return
+    snapshot = run.snapshot()
+    thread_name = st.session_state.pipeline_thread
+    if snapshot["version"] > st.session_state.pipeline_version:
+        st.session_state.pipeline_version = snapshot["version"]
+        st.session_state.latest_code = snapshot["code"]
+        st.session_state.messages.append({"role": "code", "content": snapshot["code"]})
+        st.session_state.show_preview = True
+    st.session_state.validation_status = (snapshot["status"], snapshot["detail"])
+    if snapshot["finished"]:
+        if snapshot["final_message"] and "Final Code Approved!" in str(snapshot["final_message"]):
+            st.session_state.messages.append({"role": "assistant", "content": snapshot["final_message"]})
+            st.session_state.show_preview = False
+        st.session_state.pipeline_run = None
+    st.session_state.chat_threads[thread_name] = st.session_state.messages.copy()
+
+def finish_pipeline_run(cancel: bool = False):
+    """Waits for (or cancels) the background run before the thread is changed again."""
+    run = st.session_state.get("pipeline_run")
+    if run is None:
+        return
+    if cancel:
+        run.cancel()
+        sync_pipeline_run()
+        st.session_state.pipeline_run = None
+    else:
+        with st.spinner("Finishing validation of the current code…"):
+            run.wait()
+        sync_pipeline_run()
+
+def render_validation_badge():
+    status, detail = st.session_state.get("validation_status", ("generating", ""))
+    label, color = VALIDATION_BADGES[status]
+    st.badge(label, color=color)
+    if detail:
+        st.caption(detail)
+
+@st.fragment(run_every=PIPELINE_POLL_INTERVAL)
+def poll_validation():
+    """Refreshes the badge while validation runs; reruns the app when new code or a result arrives."""
+    run = st.session_state.get("pipeline_run")
+    if run is not None:
+        snapshot = run.snapshot()
+        if snapshot["finished"] or snapshot["version"] != st.session_state.pipeline_version:
+            st.rerun()
+        st.session_state.validation_status = (snapshot["status"], snapshot["detail"])
+    render_validation_badge()
+
 def process_agent_stream(user_input, thread_name, is_feedback=False):
+    """
+    Streams the run until its code is ready. In pipeline mode the preview is shown right away
+    and validation (plus any regeneration it triggers) continues in the background; otherwise
+    the whole run is consumed here. Either way the stream is never interrupted by a rerun.
+    """
     inputs = {"messages": [("user", user_input)]}
-    config = {"configurable": {"thread_id": thread_name}}
+    config = {"configurable": {"thread_id": thread_name, "candidates": st.session_state.get("candidates", 1)}}
+
+    stream_tokens = st.session_state.get("stream_tokens", True)
+    pipeline_mode = st.session_state.get("pipeline_mode", True)
+    partial_code = ""
+    code_parser = CodeFenceParser()
+    code_box = preview_box = None
+    last_code_render = last_preview_render = 0.0
+
+    run_graph = stream_graph_async if USE_ASYNC_GRAPH else stream_graph
+    run = PipelineRun(run_graph(inputs, config, stream_tokens=stream_tokens), name=f"pipeline-{thread_name}")
+    st.session_state.pipeline_run = run
+    st.session_state.pipeline_thread = thread_name
+    st.session_state.pipeline_version = 0
+    for kind, event in run.events(until_code=pipeline_mode):
+        if kind == "token":
+            partial_code += event
+            code_parser.feed(event)
+            if code_box is None:
+                with st.chat_message("assistant"):
+                    code_box = st.empty()
+                preview_box = st.empty()
+            now = time.monotonic()
+            if now - last_code_render >= CODE_REFRESH_INTERVAL:
+                code_box.markdown(partial_code + " ▌")
+                last_code_render = now
+            if now - last_preview_render >= PREVIEW_REFRESH_INTERVAL:
+                html_code, css_code, js_code = code_parser.result()
+                if html_code:
+                    with preview_box.container():
+                        render_preview(html_code, css_code, js_code)
+                    last_preview_render = now
+            continue
 
-    for event in app.stream(inputs, config=config):
         for key, value in event.items():
             if value is None:
                 continue
-
             messages = value.get("messages", [])
-            if messages:
-                last_message = messages[-1]
-
-                if last_message.name in ["supervisor", "enhancer", "code_developer", "validator"]:
-                    if not is_feedback:
-                        st.info(f"--- Workflow Transition: {last_message.name.upper()} ---")
-
-                if last_message.name == "code_developer":
-                    st.session_state.latest_code = last_message.content
-                    st.session_state.messages.append({"role": "code", "content": last_message.content})
-                    st.session_state.show_preview = True
-                    st.session_state.chat_threads[thread_name] = st.session_state.messages.copy()
-                    st.rerun()
-
-                if "Final Code Approved!" in str(last_message.content):
-                    st.session_state.messages.append({"role": "assistant", "content": last_message.content})
-                    st.session_state.show_preview = False
-                    st.session_state.chat_threads[thread_name] = st.session_state.messages.copy()
-                    st.rerun()
-
-                if key == "__end__":
-                    st.session_state.show_preview = False
-                    st.session_state.chat_threads[thread_name] = st.session_state.messages.copy()
-                    st.rerun()
-
+            if messages and messages[-1].name in ["supervisor", "enhancer", "code_developer", "validator"]:
+                if not is_feedback:
+                    st.info(f"--- Workflow Transition: {messages[-1].name.upper()} ---")
+    if not pipeline_mode:
+        run.wait()
+    sync_pipeline_run()
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -88,14 +200,19 @@ if "show_preview" not in st.session_state:
     st.session_state.show_preview = False
 if "latest_code" not in st.session_state:
     st.session_state.latest_code = ""
+if "pipeline_run" not in st.session_state:
+    st.session_state.pipeline_run = None
+sync_pipeline_run()
+# Saved projects are loaded from the thread catalog one page at a time.
+THREADS_PAGE_SIZE = 20
+
 if "chat_threads" not in st.session_state:
-    st.session_state.chat_threads = {}
+    saved_threads = retrieve_all_threads(limit=THREADS_PAGE_SIZE)
+    st.session_state.chat_threads = {tid: [] for tid in reversed(saved_threads)}
+    st.session_state.threads_loaded = len(saved_threads)
+    st.session_state.more_threads = len(saved_threads) == THREADS_PAGE_SIZE
 if "thread_id" not in st.session_state:
     st.session_state.thread_id = None
-##new
-if "chat_threads" not in st.session_state:
-    from main_agent import retrieve_all_threads
-    st.session_state.chat_threads = {tid: [] for tid in retrieve_all_threads()}
 
 st.sidebar.title("📂 My Projects")
 
@@ -117,9 +234,10 @@ st.sidebar.header("Saved Projects")
 
 for tid in list(st.session_state['chat_threads'].keys())[::-1]:
     if st.sidebar.button(str(tid)):
+        finish_pipeline_run(cancel=True)
+        st.session_state.pop('validation_status', None)
         st.session_state['thread_id'] = tid
 
-        from main_agent import app
         state = app.get_state(config={"configurable": {"thread_id": tid}})
         msgs = state.values["messages"]
 
@@ -135,6 +253,110 @@ for tid in list(st.session_state['chat_threads'].keys())[::-1]:
         st.session_state['latest_code'] = get_latest_code_from_messages(temp_messages)
         st.session_state['show_preview'] = False
 
+if st.session_state.more_threads and st.sidebar.button("Show older projects"):
+    older_threads = retrieve_all_threads(limit=THREADS_PAGE_SIZE, offset=st.session_state.threads_loaded)
+    st.session_state.threads_loaded += len(older_threads)
+    st.session_state.more_threads = len(older_threads) == THREADS_PAGE_SIZE
+    st.session_state.chat_threads = {
+        **{tid: [] for tid in reversed(older_threads) if tid not in st.session_state.chat_threads},
+        **st.session_state.chat_threads,
+    }
+    st.rerun()
+
+st.sidebar.toggle("Stream code as it is generated", value=True, key="stream_tokens")
+st.sidebar.toggle("Show the preview before validation finishes", value=True, key="pipeline_mode")
+st.sidebar.slider(
+    "Candidates per generation", 1, len(CANDIDATE_VARIANTS), 1, key="candidates",
+    help="Generate the code with several models at once and keep the best-scoring version.",
+)
+
+with st.sidebar.expander("LLM client pool"):
+    pool_stats = client_registry.stats()
+    st.caption(f"Hits: {pool_stats['hits']} · Misses: {pool_stats['misses']} · Hit rate: {pool_stats['hit_rate']:.0%}")
+
+with st.sidebar.expander("Provider routing"):
+    for node, counts in provider_router.stats().items():
+        st.caption(
+            f"{node}: {counts.get('calls', 0)} calls · {counts.get('fallbacks', 0)} fallbacks · "
+            f"{counts.get('hedges', 0)} hedges ({counts.get('hedge_wins', 0)} won) · {counts.get('timeouts', 0)} timeouts"
+        )
+
+with st.sidebar.expander("Rate limits"):
+    for model, limits in rate_limiter.stats().items():
+        st.caption(
+            f"{model}: {limits['requests']} requests · {limits['queue_depth']} queued (max {limits['max_queue_depth']}) · "
+            f"wait {limits['mean_wait']:.1f}s mean / {limits['p95_wait']:.1f}s p95 · {limits['throttled']} × 429 · {limits['retries']} retries"
+        )
+
+if speculator.enabled:
+    with st.sidebar.expander("Speculation"):
+        spec_stats = speculator.stats()
+        st.caption(
+            f"Started: {spec_stats['started']} · Hit rate: {spec_stats['hit_rate']:.0%} · "
+            f"Wasted tokens: {spec_stats['wasted_tokens']} · Overlap: {spec_stats['overlap_seconds']:.1f}s"
+        )
+
+with st.sidebar.expander("Candidates"):
+    cand_stats = candidate_generator.stats()
+    st.caption(
+        f"Runs: {cand_stats.get('runs', 0)} · Answered: {cand_stats.get('answered', 0)} · "
+        f"Abandoned: {cand_stats.get('abandoned', 0)} · Failed: {cand_stats.get('failed', 0)}"
+    )
+    for label, wins in sorted(cand_stats["wins"].items(), key=lambda item: -item[1]):
+        st.caption(f"{label}: {wins} wins")
+
+if model_selector.policy.enabled:
+    with st.sidebar.expander("Model selection"):
+        for node, selection in model_selector.stats().items():
+            sizes = " · ".join(f"{key.replace('_', ' ')}: {selection[key]}" for key in sorted(selection) if key.endswith(("_build", "_edit")))
+            st.caption(
+                f"{node}: {sizes} · {selection['input_tokens'] + selection['output_tokens']} tokens, "
+                f"${selection['cost']:.4f} · {selection['switched']} calls off the default model saved "
+                f"~{selection['latency_saved']:.1f}s (expected), ${selection['cost_saved']:.4f}"
+            )
+            for label, count in sorted(selection["models"].items(), key=lambda item: -item[1]):
+                st.caption(f"  {label}: {count} calls")
+
+with st.sidebar.expander("Request coalescing"):
+    flight_stats = single_flight.stats()
+    st.caption(
+        f"Calls: {flight_stats['calls']} · Sent upstream: {flight_stats['upstream']} · "
+        f"Coalesced: {flight_stats['coalesced']} ({flight_stats['coalesced_rate']:.0%}) · In flight: {flight_stats['in_flight']}"
+    )
+    for node, count in sorted(flight_stats["by_node"].items()):
+        st.caption(f"{node}: {count} coalesced")
+
+with st.sidebar.expander("Fast-path router"):
+    router_stats = fast_router.stats()
+    st.caption(f"Supervisor calls saved: {router_stats['calls_saved']} · LLM fallbacks: {router_stats['llm_fallbacks']}")
+
+with st.sidebar.expander("Response cache"):
+    cache_stats = get_response_cache().stats()
+    st.caption(f"Entries: {cache_stats['entries']} · Hits: {cache_stats['hits']} · Near hits: {cache_stats['near_hits']} ({cache_stats['near_rejected']} rejected) · Misses: {cache_stats['misses']}")
+
+with st.sidebar.expander("Timing (this project)"):
+    spans = metrics.thread_spans(st.session_state.thread_id) if st.session_state.thread_id else []
+    if not spans:
+        st.caption("No timings recorded for this project yet.")
+    else:
+        node_spans = [s for s in spans if s.kind == "node"]
+        llm_spans = [s for s in spans if s.kind in ("llm", "structured_output")]
+        st.caption(
+            f"Node time: {sum(s.duration for s in node_spans):.2f}s · "
+            f"LLM time: {sum(s.duration for s in llm_spans):.2f}s · "
+            f"Tokens: {sum(s.input_tokens for s in llm_spans)} in / {sum(s.output_tokens for s in llm_spans)} out"
+        )
+        st.table([
+            {
+                "step": f"{s.kind}: {s.name}",
+                "provider": s.provider or "",
+                "ms": round(s.duration * 1000, 1),
+                "tokens": f"{s.input_tokens}/{s.output_tokens}" if s.input_tokens or s.output_tokens else "",
+                "error": s.error or "",
+            }
+            for s in spans[-15:]
+        ])
+
 st.title("🤖 Agentic Frontend Developer")
 st.markdown("Your personal AI assistant for building frontend code.")
 
@@ -152,18 +374,19 @@ if st.session_state.show_preview:
     # """
 
     # st.components.v1.html(full_html, height=500)
-    scrollable_html = f"""
-<div style="height:500px; overflow:auto; border:1px solid #ccc; padding:10px;">
-    <style>{css_code}</style>
-    {html_code}
-    <script>{js_code}</script>
-</div>
-"""
-    st.components.v1.html(scrollable_html, height=500)
-    user_feedback = st.text_input("Please provide feedback or type 'ok' to approve:", key="feedback_input")
+    if st.session_state.pipeline_run is not None:
+        poll_validation()
+    elif "validation_status" in st.session_state:
+        render_validation_badge()
+    render_preview(html_code, css_code, js_code)
+    # A fresh key per round clears the box, so reruns do not submit the same feedback again.
+    feedback_round = st.session_state.setdefault("feedback_round", 0)
+    user_feedback = st.text_input("Please provide feedback or type 'ok' to approve:", key=f"feedback_input_{feedback_round}")
     if user_feedback:
         feedback_clean = user_feedback.strip().lower()
         if feedback_clean in ["ok", "ok.", "yes", "looks good", "bye"]:
+            # The code shown is approved as is; stop validating or regenerating it.
+            finish_pipeline_run(cancel=True)
             final_code_content = st.session_state.latest_code
             html_code, css_code, js_code = parse_code(final_code_content)
 
@@ -181,6 +404,12 @@ if st.session_state.show_preview:
             ```
             """
 
+            # Only code approved for the opening request as sent is reusable by other users;
+            # after feedback rounds it is this user's customized project.
+            user_turns = [m["content"] for m in st.session_state.messages if m["role"] == "user"]
+            if len(user_turns) == 1:
+                get_response_cache().put(user_turns[0], final_code_content)
+
             st.session_state.messages.append({"role": "assistant", "content": final_code_output})
             st.session_state.show_preview = False
 
@@ -188,11 +417,14 @@ if st.session_state.show_preview:
             if not st.session_state.thread_id:
                 st.session_state.thread_id = generate_thread_name("project")
             st.session_state.chat_threads[st.session_state.thread_id] = st.session_state.messages.copy()
+            checkpointer.mark_approved(st.session_state.thread_id)
 
             st.rerun()
 
         else:
             # Continue agent workflow
+            st.session_state.feedback_round += 1
+            finish_pipeline_run()
             st.session_state.messages.append({"role": "user", "content": user_feedback})
             if not st.session_state.thread_id:
                 st.session_state.thread_id = generate_thread_name("project")
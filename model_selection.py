@@ -0,0 +1,227 @@
+"""
+Cost- and size-aware model selection per node.
+
+`ModelSelector` estimates how big the current task is from the latest user request and the
+code it edits, then picks the node's models for that size from a JSON policy file
+(model_policy.json): small edits go to faster, cheaper models and big builds to stronger
+ones. The chosen models are tried first and the node's configured route follows as
+fallback. Calls answered by a model other than the node's default are compared with that
+default using the policy's prices and speeds, and the estimated savings are logged.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from langchain_core.messages import convert_to_messages
+
+SIZES = ("small", "medium", "large")
+
+def parse_spec(label: str) -> tuple:
+    """Turns a policy label such as "google/gemini-2.5-flash" into a (provider, model) pair."""
+    provider, model = label.split("/", 1)
+    return provider, model
+
+def spec_label(spec) -> str:
+    return f"{spec[0]}/{spec[1]}"
+
+def count_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return len(text) // 4
+
+@dataclass
+class TaskEstimate:
+    # "build" for a first generation, "edit" when the request changes existing code.
+    kind: str
+    size: str
+    # Estimated tokens of code the task has to produce.
+    tokens: int
+    features: list = field(default_factory=list)
+
+@dataclass
+class Choice:
+    node: str
+    estimate: TaskEstimate
+    # Models to try in order; None leaves the node's route unchanged.
+    models: list = None
+
+class ModelPolicy:
+    """The parsed policy file. A missing file or "enabled": false turns selection off."""
+
+    def __init__(self, data: dict = None, path: str = None):
+        data = data or {}
+        self.path = path
+        self.enabled = bool(data) and data.get("enabled", True)
+        estimate = data.get("estimate", {})
+        self.build_base_tokens = estimate.get("build_base_tokens", 1500)
+        self.edit_base_tokens = estimate.get("edit_base_tokens", 200)
+        self.tokens_per_request_token = estimate.get("tokens_per_request_token", 20)
+        self.feature_tokens = estimate.get("feature_tokens", 800)
+        self.features = [word.lower() for word in estimate.get("features", [])]
+        self.rewrite_words = [word.lower() for word in estimate.get("rewrite_words", [])]
+        sizes = data.get("sizes", {})
+        self.small_tokens = sizes.get("small", 800)
+        self.medium_tokens = sizes.get("medium", 4000)
+        self.models = data.get("models", {})
+        self.nodes = {}
+        for node, tiers in data.get("nodes", {}).items():
+            unknown = set(tiers) - set(SIZES)
+            if unknown:
+                raise ValueError(f"{path or 'model policy'}: unknown sizes {sorted(unknown)} for {node}; use {SIZES}")
+            self.nodes[node] = {size: [parse_spec(label) for label in labels] for size, labels in tiers.items()}
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path):
+            print(f"--- Model selection: no policy at {path}; using the configured routes ---")
+            return cls(path=path)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), path=path)
+
+    def size_of(self, tokens: int) -> str:
+        if tokens <= self.small_tokens:
+            return "small"
+        if tokens <= self.medium_tokens:
+            return "medium"
+        return "large"
+
+    def price(self, spec) -> tuple:
+        """(input, output) dollars per million tokens; (0, 0) for models the policy does not list."""
+        return tuple(self.models.get(spec_label(spec), {}).get("price", (0.0, 0.0)))
+
+    def cost(self, spec, input_tokens: int, output_tokens: int) -> float:
+        input_price, output_price = self.price(spec)
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def latency(self, spec, output_tokens: int):
+        """Expected seconds for an answer of `output_tokens`, or None for unlisted models."""
+        model = self.models.get(spec_label(spec))
+        if model is None:
+            return None
+        return model.get("first_token", 0.0) + output_tokens / max(model.get("tokens_per_second", 1), 1)
+
+def _mentions(text: str, words) -> list:
+    return [word for word in words if re.search(rf"\b{re.escape(word)}(s|es|ing)?\b", text)]
+
+def task_messages(messages):
+    """
+    Returns (request, code): the latest user request, with any enhancer rewrite of it, and the
+    code it edits (the newest code_developer message before it), or None for a first build.
+    """
+    messages = convert_to_messages(messages)
+    request_index = None
+    for index in range(len(messages) - 1, -1, -1):
+        # Node outputs are HumanMessages too; only unnamed messages come from the user.
+        if messages[index].type == "human" and messages[index].name is None:
+            request_index = index
+            break
+    if request_index is None:
+        return "", None
+    request = [str(messages[request_index].content)]
+    request += [str(m.content) for m in messages[request_index + 1:] if m.name == "enhancer"]
+    code = None
+    for message in reversed(messages[:request_index]):
+        if message.name == "code_developer":
+            code = str(message.content)
+            break
+    return "\n".join(request), code
+
+class ModelSelector:
+    """Chooses each node call's models from the policy and keeps per-node savings totals."""
+
+    def __init__(self, policy: ModelPolicy, routes: dict):
+        self.policy = policy
+        self.routes = routes
+        self._lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+        self._choices = defaultdict(Counter)
+
+    def estimate(self, messages) -> TaskEstimate:
+        policy = self.policy
+        request, code = task_messages(messages)
+        text = request.lower()
+        request_tokens = count_tokens(request)
+        features = _mentions(text, policy.features)
+        if code is None:
+            kind = "build"
+            tokens = policy.build_base_tokens + policy.feature_tokens * len(features)
+        else:
+            kind = "edit"
+            tokens = policy.edit_base_tokens + policy.feature_tokens * len(features)
+            if _mentions(text, policy.rewrite_words):
+                # A redesign rewrites most of the existing code.
+                tokens += count_tokens(code)
+        tokens += policy.tokens_per_request_token * request_tokens
+        return TaskEstimate(kind, policy.size_of(tokens), tokens, features)
+
+    def choose(self, node: str, messages) -> Choice:
+        """Models for this node and task: the policy's picks for its size, then the route's own."""
+        if not self.policy.enabled:
+            return Choice(node, None)
+        estimate = self.estimate(messages)
+        picks = self.policy.nodes.get(node, {}).get(estimate.size)
+        if not picks:
+            return Choice(node, estimate)
+        route_models = self.routes[node].models
+        models = list(picks) + [spec for spec in route_models if spec not in picks]
+        return Choice(node, estimate, models)
+
+    def record(self, choice: Choice, messages, response, elapsed: float, answered):
+        """
+        Logs the call's tokens, cost and latency against `answered`, the model that actually
+        answered (the router may have fallen back from the policy's pick). Savings are only
+        booked when that model is not the node's default, and compare like with like: the
+        cost of the same estimated tokens on both models, and the policy's expected latency
+        of both models.
+        """
+        if choice.estimate is None:
+            return
+        policy = self.policy
+        # The route's first model is the node's default.
+        baseline = self.routes[choice.node].models[0]
+        input_tokens = sum(count_tokens(str(m.content)) for m in convert_to_messages(messages))
+        content = response.content if hasattr(response, "content") else response.model_dump_json()
+        output_tokens = count_tokens(str(content))
+        cost = policy.cost(answered, input_tokens, output_tokens)
+        estimate = choice.estimate
+        comparison = ""
+        with self._lock:
+            stats = self._stats[choice.node]
+            stats.update({f"{estimate.size}_{estimate.kind}": 1, "calls": 1,
+                          "input_tokens": input_tokens, "output_tokens": output_tokens})
+            stats["cost"] += cost
+            stats["latency"] += elapsed
+            self._choices[choice.node][spec_label(answered)] += 1
+            if answered != baseline:
+                baseline_cost = policy.cost(baseline, input_tokens, output_tokens)
+                stats["switched"] += 1
+                stats["cost_saved"] += baseline_cost - cost
+                expected, baseline_expected = policy.latency(answered, output_tokens), policy.latency(baseline, output_tokens)
+                if expected is not None and baseline_expected is not None:
+                    stats["latency_saved"] += baseline_expected - expected
+                    comparison = f" (vs ~{baseline_expected:.1f}s, ${baseline_cost:.5f} on {spec_label(baseline)})"
+                else:
+                    comparison = f" (vs ${baseline_cost:.5f} on {spec_label(baseline)})"
+        if choice.models and answered != choice.models[0]:
+            comparison += f" after falling back from {spec_label(choice.models[0])}"
+        print(f"--- Model selection ({choice.node}): {estimate.size} {estimate.kind} (~{estimate.tokens} tokens) → "
+              f"{spec_label(answered)}: {input_tokens}+{output_tokens} tokens, {elapsed:.1f}s, ${cost:.5f}{comparison} ---")
+
+    def stats(self) -> dict:
+        """
+        Per node: calls by size and kind, the models that answered, tokens, cost, measured
+        latency, and the estimated savings of the calls answered by a non-default model.
+        """
+        with self._lock:
+            result = {}
+            for node, stats in self._stats.items():
+                result[node] = {
+                    **stats,
+                    "models": dict(self._choices[node]),
+                    "switched": stats["switched"],
+                    "cost_saved": stats["cost_saved"],
+                    "latency_saved": stats["latency_saved"],
+                }
+            return result
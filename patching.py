@@ -0,0 +1,50 @@
+import re
+
+from code_parser import format_code, parse_code
+
+# File names used in patches, mapped to the position of their block in parse_code's result.
+PATCH_FILES = {"index.html": 0, "style.css": 1, "script.js": 2}
+
+PATCH_BLOCK = re.compile(
+    r"FILE:\s*(?P<file>\S+)\s*\n"
+    r"<<<<<<< SEARCH\n(?P<search>.*?)\n?=======\n(?P<replace>.*?)\n?>>>>>>> REPLACE",
+    re.DOTALL,
+)
+
+class PatchError(Exception):
+    """Raised when a patch response cannot be parsed or applied to the current code."""
+
+def parse_patches(text: str):
+    """Returns the (file, search, replace) edits in a search/replace patch response."""
+    patches = [(m["file"], m["search"], m["replace"]) for m in PATCH_BLOCK.finditer(text)]
+    if not patches:
+        raise PatchError("No search/replace blocks found in the response.")
+    for file_name, _, _ in patches:
+        if file_name not in PATCH_FILES:
+            raise PatchError(f"Patch targets unknown file {file_name!r}.")
+    return patches
+
+def _replace_once(source: str, search: str, replace: str) -> str:
+    if search == "":
+        return source.rstrip("\n") + "\n" + replace if source else replace
+    if source.count(search) == 1:
+        return source.replace(search, replace, 1)
+    # Fall back to matching line by line with leading/trailing whitespace ignored.
+    source_lines = source.split("\n")
+    search_lines = [line.strip() for line in search.strip("\n").split("\n")]
+    matches = [
+        i for i in range(len(source_lines) - len(search_lines) + 1)
+        if [line.strip() for line in source_lines[i:i + len(search_lines)]] == search_lines
+    ]
+    if len(matches) != 1:
+        raise PatchError(f"Search text matched {len(matches)} times; expected exactly once.")
+    start = matches[0]
+    return "\n".join(source_lines[:start] + [replace] + source_lines[start + len(search_lines):])
+
+def apply_patches(code: str, patch_text: str) -> str:
+    """Applies a search/replace patch response to fenced code and returns the new fenced code."""
+    blocks = list(parse_code(code))
+    for file_name, search, replace in parse_patches(patch_text):
+        index = PATCH_FILES[file_name]
+        blocks[index] = _replace_once(blocks[index], search, replace)
+    return format_code(*blocks)
@@ -0,0 +1,138 @@
+"""
+Graph runs that hand the UI their code before validation has finished.
+
+PipelineRun drains a stream_graph / stream_graph_async event iterator on a worker thread.
+The UI consumes the events itself (streamed tokens, node transitions) until the first code
+arrives, then stops listening while the worker carries on through validation and any
+regeneration the validator asks for. The UI polls `snapshot()` for the newest code and the
+validation status instead of keeping the run attached to a Streamlit script run, so a rerun
+never tears the stream down.
+"""
+import queue
+import threading
+import time
+
+# Validation status of the latest code, as shown on the preview badge.
+STATUSES = ("generating", "validating", "regenerating", "passed", "approved", "error", "cancelled")
+
+_HANDOFF = object()
+_END = object()
+
+class PipelineRun:
+    """One graph run, drained in the background; thread-safe to poll from any script run."""
+
+    def __init__(self, events, name: str = "pipeline-run"):
+        self._events = events
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._listening = True
+        self._cancelled = threading.Event()
+        self.status = "generating"
+        self.detail = ""
+        self.code = None
+        # Incremented for every new code_developer answer, so pollers can tell it changed.
+        self.version = 0
+        self.final_message = None
+        self.started = time.monotonic()
+        self.finished_at = None
+        self._thread = threading.Thread(target=self._drain, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def _apply(self, kind, event):
+        """Updates the status from one ("update", {node: value}) event; returns True once code is ready."""
+        if kind != "update":
+            return False
+        for node, value in event.items():
+            messages = (value or {}).get("messages", [])
+            if not messages:
+                if node == "validator" and self.status == "validating":
+                    self.status = "passed"
+                continue
+            last = messages[-1]
+            if last.name == "code_developer":
+                self.code = last.content
+                self.version += 1
+                self.status = "validating"
+                self.detail = ""
+                return True
+            if last.name == "validator":
+                self.status = "regenerating"
+                self.detail = str(last.content)
+            elif last.name == "final_agent":
+                self.final_message = last.content
+                self.status = "approved"
+        return False
+
+    def _drain(self):
+        try:
+            for kind, event in self._events:
+                if self._cancelled.is_set():
+                    break
+                with self._lock:
+                    code_ready = self._apply(kind, event)
+                    listening = self._listening
+                if listening:
+                    self._queue.put((kind, event))
+                    if code_ready:
+                        self._queue.put(_HANDOFF)
+            with self._lock:
+                if self._cancelled.is_set():
+                    self.status = "cancelled"
+                elif self.status == "validating":
+                    # The code came from the response cache, which only holds approved code.
+                    self.status = "passed"
+        except Exception as e:
+            with self._lock:
+                self.status = "error"
+                self.detail = repr(e)
+        finally:
+            close = getattr(self._events, "close", None)
+            if close is not None:
+                close()
+            self.finished_at = time.monotonic()
+            self._queue.put(_END)
+
+    def events(self, until_code: bool = True):
+        """
+        Yields the run's events to the caller. With `until_code`, stops once the first code is
+        ready and leaves the rest of the run (validation, regeneration) to the worker.
+        """
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    if self.status == "error":
+                        raise RuntimeError(self.detail)
+                    return
+                if item is _HANDOFF:
+                    if until_code:
+                        return
+                    continue
+                yield item
+        finally:
+            with self._lock:
+                self._listening = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "status": self.status,
+                "detail": self.detail,
+                "code": self.code,
+                "version": self.version,
+                "final_message": self.final_message,
+                "finished": self.finished,
+            }
+
+    def cancel(self):
+        """Stops the run at its next event, e.g. once the user approved the code already shown."""
+        self._cancelled.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until the run has finished; returns False on timeout."""
+        self._thread.join(timeout)
+        return self.finished
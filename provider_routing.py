@@ -0,0 +1,271 @@
+"""
+Per-node provider routing: ordered fallbacks, per-call timeouts and hedged requests.
+
+Each node has a NodeRoute listing (provider, model) pairs in order of preference. A call
+goes to the first model; if it fails or exceeds `timeout` the next model is tried. With
+`hedge_after` set, a second request goes to the next model once the first has been running
+that long, and whichever answers first wins. Both clocks start when the rate limiter lets
+the request through, so time spent queued for quota does not count.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+
+from rate_limiting import on_grant
+
+@dataclass
+class NodeRoute:
+    models: list
+    # Seconds an attempt (including its hedge) may take before moving on to the next model.
+    timeout: float = 60.0
+    # Seconds after which a hedged request is sent to the next model; None disables hedging.
+    hedge_after: float = None
+
+class ProviderRoutingError(RuntimeError):
+    """Raised when every model of a node's route failed or timed out."""
+
+    def __init__(self, node: str, errors: list):
+        self.node = node
+        self.errors = errors
+        details = "; ".join(f"{p}/{m}: {e!r}" for (p, m), e in errors)
+        super().__init__(f"All providers failed for {node}: {details}")
+
+@dataclass
+class _Attempt:
+    primary: tuple
+    hedge: tuple = None
+    hedged: bool = False
+    errors: list = field(default_factory=list)
+
+    @property
+    def tried(self) -> int:
+        return 2 if self.hedged else 1
+
+class _Request:
+    """One provider request of an attempt; `granted` resolves to the time the limiter let it through."""
+
+    def __init__(self, spec, granted):
+        self.spec = spec
+        self.granted = granted
+        self.abandoned = False
+
+    def grant(self) -> bool:
+        if not self.granted.done():
+            self.granted.set_result(time.monotonic())
+        return not self.abandoned
+
+    @property
+    def granted_at(self):
+        return self.granted.result() if self.granted.done() else None
+
+def _next_deadline(route, attempt, primary, requests, now):
+    """Seconds until the next hedge or timeout is due; None while no clock is running."""
+    due = [r.granted_at + route.timeout for r in requests if r.granted_at is not None]
+    if attempt.hedge and not attempt.hedged and primary.granted_at is not None:
+        due.append(primary.granted_at + route.hedge_after)
+    due = [t for t in due if t > now]
+    return max(0.0, min(due) - now) if due else None
+
+def _hedge_due(route, attempt, primary, pending, now) -> bool:
+    if not attempt.hedge or attempt.hedged:
+        return False
+    return not pending or (primary.granted_at is not None and now >= primary.granted_at + route.hedge_after)
+
+def _timed_out(route, requests, now) -> bool:
+    return bool(requests) and all(r.granted_at is not None and now >= r.granted_at + route.timeout for r in requests)
+
+class ProviderRouter:
+    """
+    Runs a node's LLM call through its route.
+
+    `call(spec, messages, schema)` and `acall(...)` make a single provider request (the
+    registry, cassette and tracing live there). `route`/`aroute` also return the
+    (provider, model) that answered. `models` overrides the route's model order
+    for one call, keeping its timeout and hedging. Sync hedges and timeouts run on a thread
+    pool; a request that loses or times out there is dropped if it has not been sent yet.
+    Once sent, the grant hook reports it abandoned, which a streaming call can use to stop
+    (main_agent stops it at its next token); its result is discarded either way. Async
+    requests that lose are cancelled.
+    """
+
+    def __init__(self, routes: dict, call, acall, max_workers: int = 32):
+        self.routes = routes
+        self.call = call
+        self.acall = acall
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+
+    def configure(self, node: str, **changes):
+        """Updates one node's route, e.g. configure("supervisor", hedge_after=1.5)."""
+        route = self.routes[node]
+        for key, value in changes.items():
+            if not hasattr(route, key):
+                raise AttributeError(f"NodeRoute has no field {key!r}")
+            setattr(route, key, value)
+
+    def _count(self, node: str, **counts):
+        with self._lock:
+            self._stats[node].update(counts)
+
+    def _plan(self, route: NodeRoute, index: int) -> _Attempt:
+        hedge = None
+        if route.hedge_after is not None and index + 1 < len(route.models):
+            hedge = route.models[index + 1]
+        return _Attempt(primary=route.models[index], hedge=hedge)
+
+    def _finish(self, node: str, route: NodeRoute, attempt: _Attempt, spec):
+        if spec != route.models[0]:
+            print(f"--- Provider routing ({node}): answered by {spec[0]}/{spec[1]} ---")
+        if attempt.hedged and spec == attempt.hedge:
+            self._count(node, hedge_wins=1)
+
+    def _run(self, request, messages, schema):
+        on_grant.set(request.grant)
+        return self.call(request.spec, messages, schema)
+
+    async def _arun(self, request, messages, schema):
+        on_grant.set(request.grant)
+        return await self.acall(request.spec, messages, schema)
+
+    def _submit(self, pending, spec, messages, schema):
+        request = _Request(spec, Future())
+        # Each request runs in a copy of the caller's context so tracing and streaming
+        # callbacks still see the node that made it.
+        context = contextvars.copy_context()
+        pending[self._executor.submit(context.run, self._run, request, messages, schema)] = request
+        return request
+
+    def _asubmit(self, pending, spec, messages, schema):
+        request = _Request(spec, asyncio.get_running_loop().create_future())
+        pending[asyncio.ensure_future(self._arun(request, messages, schema))] = request
+        return request
+
+    def invoke(self, node: str, messages, schema=None, models=None):
+        return self.route(node, messages, schema, models)[0]
+
+    def route(self, node: str, messages, schema=None, models=None):
+        """Like invoke, but returns (result, spec of the model that answered)."""
+        route = self.routes[node]
+        if models:
+            route = replace(route, models=models)
+        self._count(node, calls=1)
+        errors = []
+        index = 0
+        while index < len(route.models):
+            attempt = self._plan(route, index)
+            done, result, spec = self._run_attempt(node, route, attempt, messages, schema)
+            if done:
+                self._finish(node, route, attempt, spec)
+                return result, spec
+            errors += attempt.errors
+            index += attempt.tried
+            if index < len(route.models):
+                self._count(node, fallbacks=1)
+                print(f"--- Provider routing ({node}): falling back to {route.models[index][0]}/{route.models[index][1]} ---")
+        self._count(node, failures=1)
+        raise ProviderRoutingError(node, errors)
+
+    def _run_attempt(self, node, route, attempt, messages, schema):
+        pending = {}
+        primary = self._submit(pending, attempt.primary, messages, schema)
+        try:
+            while pending:
+                now = time.monotonic()
+                waiting = set(pending) | {r.granted for r in pending.values() if not r.granted.done()}
+                done, _ = wait(waiting, timeout=_next_deadline(route, attempt, primary, pending.values(), now),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    request = pending.pop(future, None)
+                    if request is None:
+                        # A request was let through by the rate limiter; its clocks are running now.
+                        continue
+                    try:
+                        return True, future.result(), request.spec
+                    except Exception as e:
+                        attempt.errors.append((request.spec, e))
+                now = time.monotonic()
+                if _hedge_due(route, attempt, primary, pending, now):
+                    attempt.hedged = True
+                    self._count(node, hedges=1)
+                    self._submit(pending, attempt.hedge, messages, schema)
+                    continue
+                if _timed_out(route, pending.values(), now):
+                    for request in pending.values():
+                        attempt.errors.append((request.spec, TimeoutError(f"no answer after {route.timeout}s")))
+                    self._count(node, timeouts=len(pending))
+                    break
+            return False, None, None
+        finally:
+            for future, request in pending.items():
+                # Not sent yet: skip it; already sent: the grant hook now reports it abandoned
+                # and its answer is dropped.
+                request.abandoned = True
+                future.cancel()
+
+    async def ainvoke(self, node: str, messages, schema=None, models=None):
+        return (await self.aroute(node, messages, schema, models))[0]
+
+    async def aroute(self, node: str, messages, schema=None, models=None):
+        """Async counterpart of route."""
+        route = self.routes[node]
+        if models:
+            route = replace(route, models=models)
+        self._count(node, calls=1)
+        errors = []
+        index = 0
+        while index < len(route.models):
+            attempt = self._plan(route, index)
+            done, result, spec = await self._arun_attempt(node, route, attempt, messages, schema)
+            if done:
+                self._finish(node, route, attempt, spec)
+                return result, spec
+            errors += attempt.errors
+            index += attempt.tried
+            if index < len(route.models):
+                self._count(node, fallbacks=1)
+                print(f"--- Provider routing ({node}): falling back to {route.models[index][0]}/{route.models[index][1]} ---")
+        self._count(node, failures=1)
+        raise ProviderRoutingError(node, errors)
+
+    async def _arun_attempt(self, node, route, attempt, messages, schema):
+        pending = {}
+        primary = self._asubmit(pending, attempt.primary, messages, schema)
+        try:
+            while pending:
+                now = time.monotonic()
+                waiting = set(pending) | {r.granted for r in pending.values() if not r.granted.done()}
+                done, _ = await asyncio.wait(waiting, timeout=_next_deadline(route, attempt, primary, pending.values(), now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    request = pending.pop(task, None)
+                    if request is None:
+                        continue
+                    try:
+                        return True, task.result(), request.spec
+                    except Exception as e:
+                        attempt.errors.append((request.spec, e))
+                now = time.monotonic()
+                if _hedge_due(route, attempt, primary, pending, now):
+                    attempt.hedged = True
+                    self._count(node, hedges=1)
+                    self._asubmit(pending, attempt.hedge, messages, schema)
+                    continue
+                if _timed_out(route, pending.values(), now):
+                    for request in pending.values():
+                        attempt.errors.append((request.spec, TimeoutError(f"no answer after {route.timeout}s")))
+                    self._count(node, timeouts=len(pending))
+                    break
+            return False, None, None
+        finally:
+            for task, request in pending.items():
+                request.abandoned = True
+                task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {node: dict(counts) for node, counts in self._stats.items()}
@@ -0,0 +1,358 @@
+"""
+Process-wide client-side rate limiting and retries for provider calls.
+
+Every (provider, model) gets a ModelLimiter with token buckets for requests/minute and
+tokens/minute. Callers queue by priority, so interactive sessions go ahead of batch jobs.
+RateLimiter.call retries rate-limited (429) and transient server errors with jittered
+exponential backoff; a 429 also pauses the model briefly for every session. Failed attempts
+get their estimated tokens back, and the request that answers is settled to its real usage.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from instrumentation import Span, current_node, current_thread_id, metrics
+
+# Lower runs first.
+PRIORITIES = {"interactive": 0, "batch": 10}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Called when the limiter lets the current request through; the provider router sets it to
+# start its timeout and hedge clocks then, and returns False once it no longer wants the answer.
+# It may be called again while the response streams, to stop a request nobody waits for.
+on_grant = contextvars.ContextVar("on_grant", default=None)
+
+class RequestAbandoned(Exception):
+    """Raised instead of sending a request whose caller stopped waiting while it was queued."""
+
+def granted() -> bool:
+    """Reports the grant to the current request's caller; False when the request should not be sent."""
+    callback = on_grant.get()
+    return callback is None or callback()
+
+def status_of(error):
+    for attr in ("status_code", "code", "http_status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+def is_rate_limit_error(error) -> bool:
+    if status_of(error) == 429:
+        return True
+    name = type(error).__name__
+    return any(s in name for s in ("RateLimit", "ResourceExhausted", "TooManyRequests")) or "429" in str(error)
+
+def is_retryable(error) -> bool:
+    if is_rate_limit_error(error) or status_of(error) in RETRYABLE_STATUS:
+        return True
+    name = type(error).__name__
+    return any(s in name for s in ("ServiceUnavailable", "InternalServerError", "ConnectError", "ReadTimeout"))
+
+def retry_after(error):
+    """Seconds from a Retry-After header, when the error carries the HTTP response."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def load_limits(defaults: dict, override: str = None) -> dict:
+    """
+    Per-model limits with `override` applied: JSON, inline or in a file, mapping
+    "provider/model" to [requests_per_minute, tokens_per_minute] (null for unlimited), e.g.
+    {"google/gemini-2.5-flash": [1000, 1000000]} for a paid tier.
+    """
+    limits = dict(defaults)
+    if not override:
+        return limits
+    if os.path.exists(override):
+        with open(override, encoding="utf-8") as f:
+            override = f.read()
+    for label, value in json.loads(override).items():
+        provider, _, model = label.partition("/")
+        if not model or not isinstance(value, list) or len(value) != 2:
+            raise ValueError(f"Rate limit override {label!r}: expected \"provider/model\": [requests_per_minute, tokens_per_minute]")
+        limits[(provider, model)] = tuple(value)
+    return limits
+
+class TokenBucket:
+    """Holds up to `limit` units, refilled at `limit` per `period` seconds."""
+
+    def __init__(self, limit: float, period: float = 60.0):
+        self.rate = limit / period
+        self.capacity = limit
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken. Requests larger than the bucket wait for a full one."""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+class ModelLimiter:
+    """Requests/minute and tokens/minute limits for one model, with a priority queue of waiters."""
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None, period: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute, period) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, period) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.retries = 0
+        self._waits = deque(maxlen=1000)
+
+    def _delay(self, tokens: float, now: float) -> float:
+        delay = self.blocked_until - now
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay(1, now))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return max(0.0, delay)
+
+    def _take(self, tokens: float):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+        self.acquired += 1
+
+    def _enqueue(self, priority: int):
+        entry = (priority, next(self._seq))
+        heapq.heappush(self._waiters, entry)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        return entry
+
+    def _dequeue(self, entry):
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def _try_take(self, entry, tokens: float):
+        """Takes capacity when `entry` is first in line; returns the delay to wait otherwise (None: until notified)."""
+        if self._waiters[0] != entry:
+            return None
+        delay = self._delay(tokens, time.monotonic())
+        if delay <= 0:
+            self._take(tokens)
+            return 0.0
+        return delay
+
+    def acquire(self, tokens: float, priority: int = 0) -> float:
+        """Blocks until the request may be sent; returns the seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    delay = self._try_take(entry, tokens)
+                    if delay == 0.0:
+                        break
+                    self._cond.wait(delay)
+            finally:
+                self._dequeue(entry)
+        return self._record_wait(start)
+
+    async def aacquire(self, tokens: float, priority: int = 0) -> float:
+        """Async counterpart of acquire; polls instead of blocking the event loop."""
+        start = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_take(entry, tokens)
+                if delay == 0.0:
+                    break
+                await asyncio.sleep(min(delay if delay is not None else 0.05, 0.25))
+        finally:
+            with self._cond:
+                self._dequeue(entry)
+        return self._record_wait(start)
+
+    def _record_wait(self, start: float) -> float:
+        waited = time.monotonic() - start
+        self._waits.append(waited)
+        return waited
+
+    def refund(self, tokens: float, request: bool = False):
+        """Returns a failed attempt's estimate to the tokens/minute bucket, and its request slot if it was never sent."""
+        with self._cond:
+            if self.tokens is not None:
+                self.tokens.give_back(tokens)
+            if request:
+                self.acquired -= 1
+                if self.requests is not None:
+                    self.requests.give_back(1)
+            self._cond.notify_all()
+
+    def settle(self, estimated: float, actual: float):
+        """Corrects the tokens/minute bucket once the real token usage is known."""
+        if self.tokens is None or not actual:
+            return
+        with self._cond:
+            if actual < estimated:
+                self.tokens.give_back(estimated - actual)
+            else:
+                self.tokens.take(actual - estimated)
+
+    def cool_down(self, seconds: float):
+        """Holds every request to this model for `seconds` (after the provider answered 429)."""
+        with self._cond:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            queue_depth = len(self._waiters)
+        return {
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.acquired,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "mean_wait": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait": waits[max(0, int(round(0.95 * len(waits))) - 1)] if waits else 0.0,
+        }
+
+class RateLimiter:
+    """
+    Shared limiter and retry scheduler for all provider calls in the process.
+
+    `limits` maps (provider, model) to (requests_per_minute, tokens_per_minute); either may
+    be None. Models without an entry use `default`. `period` is the quota window in seconds
+    (the benchmarks shorten it to compress a minute of traffic).
+    """
+
+    def __init__(self, limits: dict, default=(None, None), max_retries: int = 4,
+                 base_delay: float = 1.0, max_delay: float = 30.0, period: float = 60.0):
+        self.limits = limits
+        self.default = default
+        self.period = period
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._limiters = {}
+
+    def limiter(self, spec) -> ModelLimiter:
+        spec = tuple(spec)
+        with self._lock:
+            limiter = self._limiters.get(spec)
+            if limiter is None:
+                limiter = self._limiters[spec] = ModelLimiter(*self.limits.get(spec, self.default), period=self.period)
+            return limiter
+
+    def backoff(self, attempt: int, error) -> float:
+        """Full-jitter exponential backoff, or the provider's Retry-After when it sent one."""
+        hinted = retry_after(error)
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record_wait(self, spec, waited: float, span):
+        if span is not None:
+            span.attributes["rate_limit_wait"] = span.attributes.get("rate_limit_wait", 0.0) + waited
+        metrics.record(Span(
+            kind="rate_limit_wait", name=current_node.get() or "unknown", thread_id=current_thread_id.get(),
+            provider=spec[0], model=spec[1], duration=waited,
+        ))
+
+    def _abandon(self, limiter: ModelLimiter, tokens: float):
+        limiter.refund(tokens, request=True)
+        raise RequestAbandoned("the caller stopped waiting before the request was sent")
+
+    def _on_error(self, limiter: ModelLimiter, attempt: int, error, span) -> float:
+        if is_rate_limit_error(error):
+            # Pause the model for everyone, not only for this request, even when it gives up.
+            limiter.cool_down(retry_after(error) or self.base_delay)
+        if attempt >= self.max_retries or not is_retryable(error):
+            raise error
+        delay = self.backoff(attempt, error)
+        limiter.retries += 1
+        if span is not None:
+            span.retries += 1
+        print(f"--- Retrying after {type(error).__name__} in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}) ---")
+        return delay
+
+    def call(self, spec, tokens: float, priority: int, request, span=None, usage=None):
+        """
+        Runs `request()` once the limits allow it, retrying 429s and transient errors. Each
+        attempt is charged `tokens` up front; a failed attempt gets them back, and the one that
+        answers is settled against `usage(response)`, its real token count, when given.
+        """
+        limiter = self.limiter(spec)
+        for attempt in itertools.count():
+            self._record_wait(spec, limiter.acquire(tokens, priority), span)
+            if not granted():
+                self._abandon(limiter, tokens)
+            try:
+                response = request()
+            except BaseException as e:
+                limiter.refund(tokens)
+                if not isinstance(e, Exception):
+                    raise
+                time.sleep(self._on_error(limiter, attempt, e, span))
+                continue
+            if usage is not None:
+                limiter.settle(tokens, usage(response))
+            return response
+
+    async def acall(self, spec, tokens: float, priority: int, request, span=None, usage=None):
+        """Async counterpart of call; `request()` returns an awaitable."""
+        limiter = self.limiter(spec)
+        for attempt in itertools.count():
+            self._record_wait(spec, await limiter.aacquire(tokens, priority), span)
+            if not granted():
+                self._abandon(limiter, tokens)
+            try:
+                response = await request()
+            except BaseException as e:
+                # Cancelled attempts (a hedge that lost) are refunded too.
+                limiter.refund(tokens)
+                if not isinstance(e, Exception):
+                    raise
+                await asyncio.sleep(self._on_error(limiter, attempt, e, span))
+                continue
+            if usage is not None:
+                limiter.settle(tokens, usage(response))
+            return response
+
+    def settle(self, spec, estimated: float, actual: float):
+        self.limiter(spec).settle(estimated, actual)
+
+    def queue_depths(self):
+        """(labels, depth) pairs for the agent_rate_limit_queue_depth gauge."""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return [({"provider": p, "model": m}, limiter.stats()["queue_depth"]) for (p, m), limiter in limiters.items()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {f"{provider}/{model}": limiter.stats() for (provider, model), limiter in limiters.items()}
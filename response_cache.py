@@ -0,0 +1,146 @@
+import re
+import sqlite3
+import threading
+import time
+
+def normalize_prompt(text: str) -> str:
+    """Lowercases the prompt and collapses punctuation and whitespace."""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+# Words that do not change what a prompt asks for; every other word must match for a near hit.
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "to", "with", "in", "on", "at", "by", "me", "my", "i",
+    "please", "can", "you", "could", "would", "make", "create", "build", "generate", "some", "that", "this",
+}
+
+def content_words(text: str) -> set:
+    """Normalized words other than stopwords, with a plural "s" dropped."""
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word
+            for word in text.split() if word not in STOPWORDS}
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ResponseCache:
+    """
+    On-disk cache of approved code keyed by the normalized first request of a thread.
+
+    Exact matches are looked up by key. Near matching is off unless `similarity_threshold`
+    is set: a near match then needs trigram Jaccard similarity over the threshold and the
+    same content words (so "dark theme" never serves "light theme"), and must pass the
+    caller's `validate` check. Entries expire after `ttl_seconds` and the least recently
+    used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 500,
+                 similarity_threshold: float = None, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        self._index = {key: trigrams(key) for (key,) in self._conn.execute("SELECT key FROM response_cache")}
+        self.hits = 0
+        self.near_hits = 0
+        # Near matches whose code failed the caller's validation.
+        self.near_rejected = 0
+        self.misses = 0
+
+    def _nearest(self, key: str):
+        if self.similarity_threshold is None:
+            return None
+        grams = trigrams(key)
+        words = content_words(key)
+        best_key, best_score = None, 0.0
+        for other, other_grams in self._index.items():
+            if content_words(other) != words:
+                continue
+            score = len(grams & other_grams) / len(grams | other_grams)
+            if score > best_score:
+                best_key, best_score = other, score
+        if best_score >= self.similarity_threshold:
+            return best_key
+        return None
+
+    def get(self, prompt: str, validate=None):
+        """
+        Returns cached code for the prompt or a near-identical one, or None. `validate(code)`
+        must return True for a near match to be served; exact matches were approved as is.
+        """
+        if not self.enabled:
+            return None
+        key = normalize_prompt(prompt)
+        now = time.time()
+        with self._lock:
+            match = key if key in self._index else self._nearest(key)
+            if match is None:
+                self.misses += 1
+                return None
+            row = self._conn.execute(
+                "SELECT content, created_at FROM response_cache WHERE key = ?", (match,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self._delete(match)
+                self._conn.commit()
+                self.misses += 1
+                return None
+            if match != key and validate is not None and not validate(row[0]):
+                self.near_rejected += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, match))
+            self._conn.commit()
+            if match == key:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return row[0]
+
+    def put(self, prompt: str, content: str):
+        """Stores approved code for the prompt, evicting the least recently used entries."""
+        key = normalize_prompt(prompt)
+        if not self.enabled or not key or not content:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, content, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            self._index[key] = trigrams(key)
+            expired = [k for (k,) in self._conn.execute(
+                "SELECT key FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            )]
+            overflow = len(self._index) - len(expired) - self.max_entries
+            if overflow > 0:
+                expired += [k for (k,) in self._conn.execute(
+                    "SELECT key FROM response_cache WHERE created_at >= ? ORDER BY last_access LIMIT ?",
+                    (now - self.ttl_seconds, overflow),
+                )]
+            for k in expired:
+                self._delete(k)
+            self._conn.commit()
+
+    def _delete(self, key: str):
+        self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        self._index.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "near_rejected": self.near_rejected,
+            "misses": self.misses,
+        }
@@ -0,0 +1,155 @@
+"""
+Single-flight coalescing of identical in-flight LLM calls.
+
+When several sessions send the same request at the same moment (a demo link shared in a
+workshop), `SingleFlight` lets the first call go upstream and parks the others on its
+result. Requests are identical when the (provider, model), client settings, structured-output
+schema and the normalized message list (type, name and whitespace-collapsed content; message
+ids are ignored) all match. Only calls that overlap in time are shared; nothing is cached.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+from langchain_core.messages import convert_to_messages
+
+from rate_limiting import RequestAbandoned, granted
+
+def normalize_content(content):
+    if isinstance(content, str):
+        return " ".join(content.split())
+    return content
+
+def flight_key(spec, messages, schema=None, client_kwargs: dict = None) -> str:
+    """Hash of everything that decides the upstream response."""
+    payload = {
+        "spec": list(spec),
+        "client": client_kwargs or {},
+        "schema": schema.__name__ if schema is not None else None,
+        "messages": [[m.type, m.name, normalize_content(m.content)] for m in convert_to_messages(messages)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _copy(response):
+    """Each waiter gets its own copy, so one session cannot mutate another's message."""
+    if hasattr(response, "model_copy"):
+        return response.model_copy(deep=True)
+    return copy.deepcopy(response)
+
+class SingleFlight:
+    """
+    `call(key, fn)` / `acall(key, fn)` run `fn()` unless a call with the same key is already
+    in flight, in which case they wait for that call and return a copy of its result (or
+    raise its error). The second value returned tells whether the call was coalesced.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = Counter()
+        self._by_node = Counter()
+
+    def _join(self, key):
+        """Returns (future, leader): a new flight to run, or the one already in flight."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                return future, False
+            future = self._flights[key] = Future()
+            # Running futures cannot be cancelled by a waiter giving up.
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def _land(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def _count(self, node, leader: bool):
+        node = node or "unknown"
+        with self._lock:
+            self._stats["calls"] += 1
+            if leader:
+                self._stats["upstream"] += 1
+            else:
+                self._stats["coalesced"] += 1
+                self._by_node[node] += 1
+        if not leader:
+            print(f"--- Single-flight ({node}): joined an identical call already in flight ---")
+
+    def call(self, key, fn, node=None):
+        if not self.enabled:
+            return fn(), False
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                self._count(node, True)
+                try:
+                    result = fn()
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                finally:
+                    self._land(key, future)
+                future.set_result(result)
+                return result, False
+            self._count(node, False)
+            # The shared request is under way; the caller's clocks start now.
+            if not granted():
+                raise RequestAbandoned("the caller stopped waiting before joining the shared request")
+            try:
+                return _copy(future.result()), True
+            except (asyncio.CancelledError, RequestAbandoned):
+                # The leader's own caller stopped waiting for it (cancelled, or dropped while
+                # queued); this caller still wants the answer, so start over.
+                continue
+
+    async def acall(self, key, fn, node=None):
+        """Async counterpart of call; `fn()` returns a coroutine. Sync and async calls share flights."""
+        if not self.enabled:
+            return await fn(), False
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                self._count(node, True)
+                try:
+                    result = await fn()
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                finally:
+                    self._land(key, future)
+                future.set_result(result)
+                return result, False
+            self._count(node, False)
+            if not granted():
+                raise RequestAbandoned("the caller stopped waiting before joining the shared request")
+            try:
+                return _copy(await asyncio.wrap_future(future)), True
+            except RequestAbandoned:
+                continue
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled() and isinstance(future.exception(), asyncio.CancelledError):
+                    continue
+                raise
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self._stats["calls"]
+            return {
+                "calls": calls,
+                "upstream": self._stats["upstream"],
+                "coalesced": self._stats["coalesced"],
+                "coalesced_rate": self._stats["coalesced"] / calls if calls else 0.0,
+                "in_flight": len(self._flights),
+                "by_node": dict(self._by_node),
+            }
@@ -0,0 +1,199 @@
+"""
+Speculative execution of the node the supervisor is likely to choose.
+
+While the supervisor LLM call is in flight, `Speculator.start` runs the predicted node's
+LLM work (enhancer or code_developer) on the same state. When the supervisor agrees, that
+node picks up the finished or still-running result with `take` instead of starting its own
+call; when it disagrees, the speculative work is cancelled (async) or left to finish and
+discarded (sync), and its tokens are counted as wasted.
+
+Speculative code generation runs inside the supervisor node, so its tokens are not streamed
+to the UI; the code appears as soon as the code_developer node takes it.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from instrumentation import current_node, current_thread_id
+
+# Speculation the current LLM call belongs to, so its token usage can be charged to it.
+current_speculation = contextvars.ContextVar("current_speculation", default=None)
+
+@dataclass
+class Speculation:
+    thread_id: str
+    node: str
+    # Id of the last message of the state the work started from.
+    base_message_id: str
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+    tokens: int = 0
+    future: object = None
+
+class Speculator:
+    """
+    Starts, resolves and hands over speculative node work, one pending speculation per
+    conversation thread. Disabled unless `enabled` is set (SPECULATIVE_EXECUTION=1).
+    """
+
+    def __init__(self, enabled: bool = False, min_confidence: float = 0.5, max_workers: int = 16):
+        self.enabled = enabled
+        # Only speculate when the predicted route is at least this likely.
+        self.min_confidence = min_confidence
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stats = Counter()
+        self._wasted_tokens = 0
+        self._overlap_seconds = 0.0
+
+    def should_start(self, thread_id, confidence: float) -> bool:
+        return self.enabled and thread_id is not None and confidence >= self.min_confidence
+
+    def _register(self, speculation: Speculation):
+        with self._lock:
+            self._pending[speculation.thread_id] = speculation
+            self._stats["started"] += 1
+        print(f"--- Speculation: starting {speculation.node} alongside the supervisor ---")
+
+    def _finished(self, speculation: Speculation):
+        speculation.finished = time.monotonic()
+
+    def start(self, thread_id, node: str, state, work):
+        """Runs `work(state)` on a worker thread; returns the Speculation."""
+        speculation = Speculation(thread_id, node, state["messages"][-1].id)
+
+        def run():
+            current_speculation.set(speculation)
+            current_node.set(node)
+            try:
+                return work(state)
+            finally:
+                self._finished(speculation)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="speculation")
+        speculation.future = self._executor.submit(contextvars.copy_context().run, run)
+        self._register(speculation)
+        return speculation
+
+    def astart(self, thread_id, node: str, state, work):
+        """Async counterpart of start; `work(state)` is a coroutine function run as a task."""
+        speculation = Speculation(thread_id, node, state["messages"][-1].id)
+
+        async def run():
+            # The task runs in a copy of the context, so these do not leak into the supervisor.
+            current_speculation.set(speculation)
+            current_node.set(node)
+            try:
+                return await work(state)
+            finally:
+                self._finished(speculation)
+
+        speculation.future = asyncio.ensure_future(run())
+        self._register(speculation)
+        return speculation
+
+    def resolve(self, speculation: Speculation, chosen):
+        """Records the supervisor's decision; discards the speculation when it chose another node."""
+        if speculation is None:
+            return
+        if chosen == speculation.node:
+            with self._lock:
+                self._stats["hits"] += 1
+            return
+        with self._lock:
+            if self._pending.get(speculation.thread_id) is speculation:
+                del self._pending[speculation.thread_id]
+            self._stats["misses"] += 1
+        cancelled = speculation.future.cancel()
+        print(f"--- Speculation: supervisor chose {chosen}; {'cancelled' if cancelled else 'discarding'} {speculation.node} ---")
+        speculation.future.add_done_callback(lambda _: self._waste(speculation))
+
+    def _waste(self, speculation: Speculation):
+        with self._lock:
+            self._wasted_tokens += speculation.tokens
+
+    def _claim(self, node: str, state):
+        """Pops the thread's speculation when it was started for `node` from this state."""
+        messages = state["messages"]
+        with self._lock:
+            speculation = self._pending.get(current_thread_id.get())
+            if speculation is None or speculation.node != node:
+                return None
+            del self._pending[speculation.thread_id]
+        # The node runs on the speculated state plus the supervisor's routing message.
+        if len(messages) < 2 or messages[-1].name != "supervisor" or messages[-2].id != speculation.base_message_id:
+            speculation.future.cancel()
+            with self._lock:
+                self._stats["stale"] += 1
+            return None
+        return speculation
+
+    def _used(self, speculation: Speculation, claimed_at: float):
+        with self._lock:
+            self._stats["used"] += 1
+            self._overlap_seconds += min(claimed_at, speculation.finished or claimed_at) - speculation.started
+
+    def _failed(self, speculation: Speculation, error):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._wasted_tokens += speculation.tokens
+        print(f"--- Speculation: {speculation.node} failed ({error!r}); running it again ---")
+
+    def take(self, node: str, state):
+        """Result of the speculative work for `node`, waiting for it if needed; None when there is none."""
+        speculation = self._claim(node, state)
+        if speculation is None:
+            return None
+        claimed_at = time.monotonic()
+        try:
+            result = speculation.future.result()
+        except Exception as e:
+            self._failed(speculation, e)
+            return None
+        self._used(speculation, claimed_at)
+        return result
+
+    async def atake(self, node: str, state):
+        """Async counterpart of take."""
+        speculation = self._claim(node, state)
+        if speculation is None:
+            return None
+        claimed_at = time.monotonic()
+        future = speculation.future
+        try:
+            result = await (future if isinstance(future, asyncio.Future) else asyncio.wrap_future(future))
+        except Exception as e:
+            self._failed(speculation, e)
+            return None
+        self._used(speculation, claimed_at)
+        return result
+
+    def charge(self, tokens: int):
+        """Adds an LLM call's tokens to the speculation it was made for, if any."""
+        speculation = current_speculation.get()
+        if speculation is not None:
+            speculation.tokens += tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            resolved = self._stats["hits"] + self._stats["misses"]
+            return {
+                "started": self._stats["started"],
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "hit_rate": self._stats["hits"] / resolved if resolved else 0.0,
+                "used": self._stats["used"],
+                "failures": self._stats["failures"],
+                "stale": self._stats["stale"],
+                "wasted_tokens": self._wasted_tokens,
+                # Seconds of node work that overlapped the supervisor call.
+                "overlap_seconds": self._overlap_seconds,
+            }
@@ -0,0 +1,233 @@
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+
+from code_parser import parse_code
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr", "!doctype",
+}
+# Elements whose end tag may be omitted in valid HTML.
+OPTIONAL_END_TAGS = {"p", "li", "dt", "dd", "option", "tr", "td", "th", "thead", "tbody", "tfoot", "colgroup"}
+
+STOPWORDS = {
+    "a", "an", "and", "the", "with", "for", "that", "this", "make", "create", "build", "page",
+    "please", "should", "have", "from", "into", "some", "using", "want", "need", "like", "also",
+    "which", "when", "where", "them", "then", "there", "their", "simple", "website", "app",
+}
+
+@dataclass
+class StaticReport:
+    errors: list = field(default_factory=list)
+    warnings: list = field(default_factory=list)
+    keyword_coverage: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def high_confidence(self) -> bool:
+        """True when the code is clean and clearly about the request."""
+        return self.ok and not self.warnings and self.keyword_coverage >= 0.6
+
+class _TagBalanceParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.problems = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        if tag not in self.stack:
+            self.problems.append(f"</{tag}> has no matching opening tag")
+            return
+        while self.stack:
+            open_tag = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in OPTIONAL_END_TAGS:
+                self.problems.append(f"<{open_tag}> is not closed before </{tag}>")
+
+def check_html(html_code: str):
+    """Returns (unclosed, mismatched): elements left open at the end, and misnested tags."""
+    parser = _TagBalanceParser()
+    parser.feed(html_code)
+    parser.close()
+    unclosed = [f"<{t}> is never closed" for t in parser.stack if t not in OPTIONAL_END_TAGS]
+    return unclosed, parser.problems
+
+def _strip_css_comments_and_strings(css_code: str) -> str:
+    css_code = re.sub(r"/\*.*?\*/", "", css_code, flags=re.DOTALL)
+    return re.sub(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'", '""', css_code)
+
+def check_css(css_code: str):
+    problems = []
+    text = _strip_css_comments_and_strings(css_code)
+    depth = 0
+    prelude_start = 0
+    for i, ch in enumerate(text):
+        if ch == "{":
+            if not text[prelude_start:i].strip():
+                problems.append(f"rule without a selector near offset {i}")
+            depth += 1
+            prelude_start = i + 1
+        elif ch == "}":
+            depth -= 1
+            if depth < 0:
+                problems.append(f"unexpected '}}' at offset {i}")
+                depth = 0
+            prelude_start = i + 1
+        elif ch == ";":
+            prelude_start = i + 1
+    if depth > 0:
+        problems.append(f"{depth} unclosed '{{' block(s)")
+    return problems
+
+# Characters after which a '/' starts a regular expression literal rather than a division.
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+
+def check_js(js_code: str):
+    """Tokenizes enough JavaScript to catch unterminated strings/comments and unbalanced brackets."""
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = []
+    i, n = 0, len(js_code)
+    last_significant = ""
+    template_depths = []
+    while i < n:
+        ch = js_code[i]
+        nxt = js_code[i + 1] if i + 1 < n else ""
+        if ch in " \t\r\n":
+            i += 1
+            continue
+        if ch == "/" and nxt == "/":
+            end = js_code.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if ch == "/" and nxt == "*":
+            end = js_code.find("*/", i + 2)
+            if end == -1:
+                return ["unterminated block comment"]
+            i = end + 2
+            continue
+        if ch in "'\"":
+            j = i + 1
+            while j < n and js_code[j] != ch:
+                if js_code[j] == "\\":
+                    j += 1
+                elif js_code[j] == "\n":
+                    return [f"unterminated string starting at offset {i}"]
+                j += 1
+            if j >= n:
+                return [f"unterminated string starting at offset {i}"]
+            i = j + 1
+            last_significant = "a"
+            continue
+        if ch == "`" or (ch == "}" and template_depths and template_depths[-1] == len(stack)):
+            if ch == "}":
+                template_depths.pop()
+            j = i + 1
+            while j < n and js_code[j] != "`":
+                if js_code[j] == "\\":
+                    j += 1
+                elif js_code[j] == "$" and j + 1 < n and js_code[j + 1] == "{":
+                    template_depths.append(len(stack))
+                    break
+                j += 1
+            else:
+                if j >= n:
+                    return [f"unterminated template literal near offset {i}"]
+            i = j + (2 if j < n and js_code[j] == "$" else 1)
+            last_significant = "(" if j < n and js_code[j] == "$" else "a"
+            continue
+        if ch == "/" and last_significant in _REGEX_PRECEDERS:
+            j = i + 1
+            in_class = False
+            while j < n and (js_code[j] != "/" or in_class):
+                if js_code[j] == "\\":
+                    j += 1
+                elif js_code[j] == "[":
+                    in_class = True
+                elif js_code[j] == "]":
+                    in_class = False
+                elif js_code[j] == "\n":
+                    return [f"unterminated regular expression at offset {i}"]
+                j += 1
+            i = j + 1
+            last_significant = "a"
+            continue
+        if ch in "([{":
+            stack.append(ch)
+        elif ch in ")]}":
+            if not stack or stack[-1] != pairs[ch]:
+                return [f"unbalanced '{ch}' at offset {i}"]
+            stack.pop()
+        if re.match(r"[\w$]", ch):
+            m = re.match(r"[\w$]+", js_code[i:])
+            word = m.group(0)
+            i += len(word)
+            last_significant = "(" if word in {"return", "typeof", "case", "in", "of", "delete", "void", "throw", "new"} else "a"
+            continue
+        last_significant = ch if ch not in ")]" else "a"
+        i += 1
+    if stack or template_depths:
+        return [f"{len(stack)} unclosed bracket(s)"]
+    return []
+
+def keyword_coverage(request: str, code: str) -> float:
+    """Share of the request's content words that appear somewhere in the code."""
+    words = {w for w in re.findall(r"[a-z]{4,}", request.lower()) if w not in STOPWORDS}
+    if not words:
+        return 1.0
+    code_lower = code.lower()
+    return sum(1 for w in words if w in code_lower) / len(words)
+
+def validate_code(generated_code: str, request: str = "") -> StaticReport:
+    """Runs the local HTML, CSS and JS checks on a code_developer answer."""
+    report = StaticReport()
+    html_code, css_code, js_code = parse_code(generated_code)
+    if not html_code:
+        report.errors.append("The HTML code block is missing.")
+    else:
+        # Elements left open usually mean the answer was cut off; misnesting is tolerated by browsers.
+        unclosed, mismatched = check_html(html_code)
+        report.errors += [f"HTML: {p}" for p in unclosed]
+        report.warnings += [f"HTML: {p}" for p in mismatched]
+    if not css_code:
+        report.warnings.append("The CSS code block is missing.")
+    else:
+        report.errors += [f"CSS: {p}" for p in check_css(css_code)]
+    if js_code:
+        report.errors += [f"JavaScript: {p}" for p in check_js(js_code)]
+    report.keyword_coverage = keyword_coverage(request, generated_code) if request else 0.0
+    return report
+
+# Combined size of the three blocks above which an answer gets the full size credit; much
+# shorter answers are usually truncated or placeholder code.
+CANDIDATE_FULL_SIZE = 1500
+
+def score_candidate(generated_code: str, request: str = "") -> float:
+    """
+    Local quality score used to rank alternative code_developer answers: one point per code
+    block present, up to two for keyword coverage of the request and one for size, minus two
+    per static error and a quarter per warning.
+    """
+    report = validate_code(generated_code, request)
+    blocks = [block for block in parse_code(generated_code) if block and block.strip()]
+    size = sum(len(block) for block in blocks)
+    return (
+        len(blocks)
+        + 2.0 * report.keyword_coverage
+        + min(1.0, size / CANDIDATE_FULL_SIZE)
+        - 2.0 * len(report.errors)
+        - 0.25 * len(report.warnings)
+    )
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules live at the repository root, like the benchmarks expect; the fake providers
+# live with the benchmarks.
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+sys.path.insert(0, REPO_ROOT)
+
+@pytest.fixture(scope="session")
+def agent(tmp_path_factory):
+    """main_agent with fake providers and no client-side quotas, run from a scratch directory."""
+    # main_agent keeps its databases under data/ in the working directory.
+    os.chdir(tmp_path_factory.mktemp("agent"))
+    import main_agent
+    from fake_llm import install_fake_providers
+    from rate_limiting import RateLimiter
+
+    install_fake_providers(main_agent.client_registry, first_token_latency=0.0, tokens_per_second=1e6)
+    main_agent.rate_limiter = RateLimiter({})
+    return main_agent
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+from candidates import CandidateGenerator, CandidatesFailed, Variant
+from rate_limiting import RateLimiter
+
+A, B = Variant(("google", "a")), Variant(("google", "b"))
+
+class Reply:
+    usage_metadata = {}
+
+    def __init__(self, content):
+        self.content = content
+
+def generator(limiter, answer_after, sent, **kwargs):
+    def call(variant, messages, stream):
+        def request():
+            sent.append(variant.spec)
+            time.sleep(answer_after[variant.spec])
+            return Reply(variant.spec[1])
+        return limiter.call(variant.spec, 1, 0, request)
+
+    async def acall(variant, messages, stream):
+        async def request():
+            sent.append(variant.spec)
+            await asyncio.sleep(answer_after[variant.spec])
+            return Reply(variant.spec[1])
+        return await limiter.acall(variant.spec, 1, 0, request)
+
+    return CandidateGenerator([A, B], call, acall, score=lambda content, request: len(content), **kwargs)
+
+def generate(candidates, mode):
+    if mode == "async":
+        return asyncio.run(candidates.agenerate([], "request", 2))
+    return candidates.generate([], "request", 2)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_fan_out_gives_up_after_the_timeout(mode):
+    candidates = generator(RateLimiter({}), {A.spec: 5.0, B.spec: 5.0}, [], timeout=0.2)
+    start = time.monotonic()
+    with pytest.raises(CandidatesFailed, match="no answer after 0.2s"):
+        generate(candidates, mode)
+    assert time.monotonic() - start < 1.0
+    assert candidates.stats()["timeouts"] == 1
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_time_queued_for_quota_does_not_count_towards_the_timeout(mode):
+    limiter = RateLimiter({A.spec: (1, None), B.spec: (1, None)}, period=0.4)
+    for variant in (A, B):
+        limiter.limiter(variant.spec).acquire(0)
+    candidates = generator(limiter, {A.spec: 0.05, B.spec: 0.05}, [], timeout=0.3)
+    assert generate(candidates, mode) in ("a", "b")
+    assert "timeouts" not in candidates.stats()
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_candidate_still_queued_after_the_grace_period_is_not_sent(mode):
+    limiter = RateLimiter({B.spec: (1, None)}, period=0.6)
+    limiter.limiter(B.spec).acquire(0)
+    sent = []
+    candidates = generator(limiter, {A.spec: 0.05, B.spec: 0.0}, sent, grace=0.5)
+    assert generate(candidates, mode) == "a"
+    time.sleep(0.7)
+    assert sent == [A.spec]
+    assert candidates.stats()["abandoned"] == 1
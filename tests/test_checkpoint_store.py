@@ -0,0 +1,176 @@
+import sqlite3
+
+import pytest
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from checkpoint_store import BLOB_REF_TYPE, PooledSqliteSaver
+
+def echo_graph(saver):
+    def echo(state):
+        return {"messages": [AIMessage(f"echo: {state['messages'][-1].content}")]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("echo", echo)
+    graph.add_edge(START, "echo")
+    graph.add_edge("echo", END)
+    return graph.compile(checkpointer=saver)
+
+def chat(app, thread_id, *texts):
+    config = {"configurable": {"thread_id": thread_id}}
+    for text in texts:
+        app.invoke({"messages": [HumanMessage(text)]}, config)
+    return app.get_state(config)
+
+def count(saver, table):
+    with saver.cursor(transaction=False) as cur:
+        return cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_new_catalog_has_the_approved_checkpoint_column(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"))
+    saver.setup()
+    columns = {row[1] for row in sqlite3.connect(tmp_path / "chat.db").execute("PRAGMA table_info(threads)")}
+    assert "approved_checkpoint_id" in columns
+
+def test_prune_keeps_the_latest_checkpoints_and_the_approved_snapshot(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"))
+    app = echo_graph(saver)
+    chat(app, "t1", "first")
+    saver.mark_approved("t1")
+    approved = saver.get_tuple({"configurable": {"thread_id": "t1"}}).config["configurable"]["checkpoint_id"]
+    state = chat(app, "t1", "second", "third", "fourth")
+    assert saver.prune_checkpoints(keep_last=2) > 0
+    with saver.cursor(transaction=False) as cur:
+        kept = {row[0] for row in cur.execute("SELECT checkpoint_id FROM checkpoints WHERE thread_id = 't1'")}
+    assert kept == {approved, state.config["configurable"]["checkpoint_id"],
+                    state.parent_config["configurable"]["checkpoint_id"]}
+    # The latest state still loads in full.
+    assert [m.content for m in app.get_state({"configurable": {"thread_id": "t1"}}).values["messages"]][-1] == "echo: fourth"
+
+def test_prune_blobs_deletes_only_unreferenced_blobs(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"), blobs=True)
+    app = echo_graph(saver)
+    chat(app, "kept", "a shared request")
+    chat(app, "deleted", "a shared request", "only in the deleted thread")
+    saver.delete_thread("deleted")
+    # Nothing in the serializer's recent set protects the orphans.
+    saver.blob_serde.forget_blobs(saver.blob_serde.recent_blobs())
+    before = count(saver, "blobs")
+    deleted = saver.prune_blobs()
+    assert 0 < deleted < before
+    assert [m.content for m in chat(app, "kept").values["messages"]] == ["a shared request", "echo: a shared request"]
+    assert saver.prune_blobs() == 0
+
+def test_prune_blobs_scans_references_without_the_write_lock(tmp_path, monkeypatch):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"), blobs=True)
+    chat(echo_graph(saver), "t1", "hello")
+    saver.delete_thread("t1")
+    locked = []
+    referenced_blobs = saver._referenced_blobs
+
+    def scan(cur, after=None):
+        locked.append((after is None, saver._write_lock.locked()))
+        return referenced_blobs(cur, after)
+
+    monkeypatch.setattr(saver, "_referenced_blobs", scan)
+    saver.prune_blobs()
+    # The full scan runs unlocked; only the rows added since are read under the lock.
+    assert locked == [(True, False), (False, True)]
+
+def test_pool_connections_use_wal_and_wait_for_locks(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"), pool_size=2, busy_timeout_ms=1234)
+    with saver.cursor(transaction=False) as cur:
+        assert cur.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert cur.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    # A nested cursor checks out a second connection, and both go back to the pool.
+    with saver.cursor(transaction=False) as outer, saver.cursor(transaction=False) as inner:
+        assert outer.connection is not inner.connection
+    assert saver._pool.qsize() == 2
+
+def test_concurrent_sessions_share_the_pool(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"), pool_size=4)
+    app = echo_graph(saver)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        states = list(pool.map(lambda i: chat(app, f"t{i}", "one", "two", "three"), range(16)))
+    assert all(len(state.values["messages"]) == 6 for state in states)
+    assert len(saver.list_threads(limit=100)) == 16
+
+def test_pending_writes_are_buffered_until_the_next_checkpoint(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"))
+    app = echo_graph(saver)
+    config = chat(app, "t1", "hello").config
+    writes = count(saver, "writes")
+    saver.put_writes(config, [("messages", [HumanMessage("buffered")])], "task-1")
+    assert count(saver, "writes") == writes
+    # Reading the thread commits its buffered writes first.
+    assert saver.get_tuple(config).pending_writes[-1][1] == "messages"
+    assert count(saver, "writes") == writes + 1
+
+def test_flush_commits_buffered_writes_of_every_thread(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"))
+    app = echo_graph(saver)
+    configs = [chat(app, thread_id, "hello").config for thread_id in ("t1", "t2")]
+    writes = count(saver, "writes")
+    for config in configs:
+        saver.put_writes(config, [("messages", [HumanMessage("buffered")])], "task-1")
+    saver.flush("t1")
+    assert count(saver, "writes") == writes + 1
+    saver.flush()
+    assert count(saver, "writes") == writes + 2
+
+def test_failed_transaction_runs_its_rollback_hooks(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"))
+    saver.setup()
+    outcomes = []
+    with pytest.raises(RuntimeError), saver.cursor() as cur:
+        cur.execute("INSERT INTO blobs (hash, type, data, size) VALUES ('h', 't', x'00', 1)")
+        saver.on_transaction_end(lambda: outcomes.append("committed"), lambda: outcomes.append("rolled back"))
+        raise RuntimeError("boom")
+    assert outcomes == ["rolled back"]
+    assert count(saver, "blobs") == 0
+
+def messages_of(saver, thread_id):
+    state = echo_graph(saver).get_state({"configurable": {"thread_id": thread_id}})
+    return [(type(m).__name__, m.content, m.id) for m in state.values["messages"]]
+
+def row_types(saver, table):
+    with saver.cursor(transaction=False) as cur:
+        return {row[0] for row in cur.execute(f"SELECT type FROM {table}")}
+
+def test_blob_checkpoints_round_trip_with_blobs_on_or_off(tmp_path):
+    path = str(tmp_path / "chat.db")
+    saver = PooledSqliteSaver(path, blobs=True)
+    chat(echo_graph(saver), "t1", "x" * 5000, "second", "third")
+    assert BLOB_REF_TYPE in row_types(saver, "checkpoints")
+    expected = messages_of(saver, "t1")
+    assert expected[0][1] == "x" * 5000
+    assert messages_of(PooledSqliteSaver(path, blobs=True), "t1") == expected
+    assert messages_of(PooledSqliteSaver(path), "t1") == expected
+
+def test_blobs_store_each_message_once(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chat.db"), blobs=True)
+    chat(echo_graph(saver), "t1", *[f"turn {i}" for i in range(10)])
+    # Every checkpoint repeats the whole conversation, but the blobs grow by a few rows per
+    # turn (the two messages, and the input as written before the graph gave it an id).
+    assert count(saver, "checkpoints") > 20
+    assert count(saver, "blobs") <= 4 * 10
+
+def test_migrate_converts_plain_rows_and_keeps_them_loadable(tmp_path):
+    path = str(tmp_path / "chat.db")
+    plain = PooledSqliteSaver(path)
+    chat(echo_graph(plain), "t1", "hello", "world")
+    expected = messages_of(plain, "t1")
+    assert BLOB_REF_TYPE not in row_types(plain, "checkpoints")
+    with pytest.raises(RuntimeError):
+        plain.migrate_blobs()
+
+    migrated = PooledSqliteSaver(path, blobs=True)
+    counts = migrated.migrate_blobs(batch_size=2)
+    assert counts == {"checkpoints": count(migrated, "checkpoints"), "writes": count(migrated, "writes")}
+    # Checkpoints holding messages now reference blobs; small ones without stay inline.
+    assert BLOB_REF_TYPE in row_types(migrated, "checkpoints")
+    assert count(migrated, "blobs") > 0
+    assert messages_of(PooledSqliteSaver(path), "t1") == expected
@@ -0,0 +1,69 @@
+import re
+
+import pytest
+
+from code_parser import CodeFenceParser, format_code, parse_code
+
+def legacy_parse_code(content: str):
+    """The regex parser parse_code replaced."""
+    blocks = []
+    for language in ("html", "css", "javascript"):
+        match = re.search(rf"```{language}\s*([\s\S]*?)\s*```", content)
+        blocks.append(match.group(1).strip() if match else "")
+    return tuple(blocks)
+
+def streamed(content: str, chunk: int = 7):
+    parser = CodeFenceParser()
+    for start in range(0, len(content), chunk):
+        parser.feed(content[start:start + chunk])
+    parser.feed("\n")
+    return parser.result()
+
+# Inputs the regex parser got right; the fence parser must agree with it.
+MATCHES_LEGACY = {
+    "plain": "Here you go:\n```html\n<div>hi</div>\n```\n```css\nbody { color: red; }\n```\n```javascript\nrun();\n```\n",
+    "closing fence after code": "```html\n<div>hi</div>```\n```css\nbody { color: red; }```\n```javascript\nrun();\n```",
+    "css closed on its last line": "```css\nbody { color: red; }```\n```javascript\nconsole.log(1);\n```",
+    "unclosed css before javascript": "```css\nbody { color: red; }\n```javascript\nconsole.log(1);\n```",
+    "one-line fences": "```html<div>hi</div>```\n```css body{}```\n```javascript\nrun();\n```",
+    "prose around blocks": "Intro.\n\n```html\n<p>a</p>\n```\nSome notes.\n\n```javascript\nlet a = 1;\n```\nDone.",
+}
+
+@pytest.mark.parametrize("name", sorted(MATCHES_LEGACY))
+def test_agrees_with_the_regex_parser(name):
+    content = MATCHES_LEGACY[name]
+    assert parse_code(content) == legacy_parse_code(content)
+    assert streamed(content) == legacy_parse_code(content)
+
+def test_css_closed_on_its_last_line_keeps_the_javascript():
+    html, css, js = parse_code("```css\nbody { color: red; }```\n```javascript\nconsole.log(1);\n```")
+    assert (css, js) == ("body { color: red; }", "console.log(1);")
+
+def test_unclosed_css_fence_does_not_swallow_the_javascript():
+    html, css, js = parse_code("```css\nbody { color: red; }\n\n```javascript\nconsole.log(1);\n```")
+    assert (css, js) == ("body { color: red; }", "console.log(1);")
+
+def test_unclosed_last_block_is_included():
+    assert parse_code("```html\n<div>a</div>\n```\n```javascript\nrun();")[2] == "run();"
+
+def test_opener_with_attributes():
+    content = "```html title=index.html\n<div>hi</div>\n```"
+    assert parse_code(content)[0] == "<div>hi</div>"
+    # The regex parser took the attributes for code.
+    assert legacy_parse_code(content)[0] == "title=index.html\n<div>hi</div>"
+
+def test_one_line_fence():
+    assert parse_code("```html<div>hi</div>```")[0] == "<div>hi</div>"
+    assert legacy_parse_code("```html<div>hi</div>```")[0] == "<div>hi</div>"
+
+def test_other_languages_and_blocks_are_skipped_or_joined():
+    content = "```bash\nnpm start\n```\n```js\na();\n```\n```jsx\nb();\n```"
+    assert parse_code(content) == ("", "", "a();\n\nb();")
+
+def test_streaming_partial_closing_fence_is_not_shown():
+    parser = CodeFenceParser()
+    parser.feed("```css\nbody {}\n.a {}``")
+    assert parser.result()[1] == "body {}\n.a {}"
+
+def test_round_trip_with_format_code():
+    assert parse_code(format_code("<p>x</p>", "p { margin: 0; }", "go();")) == ("<p>x</p>", "p { margin: 0; }", "go();")
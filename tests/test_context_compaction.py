@@ -0,0 +1,50 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from code_parser import format_code
+from context_compaction import compact_messages, estimate_tokens
+
+# About 40k tokens of CSS: more than the code developer's 30k budget on its own.
+BIG_CODE = format_code("<main class='grid'></main>", ".card { padding: 1rem; }\n" * 6400, "run();")
+
+def feedback_round():
+    return [
+        HumanMessage("build a product grid"),
+        AIMessage("code_developer", name="supervisor"),
+        HumanMessage("A product grid with cards, filters and a cart.", name="enhancer"),
+        HumanMessage(BIG_CODE, name="code_developer"),
+        HumanMessage("make the cards rounded"),
+        HumanMessage("Rounded corners on every card.", name="enhancer"),
+        HumanMessage("add a cart badge"),
+    ]
+
+def test_code_developer_keeps_the_latest_code_over_budget():
+    messages = feedback_round()
+    assert estimate_tokens(messages[3]) > 30000
+    compacted = compact_messages(messages, 30000, keep_code=True)
+    contents = [m.content for m in compacted]
+    assert BIG_CODE in contents
+    # Feedback and enhancer notes went instead; the request and the latest feedback stay.
+    assert contents[0] == "build a product grid"
+    assert contents[-1] == "add a cart badge"
+    assert "make the cards rounded" not in contents
+    assert "Rounded corners on every card." not in contents
+
+def test_other_nodes_get_a_summary_of_code_over_budget():
+    compacted = compact_messages(feedback_round(), 1500)
+    code = next(m for m in compacted if m.name == "code_developer")
+    assert code.content.startswith("[Current code omitted:")
+
+def test_within_budget_nothing_but_routing_notes_and_old_code_is_dropped():
+    messages = [
+        HumanMessage("build a page"),
+        HumanMessage("old code", name="code_developer"),
+        AIMessage("code_developer", name="supervisor"),
+        HumanMessage("new code", name="code_developer"),
+        HumanMessage("make it blue"),
+    ]
+    compacted = compact_messages(messages, 30000, keep_code=True)
+    assert [m.content for m in compacted] == ["build a page", "new code", "make it blue"]
+
+def test_code_developer_patches_the_full_code_after_compaction(agent):
+    history = agent.node_context("code_developer", feedback_round())
+    assert any(m.content == BIG_CODE for m in history)
@@ -0,0 +1,69 @@
+import json
+
+from langchain_core.messages import HumanMessage
+
+from fast_router import FastRouter
+
+DETAILED = ("Build a responsive landing page with a hero header, a navbar, a pricing table with three "
+            "cards, a signup form and a footer with social links and a dark mode toggle")
+VAGUE = "make something cool for my small bakery business please"
+STYLE = "something bold for a bakery"
+
+def ask(text, **kwargs):
+    return [HumanMessage(text, **kwargs)]
+
+def trained(router, examples=20):
+    for i in range(examples):
+        router.record(ask(f"{VAGUE} {i}"), "enhancer")
+        router.record(ask(f"a chart and a table and a sidebar {i}"), "code_developer")
+    return router
+
+def test_rules_route_without_history():
+    router = FastRouter()
+    assert router.route(ask("a page"))[0] == "enhancer"
+    assert router.route(ask(DETAILED))[0] == "code_developer"
+    assert router.route([HumanMessage("hi"), HumanMessage("refined request", name="enhancer")])[0] == "code_developer"
+    assert router.route([HumanMessage(DETAILED), HumanMessage("<html>", name="code_developer"),
+                         HumanMessage("blue")])[0] == "code_developer"
+    # Neither short nor detailed: the supervisor LLM decides.
+    assert router.route(ask(VAGUE)) is None
+    assert router.stats()["llm_fallbacks"] == 1
+
+def test_classifier_needs_enough_examples_and_confidence():
+    router = FastRouter(min_examples=20)
+    trained(router, examples=5)
+    assert router.route(ask(VAGUE)) is None
+    trained(router, examples=10)
+    goto, reason = router.route(ask(VAGUE))
+    assert goto == "enhancer"
+    assert "confident" in reason
+    assert router.predict(ask("add a chart to the sidebar table"))[0] == "code_developer"
+
+def test_history_stores_word_counts_not_prompts(tmp_path):
+    path = tmp_path / "routing_history.jsonl"
+    router = trained(FastRouter(history_path=str(path)))
+    assert VAGUE not in path.read_text()
+    entry = json.loads(path.read_text().splitlines()[0])
+    assert entry == {"words": {w: 1 for w in f"{VAGUE} 0".split()}, "next": "enhancer"}
+    reloaded = FastRouter(history_path=str(path))
+    assert reloaded.stats()["training_examples"] == 40
+    assert reloaded.predict(ask(STYLE)) == router.predict(ask(STYLE))
+
+def test_history_keeps_the_latest_decisions(tmp_path):
+    path = tmp_path / "routing_history.jsonl"
+    router = trained(FastRouter(history_path=str(path), max_history=10))
+    assert router.stats()["training_examples"] == 10
+    assert len(path.read_text().splitlines()) < 20
+    # Evicted examples no longer count towards the model.
+    assert "0" not in router._word_counts["enhancer"]
+    reloaded = FastRouter(history_path=str(path), max_history=10)
+    assert reloaded._word_counts == router._word_counts
+    assert len(path.read_text().splitlines()) == 10
+
+def test_legacy_history_is_rewritten_without_prompts(tmp_path):
+    path = tmp_path / "routing_history.jsonl"
+    path.write_text("".join(json.dumps({"text": f"{VAGUE} {i}", "next": "enhancer"}) + "\n" for i in range(3)))
+    router = FastRouter(history_path=str(path))
+    assert router.stats()["training_examples"] == 3
+    assert VAGUE not in path.read_text()
+    assert all("words" in json.loads(line) for line in path.read_text().splitlines())
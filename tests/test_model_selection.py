@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from model_selection import ModelPolicy, ModelSelector
+from provider_routing import NodeRoute
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRO, FLASH, LITE = ("google", "gemini-2.5-pro"), ("google", "gemini-2.5-flash"), ("google", "gemini-2.0-flash-lite")
+
+POLICY = {
+    "estimate": {"features": ["dashboard", "chart", "table", "form"], "rewrite_words": ["redesign"]},
+    "sizes": {"small": 800, "medium": 4000},
+    "models": {
+        "google/gemini-2.5-pro": {"price": [1.25, 10.0], "first_token": 2.0, "tokens_per_second": 80},
+        "google/gemini-2.5-flash": {"price": [0.30, 2.50], "first_token": 0.8, "tokens_per_second": 200},
+        "google/gemini-2.0-flash-lite": {"price": [0.075, 0.30], "first_token": 0.4, "tokens_per_second": 300},
+    },
+    "nodes": {"code_developer": {"small": ["google/gemini-2.0-flash-lite"], "large": ["google/gemini-2.5-pro"]}},
+}
+
+CODE = "```html\n<div>page</div>\n```"
+
+def selector():
+    return ModelSelector(ModelPolicy(POLICY), {"code_developer": NodeRoute([FLASH])})
+
+def edit(feedback):
+    return [("user", "make a landing page"), AIMessage(CODE, name="code_developer"), ("user", feedback)]
+
+def test_shipped_policy_is_disabled():
+    with open(os.path.join(REPO_ROOT, "model_policy.json"), encoding="utf-8") as f:
+        assert json.load(f)["enabled"] is False
+    assert selector().policy.enabled
+    assert ModelSelector(ModelPolicy(), {}).choose("code_developer", edit("x")).models is None
+
+def test_task_size_estimate():
+    models = selector()
+    assert models.estimate(edit("make the header blue")).size == "small"
+    large = models.estimate([("user", "build a dashboard with a chart, a table and a signup form")])
+    assert (large.kind, large.size, large.features) == ("build", "large", ["dashboard", "chart", "table", "form"])
+
+def test_small_edit_tries_the_policy_pick_before_the_route():
+    choice = selector().choose("code_developer", edit("make the header blue"))
+    assert choice.models == [LITE, FLASH]
+
+def test_no_savings_booked_when_the_default_model_answers():
+    models = selector()
+    messages = edit("make the header blue")
+    choice = models.choose("code_developer", messages)
+    models.record(choice, messages, AIMessage(CODE), 3.0, FLASH)
+    stats = models.stats()["code_developer"]
+    assert (stats["switched"], stats["cost_saved"], stats["latency_saved"]) == (0, 0, 0)
+    assert stats["models"] == {"google/gemini-2.5-flash": 1}
+    assert stats["input_tokens"] > 0 and stats["output_tokens"] > 0
+
+def test_savings_compare_estimates_of_both_models():
+    models = selector()
+    messages = edit("make the header blue")
+    choice = models.choose("code_developer", messages)
+    models.record(choice, messages, AIMessage(CODE), 9.0, LITE)
+    stats = models.stats()["code_developer"]
+    output_tokens = stats["output_tokens"]
+    policy = models.policy
+    assert stats["switched"] == 1
+    # The measured 9s is logged as latency but plays no part in the savings.
+    assert stats["latency"] == 9.0
+    assert stats["latency_saved"] == pytest.approx(policy.latency(FLASH, output_tokens) - policy.latency(LITE, output_tokens))
+    assert stats["cost_saved"] == pytest.approx(
+        policy.cost(FLASH, stats["input_tokens"], output_tokens) - policy.cost(LITE, stats["input_tokens"], output_tokens))
+
+def test_fallback_is_attributed_to_the_model_that_answered():
+    models = selector()
+    messages = [("user", "build a dashboard with a chart, a table and a signup form")]
+    choice = models.choose("code_developer", messages)
+    assert choice.models[0] == PRO
+    models.record(choice, messages, AIMessage(CODE), 2.0, FLASH)
+    stats = models.stats()["code_developer"]
+    assert stats["models"] == {"google/gemini-2.5-flash": 1}
+    assert stats["switched"] == 0
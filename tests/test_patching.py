@@ -0,0 +1,52 @@
+import pytest
+
+from code_parser import format_code, parse_code
+from patching import PatchError, apply_patches, parse_patches
+
+CODE = format_code(
+    "<main>\n  <button id=\"cta\">Go</button>\n</main>",
+    "body { margin: 0; }\n.card {\n  padding: 1rem;\n}\n.card {\n  color: red;\n}",
+    "document.getElementById('cta').onclick = () => alert('hi');",
+)
+
+def patch(file_name, search, replace):
+    return f"FILE: {file_name}\n<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+def test_applies_an_exact_match():
+    result = apply_patches(CODE, patch("index.html", '<button id="cta">Go</button>', '<button id="cta">Start</button>'))
+    html, css, js = parse_code(result)
+    assert '<button id="cta">Start</button>' in html
+    assert (css, js) == parse_code(CODE)[1:]
+
+def test_applies_several_blocks_across_files():
+    text = "\n\n".join([
+        patch("style.css", "body { margin: 0; }", "body { margin: 0; background: #fff; }"),
+        patch("script.js", "alert('hi')", "alert('hello')"),
+    ])
+    _, css, js = parse_code(apply_patches(CODE, text))
+    assert "background: #fff" in css
+    assert "alert('hello')" in js
+
+def test_empty_search_appends_to_the_file():
+    _, css, _ = parse_code(apply_patches(CODE, "FILE: style.css\n<<<<<<< SEARCH\n=======\nbutton { color: blue; }\n>>>>>>> REPLACE"))
+    assert css.endswith("}\nbutton { color: blue; }")
+
+def test_falls_back_to_matching_lines_with_different_indentation():
+    search = "<main>\n<button id=\"cta\">Go</button>\n</main>"
+    html, _, _ = parse_code(apply_patches(CODE, patch("index.html", search, "<main>\n  <p>Hello</p>\n</main>")))
+    assert html == "<main>\n  <p>Hello</p>\n</main>"
+
+@pytest.mark.parametrize("text, message", [
+    ("Sure, here is the change.", "No search/replace blocks"),
+    (patch("app.py", "x", "y"), "unknown file"),
+    (patch("index.html", "<section>", "<div>"), "matched 0 times"),
+    # Ambiguous even ignoring whitespace: both .card rules start the same way.
+    (patch("style.css", ".card {", ".box {"), "matched 2 times"),
+])
+def test_rejects_patches_that_do_not_apply(text, message):
+    with pytest.raises(PatchError, match=message):
+        apply_patches(CODE, text)
+
+def test_parse_patches_returns_each_edit():
+    text = patch("index.html", "a", "b") + "\n" + patch("script.js", "c", "d")
+    assert parse_patches(text) == [("index.html", "a", "b"), ("script.js", "c", "d")]
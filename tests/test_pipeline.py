@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from pipeline import PipelineRun
+
+def code(content):
+    return ("update", {"code_developer": {"messages": [HumanMessage(content, name="code_developer")]}})
+
+def rejected(reason):
+    return ("update", {"validator": {"messages": [HumanMessage(reason, name="validator")]}})
+
+PASSED = ("update", {"validator": None})
+TOKEN = ("token", (AIMessageChunk("<html>"), {"langgraph_node": "code_developer"}))
+
+def scripted(events, gate=None, closed=None):
+    """Event iterator standing in for stream_graph; waits on `gate` after the first code."""
+    def run():
+        try:
+            handed_off = False
+            for event in events:
+                yield event
+                if gate is not None and not handed_off and event[0] == "update" and "code_developer" in event[1]:
+                    handed_off = True
+                    gate.wait(5)
+        finally:
+            if closed is not None:
+                closed.set()
+    return run()
+
+def test_ui_gets_events_until_the_code_and_the_worker_validates_the_rest():
+    gate = threading.Event()
+    run = PipelineRun(scripted([TOKEN, code("v1"), rejected("missing footer"), code("v2"), PASSED], gate))
+    assert list(run.events()) == [TOKEN, code("v1")]
+    assert run.snapshot()["status"] == "validating"
+    gate.set()
+    assert run.wait(5)
+    snapshot = run.snapshot()
+    assert (snapshot["status"], snapshot["code"], snapshot["version"]) == ("passed", "v2", 2)
+
+def test_regeneration_requested_by_the_validator_is_reported():
+    gate = threading.Event()
+    blocked = threading.Event()
+
+    def events():
+        yield code("v1")
+        gate.wait(5)
+        yield rejected("the button does nothing")
+        blocked.wait(5)
+        yield code("v2")
+
+    run = PipelineRun(events())
+    list(run.events())
+    gate.set()
+    deadline = time.monotonic() + 5
+    while run.snapshot()["status"] != "regenerating" and time.monotonic() < deadline:
+        time.sleep(0.001)
+    snapshot = run.snapshot()
+    assert (snapshot["status"], snapshot["detail"]) == ("regenerating", "the button does nothing")
+    blocked.set()
+    run.wait(5)
+
+def test_cached_code_counts_as_passed_and_approval_is_recorded():
+    run = PipelineRun(scripted([code("cached")]))
+    run.wait(5)
+    assert run.snapshot()["status"] == "passed"
+    approved = ("update", {"final_agent": {"messages": [HumanMessage("Final Code Approved!", name="final_agent")]}})
+    run = PipelineRun(scripted([code("v1"), PASSED, approved]))
+    run.wait(5)
+    snapshot = run.snapshot()
+    assert (snapshot["status"], snapshot["final_message"]) == ("approved", "Final Code Approved!")
+
+def test_events_can_follow_the_whole_run():
+    events = [TOKEN, code("v1"), PASSED]
+    run = PipelineRun(scripted(events))
+    assert list(run.events(until_code=False)) == events
+
+def test_cancel_stops_the_run_and_closes_the_stream():
+    gate = threading.Event()
+    closed = threading.Event()
+    run = PipelineRun(scripted([code("v1"), rejected("again"), code("v2")], gate, closed))
+    list(run.events())
+    run.cancel()
+    gate.set()
+    assert run.wait(5)
+    assert closed.is_set()
+    snapshot = run.snapshot()
+    assert (snapshot["status"], snapshot["version"]) == ("cancelled", 1)
+
+def test_errors_reach_the_listener_and_the_snapshot():
+    def events():
+        yield TOKEN
+        raise ValueError("provider down")
+
+    run = PipelineRun(events())
+    with pytest.raises(RuntimeError, match="provider down"):
+        list(run.events())
+    assert run.snapshot()["status"] == "error"
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+from provider_routing import NodeRoute, ProviderRouter
+from rate_limiting import RateLimiter
+
+FAST, SLOW = ("google", "fast"), ("google", "slow")
+
+def queued_limiter(spec, seconds):
+    """A limiter whose next request to `spec` waits about `seconds` for quota."""
+    limiter = RateLimiter({spec: (1, None)}, base_delay=0.0, period=seconds)
+    limiter.limiter(spec).acquire(0)
+    return limiter
+
+def router(limiter, answer_after, sent, **route):
+    def call(spec, messages, schema):
+        def request():
+            sent.append(spec)
+            time.sleep(answer_after[spec])
+            return spec
+        return limiter.call(spec, 1, 0, request)
+
+    async def acall(spec, messages, schema):
+        async def request():
+            sent.append(spec)
+            await asyncio.sleep(answer_after[spec])
+            return spec
+        return await limiter.acall(spec, 1, 0, request)
+
+    return ProviderRouter({"code_developer": NodeRoute([SLOW, FAST], **route)}, call, acall)
+
+def invoke(router, mode):
+    if mode == "async":
+        return asyncio.run(router.ainvoke("code_developer", []))
+    return router.invoke("code_developer", [])
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_time_queued_for_quota_does_not_count_towards_the_timeout(mode):
+    sent = []
+    routing = router(queued_limiter(SLOW, 0.4), {SLOW: 0.1, FAST: 0.0}, sent, timeout=0.3)
+    assert invoke(routing, mode) == SLOW
+    assert sent == [SLOW]
+    assert "timeouts" not in routing.stats()["code_developer"]
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_timeout_after_the_grant_falls_back(mode):
+    sent = []
+    routing = router(RateLimiter({}), {SLOW: 1.0, FAST: 0.0}, sent, timeout=0.2)
+    assert invoke(routing, mode) == FAST
+    assert routing.stats()["code_developer"]["timeouts"] == 1
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_hedge_clock_starts_when_the_primary_is_let_through(mode):
+    sent = []
+    routing = router(queued_limiter(SLOW, 0.3), {SLOW: 0.05, FAST: 0.0}, sent, hedge_after=0.2)
+    assert invoke(routing, mode) == SLOW
+    assert sent == [SLOW]
+    assert "hedges" not in routing.stats()["code_developer"]
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_hedge_still_queued_when_the_primary_answers_is_never_sent(mode):
+    sent = []
+    limiter = queued_limiter(FAST, 0.6)
+    routing = router(limiter, {SLOW: 0.3, FAST: 0.0}, sent, hedge_after=0.1)
+    assert invoke(routing, mode) == SLOW
+    time.sleep(0.5)
+    assert sent == [SLOW]
+    assert routing.stats()["code_developer"]["hedges"] == 1
+    # The skipped hedge gave its request slot back.
+    assert limiter.limiter(FAST).acquired == 1
+
+def streamed_tokens(agent, mode, routing):
+    """Streams a one-node graph whose node makes a routed call; returns the streamed chunks."""
+    from langchain_core.messages import HumanMessage
+    from langgraph.graph import END, START, MessagesState, StateGraph
+
+    def node(state):
+        return {"messages": [routing.invoke("code_developer", state["messages"])]}
+
+    async def anode(state):
+        return {"messages": [await routing.ainvoke("code_developer", state["messages"])]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("code_developer", anode if mode == "async" else node)
+    graph.add_edge(START, "code_developer")
+    graph.add_edge("code_developer", END)
+    app = graph.compile()
+    inputs = {"messages": [HumanMessage("build a page")]}
+    if mode == "async":
+        async def collect():
+            return [chunk.content async for chunk, _ in app.astream(inputs, stream_mode="messages")]
+        return asyncio.run(collect())
+    return [chunk.content for chunk, _ in app.stream(inputs, stream_mode="messages")]
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_abandoned_streaming_request_stops_and_is_not_shown(agent, mode):
+    from fake_llm import FakeChatModel
+
+    # The slow model streams for about 2s, well past the 0.2s timeout.
+    agent.client_registry.register("slowfake", lambda model, **kw: FakeChatModel(
+        model=model, provider="slowfake", code="slow" * 400, first_token_latency=0.0, tokens_per_second=200.0))
+    agent.client_registry.register("fastfake", lambda model, **kw: FakeChatModel(
+        model=model, provider="fastfake", code="fast" * 40, first_token_latency=0.0, tokens_per_second=1e6))
+    routing = ProviderRouter(
+        {"code_developer": NodeRoute([("slowfake", mode), ("fastfake", mode)], timeout=0.2)},
+        agent.invoke_llm, agent.ainvoke_llm,
+    )
+    tokens = streamed_tokens(agent, mode, routing)
+    first_fallback = next(i for i, t in enumerate(tokens) if "fast" in t)
+    assert any("slow" in t for t in tokens[:first_fallback])
+    assert not any("slow" in t for t in tokens[first_fallback:])
+    assert "".join(tokens[first_fallback:]) == "fast" * 40
+    # The abandoned request ended at its next token instead of streaming on in the background.
+    started = time.monotonic()
+    routing._executor.shutdown(wait=True)
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from instrumentation import Span
+from rate_limiting import PRIORITIES, ModelLimiter, RateLimiter, is_rate_limit_error, load_limits
+
+SPEC = ("google", "gemini-2.5-flash")
+
+class ServerError(Exception):
+    status_code = 503
+
+class BadRequest(Exception):
+    status_code = 400
+
+class Reply:
+    """Stands in for an AIMessage with provider-reported usage."""
+
+    def __init__(self, input_tokens, output_tokens):
+        self.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+def usage(response):
+    return response.usage_metadata["input_tokens"] + response.usage_metadata["output_tokens"]
+
+response_tokens = usage
+
+def limiter_for(tokens_per_minute=10_000, **kwargs):
+    # A long period keeps the buckets from refilling noticeably during a test.
+    return RateLimiter({SPEC: (None, tokens_per_minute)}, base_delay=0.0, period=360_000.0, **kwargs)
+
+def flaky(failures, error=ServerError, reply=None):
+    attempts = []
+
+    def request():
+        attempts.append(time.monotonic())
+        if len(attempts) <= failures:
+            raise error()
+        return reply or Reply(100, 50)
+
+    return request, attempts
+
+def wait_for_waiters(limiter, count):
+    deadline = time.monotonic() + 2
+    while len(limiter._waiters) < count:
+        assert time.monotonic() < deadline, "waiter never queued"
+        time.sleep(0.001)
+
+def test_interactive_requests_go_before_queued_batch_requests():
+    limiter = ModelLimiter(requests_per_minute=1, period=0.2)
+    limiter.acquire(0)
+    order = []
+
+    def worker(label, priority):
+        limiter.acquire(0, priority)
+        order.append(label)
+
+    threads = []
+    for label, priority in (("batch", PRIORITIES["batch"]), ("interactive", PRIORITIES["interactive"])):
+        thread = threading.Thread(target=worker, args=(label, priority))
+        thread.start()
+        threads.append(thread)
+        wait_for_waiters(limiter, len(threads))
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "batch"]
+    assert limiter.max_queue_depth == 2
+
+def test_same_priority_is_first_come_first_served():
+    limiter = ModelLimiter(requests_per_minute=1, period=0.1)
+    limiter.acquire(0)
+    order = []
+    threads = []
+    for index in range(3):
+        thread = threading.Thread(target=lambda index=index: (limiter.acquire(0, PRIORITIES["batch"]), order.append(index)))
+        thread.start()
+        threads.append(thread)
+        wait_for_waiters(limiter, index + 1)
+    for thread in threads:
+        thread.join(5)
+    assert order == [0, 1, 2]
+
+def test_failed_request_refunds_its_estimate():
+    rate_limiter = limiter_for()
+    request, attempts = flaky(failures=1, error=BadRequest)
+    with pytest.raises(BadRequest):
+        rate_limiter.call(SPEC, 2_000, 0, request, usage=usage)
+    bucket = rate_limiter.limiter(SPEC).tokens
+    assert len(attempts) == 1
+    assert bucket.level == pytest.approx(10_000, abs=1)
+
+def test_retries_are_refunded_and_the_answer_settled_once():
+    rate_limiter = limiter_for()
+    span = Span(kind="llm", name="code_developer")
+    request, attempts = flaky(failures=2)
+    response = rate_limiter.call(SPEC, 2_000, 0, request, span=span, usage=usage)
+    limiter = rate_limiter.limiter(SPEC)
+    assert usage(response) == 150
+    assert len(attempts) == 3
+    # Three requests sent, two of them retried; only the answered one costs tokens.
+    assert limiter.acquired == 3
+    assert limiter.retries == 2
+    assert span.retries == 2
+    assert limiter.tokens.level == pytest.approx(10_000 - 150, abs=1)
+
+def test_gives_up_after_max_retries_with_every_attempt_refunded():
+    rate_limiter = limiter_for(max_retries=2)
+    request, attempts = flaky(failures=10)
+    with pytest.raises(ServerError):
+        rate_limiter.call(SPEC, 2_000, 0, request, usage=usage)
+    limiter = rate_limiter.limiter(SPEC)
+    assert len(attempts) == 3
+    assert limiter.retries == 2
+    assert limiter.tokens.level == pytest.approx(10_000, abs=1)
+
+def test_usage_above_the_estimate_is_charged():
+    rate_limiter = limiter_for()
+    request, _ = flaky(failures=0, reply=Reply(3_000, 500))
+    rate_limiter.call(SPEC, 2_000, 0, request, usage=usage)
+    assert rate_limiter.limiter(SPEC).tokens.level == pytest.approx(10_000 - 3_500, abs=1)
+
+def test_async_retries_are_refunded_and_the_answer_settled_once():
+    rate_limiter = limiter_for()
+    span = Span(kind="llm", name="code_developer")
+    request, attempts = flaky(failures=2)
+
+    async def arequest():
+        return request()
+
+    asyncio.run(rate_limiter.acall(SPEC, 2_000, 0, arequest, span=span, usage=usage))
+    limiter = rate_limiter.limiter(SPEC)
+    assert len(attempts) == 3
+    assert (limiter.acquired, limiter.retries, span.retries) == (3, 2, 2)
+    assert limiter.tokens.level == pytest.approx(10_000 - 150, abs=1)
+
+def test_async_cancelled_request_is_refunded():
+    rate_limiter = limiter_for()
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.create_task(rate_limiter.acall(SPEC, 2_000, 0, slow, usage=usage))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert rate_limiter.limiter(SPEC).tokens.level == pytest.approx(10_000, abs=1)
+
+# A fake provider over quota: answers 429 beyond its per-window request limit.
+
+def fake_provider(limit, window):
+    from fake_llm import FakeChatModel, ServerRateLimit
+
+    quota = ServerRateLimit(limit, window)
+    return FakeChatModel(model=SPEC[1], provider=SPEC[0], first_token_latency=0.0, tokens_per_second=1e6,
+                         before_call=quota), quota
+
+def test_fake_429_is_a_rate_limit_error():
+    from fake_llm import FakeRateLimitError
+
+    assert is_rate_limit_error(FakeRateLimitError("429 Too Many Requests"))
+    assert not is_rate_limit_error(ServerError())
+
+def test_429_cools_the_model_down_retries_and_refunds():
+    model, quota = fake_provider(limit=1, window=0.3)
+    rate_limiter = limiter_for(max_retries=10)
+    rate_limiter.base_delay = 0.05
+    span = Span(kind="llm", name="code_developer")
+    limiter = rate_limiter.limiter(SPEC)
+
+    first = rate_limiter.call(SPEC, 2_000, 0, lambda: model.invoke("make a page"), usage=response_tokens)
+    start = time.monotonic()
+    second = rate_limiter.call(SPEC, 2_000, 0, lambda: model.invoke("make a page"), span=span, usage=response_tokens)
+    # The quota window had to pass before the provider answered again.
+    assert time.monotonic() - start >= 0.25
+    assert quota.rejected >= 1
+    assert limiter.throttled == quota.rejected
+    assert limiter.retries == span.retries == quota.rejected
+    assert limiter.acquired == 2 + quota.rejected
+    # Rejected attempts were refunded; only the two answers count against the bucket.
+    used = response_tokens(first) + response_tokens(second)
+    assert limiter.tokens.level == pytest.approx(10_000 - used, abs=1)
+
+def test_cool_down_holds_other_requests_to_the_model():
+    rate_limiter = limiter_for()
+    limiter = rate_limiter.limiter(SPEC)
+    limiter.cool_down(0.2)
+    assert limiter.acquire(0) >= 0.15
+
+def test_retry_after_header_sets_backoff_and_cool_down():
+    class Throttled(Exception):
+        status_code = 429
+        response = type("Response", (), {"headers": {"retry-after": "0.2"}})()
+
+    rate_limiter = limiter_for(max_retries=1)
+    request, attempts = flaky(failures=1, error=Throttled)
+    start = time.monotonic()
+    rate_limiter.call(SPEC, 2_000, 0, request, usage=usage)
+    assert time.monotonic() - start >= 0.2
+    assert rate_limiter.backoff(0, Throttled()) == 0.2
+    assert len(attempts) == 2
+
+def test_persistent_429_gives_up_with_every_attempt_refunded():
+    from fake_llm import FakeRateLimitError
+
+    model, quota = fake_provider(limit=0, window=60)
+    rate_limiter = limiter_for(max_retries=2)
+    with pytest.raises(FakeRateLimitError):
+        rate_limiter.call(SPEC, 2_000, 0, lambda: model.invoke("make a page"), usage=response_tokens)
+    limiter = rate_limiter.limiter(SPEC)
+    assert quota.rejected == 3
+    assert (limiter.throttled, limiter.retries) == (3, 2)
+    assert limiter.tokens.level == pytest.approx(10_000, abs=1)
+
+def test_async_429_retries_and_refunds():
+    model, quota = fake_provider(limit=1, window=0.3)
+    rate_limiter = limiter_for(max_retries=10)
+    rate_limiter.base_delay = 0.05
+
+    async def run():
+        await rate_limiter.acall(SPEC, 2_000, 0, lambda: model.ainvoke("make a page"), usage=response_tokens)
+        return await rate_limiter.acall(SPEC, 2_000, 0, lambda: model.ainvoke("make a page"), usage=response_tokens)
+
+    answer = asyncio.run(run())
+    limiter = rate_limiter.limiter(SPEC)
+    assert quota.rejected >= 1 and limiter.throttled == quota.rejected
+    assert limiter.tokens.level == pytest.approx(10_000 - 2 * response_tokens(answer), abs=1)
+
+def test_limits_override_from_json_and_file(tmp_path):
+    defaults = {SPEC: (10, 250_000), ("groq", "llama-3.1-8b-instant"): (30, 6_000)}
+    limits = load_limits(defaults, '{"google/gemini-2.5-flash": [1000, null]}')
+    assert limits[SPEC] == (1000, None)
+    assert limits[("groq", "llama-3.1-8b-instant")] == (30, 6_000)
+    path = tmp_path / "limits.json"
+    path.write_text('{"groq/llama-3.1-8b-instant": [60, 12000]}')
+    assert load_limits(defaults, str(path))[("groq", "llama-3.1-8b-instant")] == (60, 12_000)
+    assert load_limits(defaults, None) == defaults
+    with pytest.raises(ValueError):
+        load_limits(defaults, '{"gemini-2.5-flash": [1, 2]}')
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+from langchain_core.messages import HumanMessage
+
+from fake_llm import DEFAULT_CODE
+from response_cache import ResponseCache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CUSTOMIZED = DEFAULT_CODE.replace("#223", "darkblue")
+
+def test_exact_hit_ignores_case_and_punctuation(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    cache.put("Make a landing page for a bakery!", DEFAULT_CODE)
+    assert cache.get("make a landing page for a bakery") == DEFAULT_CODE
+    assert cache.stats()["hits"] == 1
+
+def test_near_matches_are_off_by_default(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    cache.put("make a landing page for a bakery", DEFAULT_CODE)
+    assert cache.get("please make a landing page for the bakery") is None
+
+def test_near_match_needs_the_same_content_words_and_validation(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), similarity_threshold=0.6)
+    cache.put("landing page for a bakery with a dark theme", DEFAULT_CODE)
+    assert cache.get("landing page for the bakery with a dark theme") == DEFAULT_CODE
+    assert cache.get("landing page for a bakery with a light theme") is None
+    assert cache.get("landing page for the bakery with dark theme", validate=lambda code: False) is None
+    assert cache.stats()["near_rejected"] == 1
+
+def conversation(*turns):
+    """HumanMessages for alternating user turns and code_developer answers."""
+    return [HumanMessage(text) if author == "user" else HumanMessage(text, name=author) for author, text in turns]
+
+def test_code_approved_after_feedback_rounds_is_not_cached(agent):
+    request = "make a landing page for a bakery"
+    messages = conversation(
+        ("user", request), ("code_developer", DEFAULT_CODE),
+        ("user", "make the header dark blue"), ("code_developer", CUSTOMIZED),
+        ("user", "ok"),
+    )
+    agent.review_outcome({"messages": messages}, request, CUSTOMIZED)
+    assert agent.response_cache.get(request) is None
+
+def test_code_approved_as_first_generated_is_cached(agent):
+    request = "make a landing page for a flower shop"
+    messages = conversation(("user", request), ("code_developer", DEFAULT_CODE), ("user", "ok"))
+    agent.review_outcome({"messages": messages}, request, DEFAULT_CODE)
+    assert agent.response_cache.get(request) == DEFAULT_CODE
+
+def test_auto_approved_runs_cache_only_when_asked(agent):
+    messages = conversation(("user", "make a portfolio page"), ("code_developer", DEFAULT_CODE))
+    agent.review_outcome({"messages": messages}, "make a portfolio page", DEFAULT_CODE, *agent.approval_settings(
+        {"configurable": {"auto_approve": True}}))
+    assert agent.response_cache.get("make a portfolio page") is None
+    agent.review_outcome({"messages": messages}, "make a portfolio page", DEFAULT_CODE, *agent.approval_settings(
+        {"configurable": {"auto_approve": True, "cache_results": True}}))
+    assert agent.response_cache.get("make a portfolio page") == DEFAULT_CODE
+
+def test_importing_the_agent_does_not_open_the_cache(tmp_path):
+    subprocess.run([sys.executable, "-c", "import main_agent"], cwd=tmp_path, check=True,
+                   env={**os.environ, "PYTHONPATH": REPO_ROOT})
+    assert (tmp_path / "data").is_dir()
+    assert not (tmp_path / "data" / "response_cache.db").exists()
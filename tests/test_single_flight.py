@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from rate_limiting import RequestAbandoned
+from single_flight import SingleFlight, flight_key
+
+KEY = "same request"
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        time.sleep(0.001)
+
+def followers(flight):
+    return flight.stats()["coalesced"]
+
+def test_identical_requests_share_one_key_and_different_ones_do_not():
+    spec = ("google", "gemini-2.5-flash")
+    assert flight_key(spec, [("user", "make  a page")]) == flight_key(spec, [("user", "make a page ")])
+    assert flight_key(spec, [("user", "make a page")]) != flight_key(spec, [("user", "make a blog")])
+    assert flight_key(spec, [("user", "a")], client_kwargs={"temperature": 1.0}) != flight_key(spec, [("user", "a")])
+
+def test_follower_gets_a_copy_of_the_leaders_answer():
+    flight = SingleFlight()
+    release = threading.Event()
+    upstream = []
+
+    def fn():
+        upstream.append(1)
+        release.wait(2)
+        return AIMessage("code")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.call, KEY, fn)
+        wait_until(lambda: flight.in_flight() == 1)
+        follower = pool.submit(flight.call, KEY, fn)
+        wait_until(lambda: followers(flight) == 1)
+        release.set()
+        (first, first_shared), (second, second_shared) = leader.result(), follower.result()
+    assert upstream == [1]
+    assert (first_shared, second_shared) == (False, True)
+    assert second == first and second is not first
+    assert flight.in_flight() == 0
+
+def test_leader_error_reaches_the_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(2)
+        raise ValueError("provider rejected the request")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.call, KEY, fn)
+        wait_until(lambda: flight.in_flight() == 1)
+        follower = pool.submit(flight.call, KEY, lambda: AIMessage("unused"))
+        wait_until(lambda: followers(flight) == 1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+
+def test_follower_takes_over_when_the_leader_is_abandoned():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def abandoned():
+        release.wait(2)
+        raise RequestAbandoned("the leader's router stopped waiting")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.call, KEY, abandoned)
+        wait_until(lambda: flight.in_flight() == 1)
+        follower = pool.submit(flight.call, KEY, lambda: AIMessage("code"))
+        wait_until(lambda: followers(flight) == 1)
+        release.set()
+        with pytest.raises(RequestAbandoned):
+            leader.result()
+        message, shared = follower.result()
+    assert (message.content, shared) == ("code", False)
+    assert flight.stats()["upstream"] == 2
+
+def test_async_follower_takes_over_when_the_leader_is_abandoned():
+    flight = SingleFlight()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def abandoned():
+            await release.wait()
+            raise RequestAbandoned("the leader's hedge stopped waiting")
+
+        async def answer():
+            return AIMessage("code")
+
+        leader = asyncio.ensure_future(flight.acall(KEY, abandoned))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.acall(KEY, answer))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(RequestAbandoned):
+            await leader
+        return await follower
+
+    message, shared = asyncio.run(run())
+    assert (message.content, shared) == ("code", False)
+
+def test_async_follower_takes_over_when_the_leader_is_cancelled():
+    flight = SingleFlight()
+
+    async def run():
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def answer():
+            return AIMessage("code")
+
+        leader = asyncio.ensure_future(flight.acall(KEY, slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.acall(KEY, answer))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    message, shared = asyncio.run(run())
+    assert (message.content, shared) == ("code", False)
+    assert flight.in_flight() == 0
+
+def test_sync_leader_and_async_follower_share_one_flight():
+    flight = SingleFlight()
+    release = threading.Event()
+    upstream = []
+
+    def fn():
+        upstream.append(1)
+        release.wait(2)
+        return AIMessage("code")
+
+    async def unused():
+        raise AssertionError("the follower must not call upstream")
+
+    async def follow():
+        return await flight.acall(KEY, unused)
+
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(flight.call, KEY, fn)
+        wait_until(lambda: flight.in_flight() == 1)
+        threading.Timer(0.1, release.set).start()
+        message, shared = asyncio.run(follow())
+        assert leader.result()[0].content == "code"
+    assert (message.content, shared) == ("code", True)
+    assert upstream == [1]
+
+def test_disabled_runs_every_call():
+    flight = SingleFlight(enabled=False)
+    assert flight.call(KEY, lambda: "answer") == ("answer", False)
+    assert flight.stats()["calls"] == 0
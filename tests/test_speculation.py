@@ -0,0 +1,125 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from instrumentation import current_thread_id
+from speculation import Speculator
+
+REQUEST = HumanMessage("build a landing page", id="request")
+STATE = {"messages": [REQUEST]}
+# The state a node sees after the supervisor routed to it.
+ROUTED = {"messages": [REQUEST, AIMessage("code_developer", name="supervisor", id="route")]}
+
+def in_thread(thread_id, fn, *args):
+    """Runs fn with current_thread_id set, without leaking it into other tests."""
+    def run():
+        current_thread_id.set(thread_id)
+        return fn(*args)
+    return contextvars.copy_context().run(run)
+
+def generate(spec, tokens=100, delay=0.0, release=None):
+    """Speculative work that spends `tokens` on its LLM calls."""
+    def work(state):
+        if release is not None:
+            release.wait(5)
+        time.sleep(delay)
+        spec.charge(tokens)
+        return f"code for {state['messages'][-1].content}"
+    return work
+
+def test_hit_hands_the_result_to_the_node():
+    spec = Speculator(enabled=True)
+    speculation = spec.start("t1", "code_developer", STATE, generate(spec, delay=0.05))
+    spec.resolve(speculation, "code_developer")
+    assert in_thread("t1", spec.take, "code_developer", ROUTED) == "code for build a landing page"
+    stats = spec.stats()
+    assert (stats["hits"], stats["used"], stats["wasted_tokens"]) == (1, 1, 0)
+    assert stats["overlap_seconds"] > 0
+    # Taken once: the node's next call runs normally.
+    assert in_thread("t1", spec.take, "code_developer", ROUTED) is None
+
+def test_miss_discards_the_running_work_and_counts_its_tokens():
+    spec = Speculator(enabled=True)
+    release = threading.Event()
+    speculation = spec.start("t1", "code_developer", STATE, generate(spec, tokens=250, release=release))
+    spec.resolve(speculation, "enhancer")
+    release.set()
+    speculation.future.result(5)
+    # The tokens are counted by a done callback, right after the result is set.
+    deadline = time.monotonic() + 2
+    while spec.stats()["wasted_tokens"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert in_thread("t1", spec.take, "code_developer", ROUTED) is None
+    stats = spec.stats()
+    assert (stats["misses"], stats["used"], stats["wasted_tokens"]) == (1, 0, 250)
+
+def test_miss_cancels_async_work():
+    spec = Speculator(enabled=True)
+    started = []
+
+    async def work(state):
+        started.append(True)
+        await asyncio.sleep(5)
+        return "never"
+
+    async def scenario():
+        speculation = spec.astart("t1", "enhancer", STATE, work)
+        await asyncio.sleep(0.01)
+        spec.resolve(speculation, "code_developer")
+        await asyncio.sleep(0)
+        return speculation
+
+    speculation = asyncio.run(scenario())
+    assert started and speculation.future.cancelled()
+    assert spec.stats()["misses"] == 1
+
+def test_async_hit_awaits_the_task():
+    spec = Speculator(enabled=True)
+
+    async def work(state):
+        await asyncio.sleep(0.02)
+        return "enhanced"
+
+    async def scenario():
+        speculation = spec.astart("t1", "enhancer", STATE, work)
+        spec.resolve(speculation, "enhancer")
+        current_thread_id.set("t1")
+        return await spec.atake("enhancer", {"messages": [REQUEST, AIMessage("enhancer", name="supervisor")]})
+
+    assert asyncio.run(scenario()) == "enhanced"
+    assert spec.stats()["used"] == 1
+
+def test_work_for_another_state_is_stale():
+    spec = Speculator(enabled=True)
+    speculation = spec.start("t1", "code_developer", STATE, generate(spec))
+    spec.resolve(speculation, "code_developer")
+    moved_on = {"messages": [REQUEST, HumanMessage("make it blue", id="feedback"), AIMessage("code_developer", name="supervisor")]}
+    assert in_thread("t1", spec.take, "code_developer", moved_on) is None
+    assert spec.stats()["stale"] == 1
+
+def test_failed_work_lets_the_node_run_again():
+    spec = Speculator(enabled=True)
+
+    def work(state):
+        spec.charge(40)
+        raise RuntimeError("provider down")
+
+    speculation = spec.start("t1", "code_developer", STATE, work)
+    spec.resolve(speculation, "code_developer")
+    assert in_thread("t1", spec.take, "code_developer", ROUTED) is None
+    stats = spec.stats()
+    assert (stats["failures"], stats["wasted_tokens"]) == (1, 40)
+
+def test_speculation_is_per_thread_and_only_when_confident():
+    spec = Speculator(enabled=True)
+    assert not spec.should_start("t1", 0.4)
+    assert not spec.should_start(None, 0.9)
+    assert not Speculator().should_start("t1", 0.9)
+    speculation = spec.start("t1", "code_developer", STATE, generate(spec))
+    spec.resolve(speculation, "code_developer")
+    assert in_thread("t2", spec.take, "code_developer", ROUTED) is None
+    assert in_thread("t1", spec.take, "enhancer", ROUTED) is None
+    assert in_thread("t1", spec.take, "code_developer", ROUTED) is not None
@@ -0,0 +1,88 @@
+import pytest
+
+from code_parser import format_code
+from static_validation import check_css, check_html, check_js, score_candidate, validate_code
+
+VALID_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><link rel="stylesheet" href="style.css"></head>
+<body>
+  <ul><li>One<li>Two</ul>
+  <p>First paragraph<p>Second<br/>line<img src="a.png" alt="">
+  <table><tr><td>cell<td>cell</table>
+  <input type="checkbox" checked>
+</body>
+</html>"""
+
+VALID_CSS = """/* a { brace } in a comment */
+@import url("theme.css");
+body { font-family: "Helvetica Neue", sans-serif; }
+.quote::before { content: "{"; }
+.quote::after { content: '}'; }
+@media (max-width: 600px) {
+  .grid { grid-template-columns: 1fr; }
+}
+:root { --gap: 1rem; }"""
+
+VALID_JS = r"""// it's a comment with "quotes" and a { brace
+const ratio = width / height / 2;
+const pattern = /[/\]]+\/(a|b){2}/g;
+const label = `Total: ${items.map(i => `${i.name} (${i.count})`).join(", ")} {not code}`;
+const config = { nested: { deep: [1, 2, { x: 3 }] } };
+const escaped = 'it\'s "fine"' + "say \"hi\"";
+/* block comment with ) and ] */
+if (!/^\d+$/.test(input)) { throw new Error("not a number"); }
+const half = (a + b) / 2, rest = total % 3 / 1;
+function tag() { return /x/.test(label) ? `${config.nested.deep[2].x}` : ''; }
+"""
+
+def test_valid_code_has_no_problems():
+    assert check_html(VALID_HTML) == ([], [])
+    assert check_css(VALID_CSS) == []
+    assert check_js(VALID_JS) == []
+
+def test_clean_relevant_answer_is_high_confidence():
+    code = format_code(VALID_HTML.replace("One", "Pricing table"), VALID_CSS, VALID_JS)
+    report = validate_code(code, "A pricing table with a checkbox")
+    assert report.ok and not report.warnings
+    assert report.high_confidence
+
+@pytest.mark.parametrize("html, unclosed, mismatched", [
+    ("<div><section><h1>Title</h1></section>", ["<div> is never closed"], []),
+    ("<div><span>text</div>", [], ["<span> is not closed before </div>"]),
+    ("<div>text</div></section>", [], ["</section> has no matching opening tag"]),
+])
+def test_html_problems(html, unclosed, mismatched):
+    assert check_html(html) == (unclosed, mismatched)
+
+@pytest.mark.parametrize("css, problem", [
+    (".card { padding: 1rem;", "1 unclosed '{' block(s)"),
+    (".card { padding: 1rem; } }", "unexpected '}'"),
+    ("{ color: red; }", "rule without a selector"),
+])
+def test_css_problems(css, problem):
+    assert any(problem in p for p in check_css(css))
+
+@pytest.mark.parametrize("js, problem", [
+    ("const s = 'open;\nrun();", "unterminated string"),
+    ("/* never closed", "unterminated block comment"),
+    ("const t = `open ${x} still open", "unterminated template literal"),
+    ("const t = `open", "unterminated template literal"),
+    ("if (a) { run(); ", "1 unclosed bracket(s)"),
+    ("run(a]);", "unbalanced ']'"),
+    ("const r = /abc\n;", "unterminated regular expression"),
+])
+def test_js_problems(js, problem):
+    problems = check_js(js)
+    assert problems and problem in problems[0]
+
+def test_missing_html_and_truncated_answers_are_errors():
+    assert "The HTML code block is missing." in validate_code(format_code("", VALID_CSS, VALID_JS)).errors
+    truncated = validate_code(format_code("<main><div>", VALID_CSS, "run("))
+    assert truncated.errors == ["HTML: <main> is never closed", "HTML: <div> is never closed",
+                                "JavaScript: 1 unclosed bracket(s)"]
+
+def test_broken_candidates_score_below_clean_ones():
+    clean = format_code(VALID_HTML, VALID_CSS, VALID_JS)
+    broken = format_code(VALID_HTML + "<div>", VALID_CSS + "{", VALID_JS)
+    assert score_candidate(broken, "a checkbox") < score_candidate(clean, "a checkbox")